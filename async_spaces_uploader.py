@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Async upload engine for Digital Ocean Spaces (S3 compatible)
+Signed PUTs over one pooled aiohttp connector instead of one blocking
+boto3 upload_file per thread
+
+Author: AI Assistant
+Version: 1.0 - Async Upload Engine
+
+Features:
+- Hundreds of concurrent PUTs per process on a single event loop
+- SigV4 signing through botocore (already installed with boto3)
+- Same ACL / Content-Type / Cache-Control / Content-Disposition / metadata
+  semantics as boto3 ExtraArgs
+- Content-MD5 integrity check and retry with backoff on 5xx / SlowDown
+"""
+
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import aiohttp
+from yarl import URL
+from urllib.parse import quote
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# boto3 ExtraArgs -> HTTP header names
+EXTRA_ARG_HEADERS = {
+    'ACL': 'x-amz-acl',
+    'ContentType': 'Content-Type',
+    'CacheControl': 'Cache-Control',
+    'ContentDisposition': 'Content-Disposition',
+    'ContentEncoding': 'Content-Encoding'
+}
+
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+
+class AsyncSpacesUploadEngine:
+    def __init__(self, access_key, secret_key, endpoint_url, bucket_name, region='sgp1',
+                 concurrency=256, timeout=30, retry_attempts=3, rate_limiter=None):
+        """
+        Initialize the async upload engine
+
+        Args:
+            access_key: DO Spaces access key
+            secret_key: DO Spaces secret key
+            endpoint_url: DO Spaces endpoint URL (any S3 compatible endpoint works)
+            bucket_name: Target bucket name
+            region: Signing region (default: sgp1)
+            concurrency: Maximum PUTs in flight
+            timeout: Per-request timeout in seconds
+            retry_attempts: Attempts per object before giving up
+            rate_limiter: Optional SpacesRateLimiter shared with the other Spaces clients
+        """
+        self.endpoint_url = endpoint_url.rstrip('/')
+        self.bucket_name = bucket_name
+        self.region = region
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.credentials = Credentials(access_key, secret_key)
+        self.rate_limiter = rate_limiter
+
+    def object_url(self, s3_key):
+        """Path-style object URL"""
+        return f"{self.endpoint_url}/{self.bucket_name}/{quote(s3_key, safe='/~')}"
+
+    def build_headers(self, extra_args, body):
+        """Translate boto3 ExtraArgs into PUT headers"""
+        headers = {
+            'Content-Length': str(len(body)),
+            'Content-MD5': base64.b64encode(hashlib.md5(body).digest()).decode('ascii')
+        }
+        for arg, header in EXTRA_ARG_HEADERS.items():
+            if extra_args.get(arg):
+                headers[header] = extra_args[arg]
+        for key, value in (extra_args.get('Metadata') or {}).items():
+            headers[f'x-amz-meta-{key}'] = value
+        return headers
+
+    def sign_put(self, s3_key, headers, body):
+        """Return signed headers for a PUT of body to s3_key"""
+        request = AWSRequest(method='PUT', url=self.object_url(s3_key), headers=headers, data=body)
+        S3SigV4Auth(self.credentials, 's3', self.region).add_auth(request)
+        return dict(request.headers.items())
+
+    def create_session(self):
+        """aiohttp session sized for the configured concurrency"""
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=60
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def put_object(self, session, local_path, s3_key, extra_args):
+        """Upload one file with retry; returns {'success', 'status', 'error', 'attempt'}"""
+        body = await asyncio.to_thread(self.read_file, local_path)
+        return await self.put_body(session, body, s3_key, extra_args)
+
+    async def put_body(self, session, body, s3_key, extra_args):
+        """Upload an in-memory body with retry (same result dict as put_object)"""
+        last_error = None
+
+        for attempt in range(self.retry_attempts):
+            # Re-sign on every attempt so x-amz-date stays fresh
+            headers = self.sign_put(s3_key, self.build_headers(extra_args, body), body)
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async('PUT')
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                with metrics.S3_IN_FLIGHT.track_inprogress(operation='PutObject'):
+                    async with session.put(URL(self.object_url(s3_key), encoded=True), data=body, headers=headers) as response:
+                        status = response.status
+                        if response.status in (200, 201, 204):
+                            return {'success': True, 'status': response.status, 'attempt': attempt + 1}
+
+                        error_body = (await response.text())[:300]
+                        last_error = f"HTTP {response.status}: {error_body}"
+                        slow_down = 'SlowDown' in error_body
+                        if self.rate_limiter and (slow_down or response.status == 503):
+                            self.rate_limiter.report_slowdown('PUT')
+
+                        if response.status not in RETRYABLE_STATUSES and not slow_down:
+                            return {'success': False, 'status': response.status, 'error': last_error, 'attempt': attempt + 1}
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+            finally:
+                metrics.observe_s3_call('PutObject', status, time.perf_counter() - started)
+
+            if attempt < self.retry_attempts - 1:
+                wait_time = (2 ** attempt) * 0.5  # Exponential backoff
+                logger.debug(f"Upload attempt {attempt + 1} failed for {s3_key}: {last_error}. Retrying in {wait_time}s...")
+                await asyncio.sleep(wait_time)
+
+        return {'success': False, 'status': None, 'error': last_error, 'attempt': self.retry_attempts}
+
+    @staticmethod
+    def read_file(local_path):
+        """Tiles are small - read them whole (off the event loop)"""
+        with open(local_path, 'rb') as f:
+            return f.read()
+
+    async def upload_stream(self, jobs, on_result):
+        """
+        Upload every job from an iterable with at most `concurrency` PUTs in flight
+
+        Args:
+            jobs: Iterable of (job_id, local_path, s3_key, extra_args); advanced in a worker
+                thread, so it may block (scan queue, ledger lookups) without stalling PUTs
+            on_result: Callback(job_id, result) invoked on the event loop thread
+        """
+        async with self.create_session() as session:
+            in_flight = set()
+
+            async def run(job_id, local_path, s3_key, extra_args):
+                try:
+                    result = await self.put_object(session, local_path, s3_key, extra_args)
+                except Exception as e:
+                    result = {'success': False, 'status': None, 'error': str(e), 'attempt': 1}
+                on_result(job_id, result)
+
+            jobs = iter(jobs)
+            while True:
+                if len(in_flight) >= self.concurrency:
+                    _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                job = await asyncio.to_thread(next, jobs, None)
+                if job is None:
+                    break
+                in_flight.add(asyncio.ensure_future(run(*job)))
+
+            if in_flight:
+                await asyncio.wait(in_flight)
+
+    def upload_all(self, jobs, on_result):
+        """Blocking entry point for synchronous callers"""
+        asyncio.run(self.upload_stream(jobs, on_result))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Exact completeness of uploaded city / map-type combinations
+Compares every local tile of a combination with the bucket inventory (size and
+MD5 ETag) and the upload ledger, so only combinations that are really
+finished are skipped - a half-uploaded one is resumed instead
+
+Author: AI Assistant
+Version: 1.0 - Completeness Check
+
+One pass over the scanned local files, then one range scan of the sorted
+inventory per combination prefix for the remote totals. No LIST/HEAD calls.
+"""
+
+import logging
+from tile_pack import PACK_DIR
+
+logger = logging.getLogger(__name__)
+
+
+def remote_matches(remote, size, md5=None):
+    """
+    Compare an inventory entry (size, etag, mtime) with a local file
+
+    The ETag is the MD5 only for single-part uploads; multipart ETags (with a
+    '-'), placeholder hashes and missing md5 fall back to the size check.
+    """
+    remote_size, etag = remote[0], remote[1]
+    if remote_size != size:
+        return False
+    if not md5 or md5.startswith('small_file_') or not etag or '-' in etag:
+        return True
+    return etag == md5
+
+
+def combination_group(file_data):
+    """(city, map_type, district) and the remote folder holding its zoom directories"""
+    group = (file_data['city'], file_data['map_type'], file_data.get('district'))
+    # <prefix>/<city>/<map_type>/[<district>/]<zoom>/<tile> -> drop <zoom>/<tile>
+    return group, file_data['s3_key'].rsplit('/', 2)[0] + '/'
+
+
+def new_entry(remote_prefix):
+    return {
+        'remote_prefix': remote_prefix,
+        'local_files': 0,
+        'local_bytes': 0,
+        'remote_files': 0,
+        'remote_bytes': 0,
+        'matched': 0,
+        'matched_bytes': 0,
+        'ledger_only': 0,
+        'changed': 0,
+        'missing': 0,
+        'complete': False
+    }
+
+
+def tally_file(report, file_data, inventory, ledger=None, group_of=combination_group):
+    """
+    Add one local tile to a report
+
+    Returns:
+        str: 'matched' (in the inventory with the same content), 'ledger_only',
+             'changed' or 'missing'
+    """
+    group, remote_prefix = group_of(file_data)
+    entry = report.get(group)
+    if entry is None:
+        entry = report[group] = new_entry(remote_prefix)
+
+    size = file_data['file_info']['size']
+    md5 = file_data['file_info'].get('md5')
+    entry['local_files'] += 1
+    entry['local_bytes'] += size
+
+    remote = inventory.get(file_data['s3_key'])
+    if remote is not None:
+        if remote_matches(remote, size, md5):
+            status = 'matched'
+        else:
+            status = 'changed'
+    elif ledger and md5 and ledger.is_uploaded(file_data['s3_key'], md5):
+        status = 'ledger_only'
+    else:
+        status = 'missing'
+
+    if status in ('matched', 'ledger_only'):
+        # A ledger record with the same MD5 counts as uploaded even if the snapshot predates it
+        entry['matched'] += 1
+        entry['matched_bytes'] += size
+        entry['ledger_only'] += status == 'ledger_only'
+    else:
+        entry[status] += 1
+    return status
+
+
+def finish_report(report, inventory, tile_depth=2):
+    """Fill in remote totals and 'complete' once every local tile has been tallied"""
+    for entry in report.values():
+        prefix = entry['remote_prefix']
+        entry['remote_files'] = 0
+        entry['remote_bytes'] = 0
+        for key in inventory.keys_under(prefix):
+            relative = key[len(prefix):]
+            if tile_depth is not None and relative.count('/') != tile_depth - 1:
+                continue
+            if f"/{PACK_DIR}/" in f"/{relative}":
+                continue
+            entry['remote_files'] += 1
+            entry['remote_bytes'] += inventory.get(key)[0]
+        entry['complete'] = entry['local_files'] > 0 and entry['matched'] == entry['local_files']
+    return report
+
+
+def compute_completeness(local_files, inventory, ledger=None, group_of=combination_group, tile_depth=2):
+    """
+    Per-combination completeness report
+
+    Args:
+        local_files: Iterable of upload records ({'s3_key', 'file_info': {'size', 'md5'}, ...})
+        inventory: SpacesInventory covering the destination keys
+        ledger: Optional UploadLedger; a tile recorded there with the same MD5
+            counts as uploaded even if the snapshot predates it
+        group_of: file_data -> (group_key, remote_prefix)
+        tile_depth: Path segments between remote_prefix and a tile (None = any depth)
+
+    Returns:
+        dict: group_key -> {local_files, local_bytes, remote_files, remote_bytes,
+                            matched, matched_bytes, ledger_only, changed, missing, complete}
+    """
+    report = {}
+    for file_data in local_files:
+        tally_file(report, file_data, inventory, ledger, group_of)
+    return finish_report(report, inventory, tile_depth)
+
+
+def group_by_city_map_type(report):
+    """
+    Fold a (city, map_type, district) report into {city: {map_type: info}}
+
+    KH-2025 districts are summed into their map type; the combination is
+    complete only when every district is, and 'districts' keeps the detail.
+    """
+    nested = {}
+    for (city, map_type, district), entry in report.items():
+        info = nested.setdefault(city, {}).get(map_type)
+        if info is None:
+            info = nested[city][map_type] = {field: 0 for field in entry if field not in ('remote_prefix', 'complete')}
+            info.update({'complete': True, 'districts': {}})
+        for field, value in entry.items():
+            if field in info and field not in ('complete', 'districts'):
+                info[field] += value
+        info['complete'] = info['complete'] and entry['complete']
+        if district:
+            info['districts'][district] = entry
+    for map_types in nested.values():
+        for info in map_types.values():
+            # summarize_prefix-compatible keys for existing callers
+            info['exists'] = info['remote_files'] > 0
+            info['file_count'] = info['remote_files']
+            info['total_size'] = info['remote_bytes']
+    return nested
+
+
+def describe(entry):
+    """Short status line for logs"""
+    if entry['complete']:
+        return f"COMPLETE ({entry['matched']:,}/{entry['local_files']:,} tiles)"
+    parts = [f"{entry['matched']:,}/{entry['local_files']:,} tiles"]
+    if entry['missing']:
+        parts.append(f"{entry['missing']:,} missing")
+    if entry['changed']:
+        parts.append(f"{entry['changed']:,} changed")
+    return f"INCOMPLETE ({', '.join(parts)})"
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Crawl-to-Spaces streaming pipeline
+Pushes every freshly downloaded tile body straight to the async upload engine
+from memory, instead of waiting for a later directory walk + hash + upload
+
+Author: AI Assistant
+Version: 1.0 - Streaming Upload Stage
+
+Runs on the downloader's event loop. Keys, metadata and book-keeping are the
+uploader's own (same s3_key layout, ExtraArgs, ledger and hash cache), so a
+later html_do_uploader run skips everything streamed here.
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from async_spaces_uploader import AsyncSpacesUploadEngine
+from file_hash_cache import SMALL_FILE_THRESHOLD, small_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlUploadPipeline:
+    def __init__(self, uploader, local_root='downloaded_tiles/cities', s3_prefix='guland-tiles',
+                 concurrency=64, max_pending=2000):
+        """
+        Initialize the streaming upload stage
+
+        Args:
+            uploader: EnhancedMultiMapSpacesUploader (credentials, metadata, ledger)
+            local_root: Directory the s3 keys are relative to (uploader --local-dir)
+            s3_prefix: S3 prefix (uploader --s3-prefix)
+            concurrency: PUTs in flight
+            max_pending: Queued tiles before downloads are paused
+        """
+        self.uploader = uploader
+        self.local_root = local_root
+        self.s3_prefix = s3_prefix
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+
+        self.engine = AsyncSpacesUploadEngine(
+            uploader.access_key, uploader.secret_key, uploader.endpoint_url, uploader.bucket_name,
+            uploader.region, concurrency=concurrency, timeout=uploader.upload_timeout,
+            retry_attempts=uploader.retry_attempts, rate_limiter=uploader.rate_limiter
+        )
+
+        self.queue = None
+        self.session = None
+        self.workers = []
+        self.stats = {'queued': 0, 'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'latency_total': 0.0}
+
+    async def start(self):
+        """Open the connection pool and start the upload workers"""
+        self.queue = asyncio.Queue()
+        self.session = self.engine.create_session()
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        logger.info(f"📡 Streaming uploads to {self.uploader.bucket_name}/{self.s3_prefix} ({self.concurrency} concurrent PUTs)")
+
+    async def close(self):
+        """Drain the queue, stop the workers and persist the ledger"""
+        if self.queue is None:
+            return
+
+        await self.queue.join()
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await self.session.close()
+        self.queue = None
+
+        self.uploader.save_resume_state()
+        if self.uploader.inventory:
+            self.uploader.inventory.save()
+
+        uploaded = self.stats['uploaded']
+        avg_latency = self.stats['latency_total'] / uploaded if uploaded else 0
+        logger.info(
+            f"📡 Streaming upload done: {uploaded:,} uploaded, {self.stats['skipped']:,} skipped, "
+            f"{self.stats['failed']:,} failed, {self.stats['bytes'] / 1024 / 1024:.1f} MB "
+            f"(avg {avg_latency:.2f}s download-to-Spaces)"
+        )
+
+    def enqueue(self, filepath, body=None):
+        """Queue a tile written to filepath; body=None reads it back from disk"""
+        if self.queue is None:
+            return
+        self.queue.put_nowait((filepath, body, time.time()))
+        self.stats['queued'] += 1
+
+    async def wait_for_capacity(self):
+        """Backpressure: hold the next download batch while the upload queue is full"""
+        while self.queue is not None and self.queue.qsize() >= self.max_pending:
+            await asyncio.sleep(0.05)
+
+    def describe(self, filepath):
+        """s3_key, city, map_type folder, district, zoom - exactly as the uploader's directory scan"""
+        file_data = self.uploader.describe_local_tile(filepath, self.local_root, self.s3_prefix)
+        return file_data['s3_key'], file_data['city'], file_data['map_type'], file_data['district'], file_data['zoom']
+
+    async def worker(self):
+        while True:
+            filepath, body, queued_at = await self.queue.get()
+            try:
+                await self.upload_tile(filepath, body, queued_at)
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.warning(f"⚠️ Streaming upload failed for {filepath}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def upload_tile(self, filepath, body, queued_at):
+        if body is None:
+            body = await asyncio.to_thread(self.engine.read_file, filepath)
+
+        s3_key, city, map_type, district, zoom = self.describe(filepath)
+        stat = os.stat(filepath)
+        large_file = stat.st_size >= SMALL_FILE_THRESHOLD
+        md5 = hashlib.md5(body).hexdigest() if large_file else small_file_hash(stat)
+
+        if self.uploader.ledger.is_uploaded(s3_key, md5):
+            self.stats['skipped'] += 1
+            return
+
+        file_info = self.uploader.build_file_info(filepath, stat, md5)
+        extra_args = self.uploader.build_upload_extra_args(filepath, s3_key, file_info, city, map_type, zoom, district)
+        result = await self.engine.put_body(self.session, body, s3_key, extra_args)
+
+        if not result['success']:
+            self.stats['failed'] += 1
+            self.uploader.stats.incr('failed_files')
+            logger.warning(f"⚠️ Streaming upload failed for {s3_key}: {result.get('error')}")
+            return
+
+        self.uploader.record_uploaded(s3_key, file_info, city, map_type, zoom)
+        if large_file:
+            # The next directory scan must not re-read this tile either
+            self.uploader.hash_cache.store_many([(filepath, *self.uploader.hash_cache.signature(stat), md5)])
+
+        self.stats['uploaded'] += 1
+        self.stats['bytes'] += len(body)
+        self.stats['latency_total'] += time.time() - queued_at
@@ -18,6 +18,10 @@ from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from botocore.exceptions import ClientError, NoCredentialsError
 from tqdm import tqdm
+from spaces_inventory import SpacesInventory
+from rate_limiter import get_shared_limiter
+from combination_completeness import compute_completeness, remote_matches, describe as describe_completeness
+import metrics
 import time
 
 # Setup logging
@@ -58,6 +62,7 @@ class DigitalOceanSpacesUploader:
                 aws_access_key_id=access_key,
                 aws_secret_access_key=secret_key
             )
+            metrics.instrument_s3_client(self.s3_client)
             
             # Test connection
             self.s3_client.head_bucket(Bucket=bucket_name)
@@ -85,6 +90,20 @@ class DigitalOceanSpacesUploader:
         # Create resume state file
         self.resume_file = 'upload_resume_state.json'
         self.uploaded_files = self.load_resume_state()
+        
+        # Bucket inventory snapshot (shared with the other Spaces tools)
+        self.inventory = None
+        
+        # Token-bucket rate limiting shared with the other Spaces clients
+        self.rate_limiter = get_shared_limiter()
+
+    def get_inventory(self, s3_prefix=''):
+        """Load the local bucket inventory for a prefix, refreshing stale shards"""
+        if self.inventory is None or self.inventory.prefix != s3_prefix.strip('/'):
+            self.inventory = SpacesInventory(
+                self.s3_client, self.bucket_name, prefix=s3_prefix, rate_limiter=self.rate_limiter.for_operation('LIST')
+            )
+        return self.inventory.ensure_fresh()
 
     def load_resume_state(self):
         """Load resume state from file"""
@@ -128,17 +147,29 @@ class DigitalOceanSpacesUploader:
             logger.error(f"❌ Error getting file info for {file_path}: {e}")
             return None
 
-    def file_exists_in_spaces(self, s3_key):
-        """Check if file already exists in Spaces"""
+    def file_exists_in_spaces(self, s3_key, file_info=None):
+        """Check if file already exists in Spaces (with the same content when file_info is given)"""
+        if self.inventory and s3_key.startswith(self.inventory.root_prefix()):
+            remote = self.inventory.get(s3_key)
+        else:
+            remote = self.head_remote(s3_key)
+        if remote is None:
+            return False
+        return file_info is None or remote_matches(remote, file_info['size'], file_info.get('md5'))
+
+    def head_remote(self, s3_key):
+        """(size, etag) of a key from a HEAD request, None when missing"""
         try:
-            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-            return True
+            self.rate_limiter.acquire('HEAD')
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            return response['ContentLength'], response.get('ETag', '').strip('"')
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
-                return False
+                return None
             else:
+                self.rate_limiter.check_error('HEAD', e)
                 logger.warning(f"⚠️ Error checking file existence: {e}")
-                return False
+                return None
 
     def upload_single_file(self, local_path, s3_key, file_info=None):
         """Upload a single file to Spaces with public ACL - WORKING VERSION"""
@@ -155,18 +186,6 @@ class DigitalOceanSpacesUploader:
                     'size': file_info['size'] if file_info else 0
                 }
             
-            # Check if file exists in Spaces (additional safety check)
-            if self.file_exists_in_spaces(s3_key):
-                logger.debug(f"⏭️ File exists in Spaces: {s3_key}")
-                self.uploaded_files.add(resume_key)
-                self.stats['skipped_files'] += 1
-                return {
-                    'success': True,
-                    'skipped': True,
-                    'file': s3_key,
-                    'size': file_info['size'] if file_info else 0
-                }
-            
             # Get file info if not provided
             if not file_info:
                 file_info = self.get_file_info(local_path)
@@ -177,6 +196,18 @@ class DigitalOceanSpacesUploader:
                         'file': s3_key
                     }
             
+            # Check Spaces (additional safety check): skip only when the remote copy has the same content
+            if self.file_exists_in_spaces(s3_key, file_info):
+                logger.debug(f"⏭️ File exists in Spaces: {s3_key}")
+                self.uploaded_files.add(f"{s3_key}:{file_info['md5']}")
+                self.stats['skipped_files'] += 1
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'file': s3_key,
+                    'size': file_info['size']
+                }
+            
             # Determine content type
             content_type, _ = mimetypes.guess_type(local_path)
             if not content_type:
@@ -205,6 +236,7 @@ class DigitalOceanSpacesUploader:
             }
             
             # 🚀 UPLOAD WITH PUBLIC ACL (tested and working!)
+            self.rate_limiter.acquire('PUT')
             self.s3_client.upload_file(
                 local_path,
                 self.bucket_name,
@@ -236,6 +268,7 @@ class DigitalOceanSpacesUploader:
             
         except Exception as e:
             logger.error(f"❌ Error uploading {local_path}: {e}")
+            self.rate_limiter.check_error('PUT', e)
             self.stats['failed_files'] += 1
             return {
                 'success': False,
@@ -469,31 +502,8 @@ class DigitalOceanSpacesUploader:
             
             logger.info(f"🔍 Checking if city exists: {city_prefix}")
             
-            # List objects with city prefix
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=city_prefix,
-                MaxKeys=1000  # Adjust based on expected files per city
-            )
-            
-            if 'Contents' not in response:
-                return {
-                    'exists': False,
-                    'file_count': 0,
-                    'total_size': 0,
-                    'sample_files': []
-                }
-            
-            contents = response['Contents']
-            total_size = sum(obj['Size'] for obj in contents)
-            sample_files = [obj['Key'] for obj in contents[:5]]  # First 5 files as sample
-            
-            return {
-                'exists': True,
-                'file_count': len(contents),
-                'total_size': total_size,
-                'sample_files': sample_files
-            }
+            # Exact counts from the inventory snapshot (no 1000-key cap)
+            return self.get_inventory(s3_prefix).summarize_prefix(city_prefix, sample_size=5)
             
         except Exception as e:
             logger.error(f"❌ Error checking city existence: {e}")
@@ -504,6 +514,51 @@ class DigitalOceanSpacesUploader:
                 'sample_files': []
             }
 
+    def iter_local_city_files(self, local_dir, cities, s3_prefix=''):
+        """Size-only upload records for every file of the given cities (no hashing)"""
+        for city in cities:
+            city_prefix = f"{s3_prefix}/{city}/" if s3_prefix else f"{city}/"
+            for root, dirs, files in os.walk(os.path.join(local_dir, city)):
+                for file in files:
+                    # Same skip rules as scan_directory
+                    if file.startswith('.') or file.endswith('.log'):
+                        continue
+                    local_path = os.path.join(root, file)
+                    try:
+                        size = os.path.getsize(local_path)
+                    except OSError:
+                        continue
+                    rel_path = os.path.relpath(local_path, local_dir).replace('\\', '/')
+                    yield {
+                        's3_key': f"{s3_prefix}/{rel_path}" if s3_prefix else rel_path,
+                        'file_info': {'size': size},
+                        'city': city,
+                        'city_prefix': city_prefix
+                    }
+
+    def check_cities_completeness(self, local_dir, cities, s3_prefix=''):
+        """
+        Per-city completeness: every local file present in Spaces with the same size
+
+        One walk of the local cities against the inventory snapshot.
+
+        Returns:
+            dict: city -> {'exists', 'file_count', 'total_size', 'local_files', 'matched', 'missing', 'changed', 'complete', ...}
+        """
+        report = compute_completeness(
+            self.iter_local_city_files(local_dir, cities, s3_prefix),
+            self.get_inventory(s3_prefix),
+            group_of=lambda file_data: (file_data['city'], file_data['city_prefix']),
+            tile_depth=None
+        )
+        for entry in report.values():
+            entry.update({
+                'exists': entry['remote_files'] > 0,
+                'file_count': entry['remote_files'],
+                'total_size': entry['remote_bytes']
+            })
+        return report
+
     def scan_cities_in_local_directory(self, local_dir):
         """
         Scan local directory to identify individual city folders
@@ -531,7 +586,7 @@ class DigitalOceanSpacesUploader:
 
     def filter_existing_cities(self, local_dir, s3_prefix='', skip_existing=True):
         """
-        Filter out cities that already exist in Spaces
+        Filter out cities that are already completely uploaded to Spaces
         
         Args:
             local_dir: Local directory containing city folders
@@ -553,23 +608,34 @@ class DigitalOceanSpacesUploader:
         print(f"\n🔍 CHECKING CITY EXISTENCE IN SPACES")
         print("=" * 40)
         
+        completeness = self.check_cities_completeness(local_dir, cities, s3_prefix)
+        
         for city in cities:
-            city_info = self.check_city_exists_in_spaces(city, s3_prefix)
+            city_info = completeness.get(city)
+            if city_info is None:
+                # No local files - nothing to add, whatever is in Spaces counts as complete
+                city_info = self.check_city_exists_in_spaces(city, s3_prefix)
+                city_info['complete'] = city_info['exists']
             city_status[city] = city_info
             
-            if city_info['exists']:
+            if city_info['complete']:
                 existing_cities.append(city)
                 size_mb = city_info['total_size'] / 1024 / 1024
-                print(f"✅ {city}: EXISTS ({city_info['file_count']} files, {size_mb:.1f} MB)")
+                detail = f" - {describe_completeness(city_info)}" if 'matched' in city_info else ''
+                print(f"✅ {city}: EXISTS ({city_info['file_count']} files, {size_mb:.1f} MB){detail}")
                 if not skip_existing:
                     cities_to_upload.append(city)
+            elif city_info['exists']:
+                # Half-uploaded: resume it, the per-file checks skip tiles already there with the same content
+                cities_to_upload.append(city)
+                print(f"⚠️ {city}: {describe_completeness(city_info)} - will resume")
             else:
                 cities_to_upload.append(city)
                 print(f"🆕 {city}: NOT FOUND - will upload")
         
         print(f"\n📊 SUMMARY:")
         print(f"  🏙️ Total cities found: {len(cities)}")
-        print(f"  ✅ Already exist: {len(existing_cities)}")
+        print(f"  ✅ Already complete: {len(existing_cities)}")
         print(f"  📤 To upload: {len(cities_to_upload)}")
         
         if existing_cities and skip_existing:
@@ -777,6 +843,7 @@ def create_sample_config():
         print("Please edit this file with your actual Digital Ocean Spaces credentials")
 
 def main():
+    metrics.start_exporters()  # $GULAND_METRICS_PORT / $GULAND_METRICS_TEXTFILE
     print("🚀 DIGITAL OCEAN SPACES UPLOADER")
     print("Upload city tiles to Digital Ocean Spaces")
     print("=" * 50)
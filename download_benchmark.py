@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Download-engine benchmark suite against a local tile-server stand-in
+Runs UltraOptimizedTileDownloader, PatternBasedTileCrawler and
+GulandTileDownloader over the same synthetic tile set served by
+local_tile_server, with varying worker counts
+
+Author: AI Assistant
+Version: 1.0 - Download Benchmark
+
+Each run happens in a fresh process and working directory (cold file
+caches, separate peak RSS). Reported per run: tiles/s, downloaded tiles/s,
+p50/p99 per-tile latency (request + disk write, measured in the engine),
+requests per TCP connection (counted by the server), CPU ms per tile and
+RSS sampled over time.
+
+Usage:
+    python download_benchmark.py [--engines ultra,pattern,guland] [--workers 10,50]
+                                 [--tiles 2000] [--latency-ms 40] [--not-found-rate 0.3]
+                                 [--error-rate 0.01] [--max-connections 64] [--baseline old_report.json]
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from local_tile_server import LocalTileServer, add_config_arguments, config_from_args
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ('ultra', 'pattern', 'guland')
+PATTERN_PATH = 'ha-noi-2030-2/{z}/{x}/{y}.png'
+HANOI = (21.0285, 105.8542)
+MEMORY_SAMPLE_INTERVAL = 0.25
+REGRESSION_THRESHOLD = 0.10  # Flag runs more than 10% slower than the baseline
+
+
+# ----------------------------------------------------------------------
+# Tile set
+# ----------------------------------------------------------------------
+
+def deg2num(lat_deg, lon_deg, zoom):
+    lat_rad = math.radians(lat_deg)
+    n = 2.0 ** zoom
+    return int((lon_deg + 180.0) / 360.0 * n), int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+
+
+def build_tile_list(base_urls, tile_count, zoom=16):
+    """A square block of tiles around Hanoi, spread round robin over the emulated hosts"""
+    side = max(1, math.ceil(math.sqrt(tile_count)))
+    center_x, center_y = deg2num(*HANOI, zoom)
+    tiles = []
+    for index in range(tile_count):
+        x = center_x - side // 2 + index % side
+        y = center_y - side // 2 + index // side
+        base_url = base_urls[index % len(base_urls)]
+        tiles.append({
+            'url': f"{base_url}/{PATTERN_PATH}".format(z=zoom, x=x, y=y),
+            'zoom': zoom,
+            'x': x,
+            'y': y,
+            'format': 'png'
+        })
+    return tiles
+
+
+# ----------------------------------------------------------------------
+# Child process: one engine run
+# ----------------------------------------------------------------------
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+class MemorySampler:
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        """RSS sampled on a background thread: [(seconds since start, MB)]"""
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='rss-sampler', daemon=True)
+
+    def run(self):
+        start = time.perf_counter()
+        while not self.stop_event.is_set():
+            self.samples.append((round(time.perf_counter() - start, 2), round(current_rss_mb(), 1)))
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+
+
+def timed(method, latencies):
+    """Wrap an engine's per-tile method to record its duration"""
+    if asyncio.iscoroutinefunction(method):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+    else:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_ultra(tiles, workers, latencies):
+    from html_pattern_crawler import UltraOptimizedTileDownloader
+    downloader = UltraOptimizedTileDownloader(
+        max_workers=workers, max_connections=workers, max_connections_per_host=workers
+    )
+    downloader.download_single_tile_async = timed(downloader.download_single_tile_async, latencies)
+
+    async def crawl():
+        results = []
+        for start in range(0, len(tiles), downloader.batch_size):
+            results.extend(await downloader.download_batch_async(tiles[start:start + downloader.batch_size], 'Hà Nội', 'QH_2030'))
+        return results
+
+    results = asyncio.run(crawl())
+    return [(result.success and result.status == 'downloaded', result.http_status) for result in results]
+
+
+def run_pattern(tiles, workers, latencies):
+    from pattern_based_tile_crawler import PatternBasedTileCrawler
+    crawler = PatternBasedTileCrawler(max_workers=workers)
+    crawler.download_single_tile_with_structure = timed(crawler.download_single_tile_with_structure, latencies)
+    results = crawler.download_tiles_batch_with_structure(tiles, 'hanoi')
+    return [(result.get('status') == 'downloaded', http_status(result.get('reason'))) for result in results]
+
+
+def run_guland(tiles, workers, latencies):
+    from tile_downloader import GulandTileDownloader
+    downloader = GulandTileDownloader(base_download_dir='downloaded_tiles', max_workers=workers)
+    downloader.download_single_tile = timed(downloader.download_single_tile, latencies)
+    results = downloader.download_tiles_batch(tiles, 'hanoi')
+    return [(result['success'] and not result.get('skipped'), http_status(result.get('error'))) for result in results]
+
+
+def http_status(reason):
+    """'HTTP 404' / '404 Client Error ...' -> 404"""
+    if not reason:
+        return None
+    for token in str(reason).replace(':', ' ').split():
+        if token.isdigit() and len(token) == 3:
+            return int(token)
+    return None
+
+
+RUNNERS = {'ultra': run_ultra, 'pattern': run_pattern, 'guland': run_guland}
+
+
+def run_engine(spec):
+    """Run one engine in this process; returns counts, timings, latency percentiles and memory samples"""
+    os.chdir(spec['workdir'])
+    sys.path.insert(0, REPO_DIR)
+    logging.disable(logging.INFO)  # Per-tile log lines are not what we are measuring
+
+    tiles = build_tile_list(spec['base_urls'], spec['tiles'], spec['zoom'])
+    latencies = []
+    with MemorySampler() as sampler:
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        outcomes = RUNNERS[spec['engine']](tiles, spec['workers'], latencies)
+        wall, cpu = time.perf_counter() - start, cpu_seconds() - cpu_start
+
+    latencies.sort()
+    return {
+        'tiles': len(tiles),
+        'downloaded': sum(1 for downloaded, _ in outcomes if downloaded),
+        'not_found': sum(1 for _, status in outcomes if status == 404),
+        'errors': sum(1 for downloaded, status in outcomes if not downloaded and status != 404),
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'memory_samples': sampler.samples
+    }
+
+
+# ----------------------------------------------------------------------
+# Parent: server, matrix and report
+# ----------------------------------------------------------------------
+
+def run_once(server, engine, workers, tiles, zoom, verbose=False):
+    server.stats.reset()
+    workdir = tempfile.mkdtemp(prefix=f"download_bench_{engine}_")
+    spec = {
+        'engine': engine,
+        'workers': workers,
+        'base_urls': server.base_urls,
+        'tiles': tiles,
+        'zoom': zoom,
+        'workdir': workdir
+    }
+    try:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-engine', json.dumps(spec)],
+            stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL, text=True, cwd=workdir
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    row = {'engine': engine, 'workers': workers}
+    lines = child.stdout.strip().splitlines()
+    try:
+        row.update(json.loads(lines[-1]))
+    except (IndexError, ValueError):
+        row['error'] = f"exit code {child.returncode}"
+    if 'error' in row:
+        return row
+
+    server_stats = server.stats.snapshot()
+    wall = max(row['wall_seconds'], 1e-9)
+    row.update({
+        'tiles_per_second': row['tiles'] / wall,
+        'downloaded_per_second': row['downloaded'] / wall,
+        'cpu_ms_per_tile': row['cpu_seconds'] / max(row['tiles'], 1) * 1000,
+        'server': server_stats,
+        'requests_per_connection': server_stats['requests_per_connection']
+    })
+    return row
+
+
+def compare_with_baseline(rows, baseline_file):
+    """Mark rows whose tiles/s dropped more than REGRESSION_THRESHOLD against a previous report"""
+    with open(baseline_file) as f:
+        baseline = {(row['engine'], row['workers']): row for row in json.load(f)['runs'] if 'error' not in row}
+    for row in rows:
+        previous = baseline.get((row['engine'], row['workers']))
+        if not previous or 'error' in row:
+            continue
+        change = row['tiles_per_second'] / previous['tiles_per_second'] - 1 if previous['tiles_per_second'] else 0
+        row['baseline_change'] = change
+        row['regression'] = change < -REGRESSION_THRESHOLD
+
+
+def print_table(rows):
+    print("\n📊 DOWNLOAD BENCHMARK")
+    print("=" * 104)
+    print(f"{'engine':<9}{'workers':>8}{'tiles/s':>10}{'dl/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'req/conn':>10}"
+          f"{'CPU ms/tile':>13}{'peak RSS MB':>13}{'404':>6}{'err':>6}{'vs base':>9}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['engine']:<9}{row['workers']:>8}   ❌ {row['error']}")
+            continue
+        change = f"{row['baseline_change'] * 100:+.0f}%" if 'baseline_change' in row else ''
+        flag = ' ⚠️' if row.get('regression') else ''
+        print(f"{row['engine']:<9}{row['workers']:>8}{row['tiles_per_second']:>10.1f}{row['downloaded_per_second']:>9.1f}"
+              f"{row['latency_p50_ms']:>9.1f}{row['latency_p99_ms']:>9.1f}{row['requests_per_connection']:>10.1f}"
+              f"{row['cpu_ms_per_tile']:>13.2f}{row['peak_rss_mb']:>13.1f}{row['not_found']:>6}{row['errors']:>6}"
+              f"{change:>9}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tile download engines against a local tile server')
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"Comma-separated engines (default: {','.join(ENGINES)})")
+    parser.add_argument('--workers', default='10,50', help='Comma-separated worker counts (default: 10,50)')
+    parser.add_argument('--tiles', type=int, default=2000, help='Tiles requested per run (default: 2000)')
+    parser.add_argument('--zoom', type=int, default=16, help='Zoom level of the tile block (default: 16)')
+    add_config_arguments(parser)
+    parser.add_argument('--baseline', help='Previous download_benchmark_report_*.json to compare tiles/s against')
+    parser.add_argument('--verbose', action='store_true', help='Show the engines\' own logs')
+    parser.add_argument('--run-engine', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_engine:
+        # Child process: result as the last stdout line
+        try:
+            result = run_engine(json.loads(args.run_engine))
+        except Exception as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+        print(json.dumps(result))
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    engines = [name for name in args.engines.split(',') if name]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    worker_counts = [int(workers) for workers in args.workers.split(',')]
+
+    config = config_from_args(args)
+    rows = []
+    with LocalTileServer(config) as server:
+        for engine in engines:
+            for workers in worker_counts:
+                logger.info(f"🏁 {engine} with {workers} workers, {args.tiles:,} tiles...")
+                rows.append(run_once(server, engine, workers, args.tiles, args.zoom, args.verbose))
+
+    if args.baseline:
+        compare_with_baseline(rows, args.baseline)
+    print_table(rows)
+
+    report_file = f"download_benchmark_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w') as f:
+        json.dump({
+            'generated': datetime.now().isoformat(),
+            'server': config.as_dict(),
+            'settings': {key: value for key, value in vars(args).items() if key != 'run_engine'},
+            'runs': rows
+        }, f, indent=2)
+    print(f"\n📋 Report saved: {report_file}")
+    if any(row.get('regression') for row in rows):
+        print(f"⚠️ Throughput regressions over {REGRESSION_THRESHOLD:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
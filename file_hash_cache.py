@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Persistent file hash cache for the Spaces uploaders
+(path, size, mtime, inode) -> MD5, so unchanged tiles are never re-read
+
+Author: AI Assistant
+Version: 1.0 - Stat-based Hash Cache
+
+Only new or changed files are hashed, in a process pool; everything else is
+answered from a SQLite (WAL) table with batched lookups.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HASH_CACHE_PATH = 'file_hash_cache.db'
+SMALL_FILE_THRESHOLD = 1024  # Files below this get a stat-derived pseudo hash
+LOOKUP_BATCH = 500
+
+
+def small_file_hash(stat):
+    """Pseudo hash used for tiny files - not worth reading"""
+    return f"small_file_{stat.st_size}_{stat.st_mtime}"
+
+
+def compute_md5(file_path):
+    """MD5 of a file (runs in worker processes); None on error"""
+    try:
+        hash_md5 = hashlib.md5()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(65536):
+                hash_md5.update(chunk)
+        return hash_md5.hexdigest()
+    except OSError:
+        return None
+
+
+class FileHashCache:
+    def __init__(self, db_path=DEFAULT_HASH_CACHE_PATH, max_workers=None):
+        """
+        Open (or create) the hash cache
+
+        Args:
+            db_path: SQLite file
+            max_workers: Hashing processes (default: CPU count)
+        """
+        self.db_path = db_path
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    inode INTEGER,
+                    md5 TEXT,
+                    hashed_at REAL
+                )
+            ''')
+
+        self.stats = {'hits': 0, 'hashed': 0, 'small': 0, 'errors': 0}
+        self._pool = None  # Started on first use, reused by every batch
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        self.conn.close()
+
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    @staticmethod
+    def signature(stat):
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def lookup_many(self, paths):
+        """path -> (size, mtime_ns, inode, md5) for every cached path"""
+        found = {}
+        with self._lock:
+            for i in range(0, len(paths), LOOKUP_BATCH):
+                batch = paths[i:i + LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.conn.execute(
+                    f'SELECT path, size, mtime_ns, inode, md5 FROM hashes WHERE path IN ({placeholders})',
+                    batch
+                )
+                for path, size, mtime_ns, inode, md5 in rows:
+                    found[path] = (size, mtime_ns, inode, md5)
+        return found
+
+    def store_many(self, rows):
+        """rows: iterable of (path, size, mtime_ns, inode, md5)"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, md5, hashed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(*row, now) for row in rows]
+            )
+
+    def add_stats(self, counts):
+        """Fold one batch's counters into stats (batches run on scanner worker threads)"""
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def get_hash(self, file_path, stat=None):
+        """Hash of a single file (cached)"""
+        return self.get_hashes({file_path: stat or os.stat(file_path)}).get(file_path)
+
+    def get_hashes(self, path_stats, show_progress=False):
+        """
+        Hashes for many files, reading only those that are new or changed
+
+        Args:
+            path_stats: dict path -> os.stat_result
+            show_progress: Log a summary when hashing was needed
+
+        Returns:
+            dict path -> md5 (files that could not be read are omitted)
+        """
+        hashes = {}
+        counts = {'hits': 0, 'hashed': 0, 'small': 0, 'errors': 0}
+        large_paths = []
+        for path, stat in path_stats.items():
+            if stat.st_size < SMALL_FILE_THRESHOLD:
+                hashes[path] = small_file_hash(stat)
+                counts['small'] += 1
+            else:
+                large_paths.append(path)
+
+        cached = self.lookup_many(large_paths)
+        to_hash = []
+        for path in large_paths:
+            entry = cached.get(path)
+            if entry and entry[:3] == self.signature(path_stats[path]):
+                hashes[path] = entry[3]
+                counts['hits'] += 1
+            else:
+                to_hash.append(path)
+
+        if not to_hash:
+            self.add_stats(counts)
+            return hashes
+
+        start_time = time.time()
+        new_rows = []
+        if len(to_hash) < 32:
+            results = map(compute_md5, to_hash)
+            new_rows = self.collect(to_hash, results, path_stats, hashes, counts)
+        else:
+            results = self.pool().map(compute_md5, to_hash, chunksize=64)
+            new_rows = self.collect(to_hash, results, path_stats, hashes, counts)
+
+        self.store_many(new_rows)
+        self.add_stats(counts)
+        if show_progress:
+            logger.info(
+                f"🔑 Hashed {len(new_rows):,} new/changed files in {time.time() - start_time:.1f}s "
+                f"({counts['hits']:,} unchanged files skipped)"
+            )
+        return hashes
+
+    def collect(self, paths, results, path_stats, hashes, counts):
+        rows = []
+        for path, md5 in zip(paths, results):
+            if md5 is None:
+                counts['errors'] += 1
+                continue
+            hashes[path] = md5
+            rows.append((path, *self.signature(path_stats[path]), md5))
+            counts['hashed'] += 1
+        return rows
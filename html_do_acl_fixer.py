@@ -15,10 +15,19 @@ import json
 import boto3
 import logging
 import time
+import queue
+import random
+import threading
+from itertools import islice, chain
+from collections import deque
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from botocore.exceptions import ClientError, NoCredentialsError
 from tqdm import tqdm
+from spaces_inventory import SpacesInventory
+from upload_ledger import UploadLedger
+from rate_limiter import get_shared_limiter
+import metrics
 import argparse
 import sys
 
@@ -60,6 +69,7 @@ class DigitalOceanSpacesACLFixer:
                 aws_access_key_id=access_key,
                 aws_secret_access_key=secret_key
             )
+            metrics.instrument_s3_client(self.s3_client)
             
             # Test connection
             self.s3_client.head_bucket(Bucket=bucket_name)
@@ -83,65 +93,71 @@ class DigitalOceanSpacesACLFixer:
             'start_time': None,
             'end_time': None,
             'total_size_bytes': 0,
-            'fixed_size_bytes': 0
+            'fixed_size_bytes': 0,
+            'api_calls': 0,
+            'api_calls_saved': 0,
+            'blind_fixed': 0,
+            'verified_samples': 0,
+            'ledger_mismatches': 0
         }
+        self._stats_lock = threading.Lock()  # stats and distrusted_prefixes are updated by every fix worker
         
-        # Rate limiting
-        self.api_call_count = 0
-        self.last_api_reset = time.time()
-        self.max_api_calls_per_second = 100  # Conservative limit
+        # Rate limiting (token buckets shared with every Spaces client in this process)
+        self.rate_limiter = get_shared_limiter()
         
-        # Resume state
+        # ACL-state index (upload ledger): known-public objects are skipped, known-private ones
+        # get a blind PUT; a sample of the skipped ones is re-checked to keep the ledger honest
+        self.verify_sample_rate = 0.01
+        self.distrusted_prefixes = set()  # Prefixes where a sample contradicted the ledger
+        
+        # Streaming listing: shard by <prefix>/<city>/<map_type>/<zoom|district> and list shards in parallel
+        self.list_workers = 16
+        self.shard_depth = 3
+        self.max_buffered_pages = 64  # Bounds listing memory to ~64k objects ahead of the fix workers
+        
+        # Resume state - shared SQLite ledger, legacy JSON imported once
         self.resume_file = 'acl_fix_resume_state.json'
-        self.processed_objects = self.load_resume_state()
+        self.ledger = UploadLedger()
+        self.load_resume_state()
 
     def load_resume_state(self):
-        """Load resume state from file"""
+        """Import the legacy JSON resume file into the ledger (once)"""
         try:
-            if os.path.exists(self.resume_file):
-                with open(self.resume_file, 'r') as f:
-                    data = json.load(f)
-                    processed = set(data.get('processed_objects', []))
-                    logger.info(f"📋 Loaded resume state: {len(processed)} objects already processed")
-                    return processed
+            self.ledger.import_legacy_acl_state(self.resume_file)
         except Exception as e:
-            logger.warning(f"⚠️ Could not load resume state: {e}")
+            logger.warning(f"⚠️ Could not import legacy resume state: {e}")
         
-        return set()
+        logger.info(f"📋 Upload ledger: {self.ledger.count(acl='public-read'):,} objects known to be public")
 
     def save_resume_state(self):
-        """Save resume state for recovery"""
+        """Commit buffered ledger writes and the current stats"""
         try:
-            resume_data = {
-                'processed_objects': list(self.processed_objects),
-                'stats': self.stats.copy(),
+            self.ledger.flush()
+            self.ledger.set_meta('last_acl_fix_stats', {
+                'stats': self.stats_snapshot(),
                 'timestamp': datetime.now().isoformat()
-            }
-            
-            with open(self.resume_file, 'w') as f:
-                json.dump(resume_data, f, indent=2)
+            })
                 
         except Exception as e:
             logger.warning(f"⚠️ Could not save resume state: {e}")
 
-    def rate_limit_check(self):
-        """Implement rate limiting to avoid throttling"""
-        current_time = time.time()
-        
-        # Reset counter every second
-        if current_time - self.last_api_reset >= 1.0:
-            self.api_call_count = 0
-            self.last_api_reset = current_time
-        
-        # If approaching limit, sleep briefly
-        if self.api_call_count >= self.max_api_calls_per_second:
-            sleep_time = 1.0 - (current_time - self.last_api_reset)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-                self.api_call_count = 0
-                self.last_api_reset = time.time()
-        
-        self.api_call_count += 1
+    def count(self, **deltas):
+        """Add to the shared stats counters from a worker thread"""
+        with self._stats_lock:
+            for name, value in deltas.items():
+                self.stats[name] += value
+
+    def stats_snapshot(self):
+        with self._stats_lock:
+            return self.stats.copy()
+
+    def is_distrusted(self, prefix):
+        with self._stats_lock:
+            return prefix in self.distrusted_prefixes
+
+    def rate_limit_check(self, operation='ACL'):
+        """Wait for a token from the shared limiter to avoid throttling"""
+        self.rate_limiter.acquire(operation)
 
     def check_object_acl(self, object_key):
         """
@@ -156,6 +172,7 @@ class DigitalOceanSpacesACLFixer:
         """
         try:
             self.rate_limit_check()
+            self.count(api_calls=1)
             
             # Get object ACL
             response = self.s3_client.get_object_acl(
@@ -198,6 +215,7 @@ class DigitalOceanSpacesACLFixer:
             
         except ClientError as e:
             error_code = e.response['Error']['Code']
+            self.rate_limiter.check_error('ACL', e)
             return {
                 'is_public': False,
                 'grantees': [],
@@ -222,6 +240,7 @@ class DigitalOceanSpacesACLFixer:
         """
         try:
             self.rate_limit_check()
+            self.count(api_calls=1)
             
             # Set public-read ACL
             self.s3_client.put_object_acl(
@@ -240,6 +259,7 @@ class DigitalOceanSpacesACLFixer:
         except ClientError as e:
             error_msg = f"ClientError {e.response['Error']['Code']}: {e.response['Error']['Message']}"
             logger.error(f"❌ Failed to fix ACL for {object_key}: {error_msg}")
+            self.rate_limiter.check_error('ACL', e)
             return {
                 'success': False,
                 'error': error_msg
@@ -266,15 +286,27 @@ class DigitalOceanSpacesACLFixer:
         object_key = obj_info['Key']
         object_size = obj_info.get('Size', 0)
         
-        # Skip if already processed (resume functionality)
-        if object_key in self.processed_objects:
-            logger.debug(f"⏭️ Skipping already processed: {object_key}")
-            return {
-                'object_key': object_key,
-                'action': 'skipped',
-                'already_processed': True,
-                'size': object_size
-            }
+        # Consult the ACL-state index before spending a GET
+        known_acl = self.ledger.get_acl(object_key)
+        prefix = os.path.dirname(object_key)
+        verifying = False
+        
+        if known_acl == 'public-read' and not self.is_distrusted(prefix):
+            if random.random() >= self.verify_sample_rate:
+                self.count(api_calls_saved=1)
+                logger.debug(f"⏭️ Skipping known public: {object_key}")
+                return {
+                    'object_key': object_key,
+                    'action': 'skipped',
+                    'already_processed': True,
+                    'size': object_size
+                }
+            verifying = True  # Sampled: check that the ledger is still right
+        
+        elif known_acl == 'private' and not dry_run:
+            # Known private - no need to look before fixing
+            self.count(api_calls_saved=1, blind_fixed=1)
+            return self.apply_public_acl(object_key, object_size)
         
         # Check current ACL
         acl_check = self.check_object_acl(object_key)
@@ -289,12 +321,20 @@ class DigitalOceanSpacesACLFixer:
             }
         
         # Update stats
-        self.stats['checked_objects'] += 1
+        self.count(checked_objects=1)
+        
+        if verifying:
+            self.count(verified_samples=1)
+            if not acl_check['is_public']:
+                with self._stats_lock:
+                    self.stats['ledger_mismatches'] += 1
+                    self.distrusted_prefixes.add(prefix)
+                logger.warning(f"⚠️ Ledger says public but {object_key} is private - re-checking everything under {prefix}/")
         
         if acl_check['is_public']:
             # Already public
-            self.stats['public_objects'] += 1
-            self.processed_objects.add(object_key)
+            self.count(public_objects=1)
+            self.ledger.record_acl(object_key, 'public-read', object_size)
             
             logger.debug(f"✅ Already public: {object_key}")
             return {
@@ -304,7 +344,8 @@ class DigitalOceanSpacesACLFixer:
             }
         else:
             # Needs fixing
-            self.stats['private_objects'] += 1
+            self.count(private_objects=1)
+            self.ledger.record_acl(object_key, 'private', object_size)
             
             if dry_run:
                 logger.info(f"🔍 [DRY RUN] Would fix ACL for: {object_key}")
@@ -315,164 +356,253 @@ class DigitalOceanSpacesACLFixer:
                     'size': object_size
                 }
             else:
-                # Actually fix the ACL
-                fix_result = self.set_object_public_acl(object_key)
+                return self.apply_public_acl(object_key, object_size)
+
+    def apply_public_acl(self, object_key, object_size):
+        """Set public-read and record the outcome"""
+        fix_result = self.set_object_public_acl(object_key)
+        
+        if fix_result['success']:
+            self.count(fixed_objects=1, fixed_size_bytes=object_size)
+            self.ledger.record_acl(object_key, 'public-read', object_size)
+            
+            logger.info(f"🔧 Fixed ACL for: {object_key}")
+            return {
+                'object_key': object_key,
+                'action': 'fixed',
+                'size': object_size
+            }
+        else:
+            self.count(failed_objects=1)
+            
+            logger.error(f"❌ Failed to fix ACL for {object_key}: {fix_result['error']}")
+            return {
+                'object_key': object_key,
+                'action': 'failed_fix',
+                'error': fix_result['error'],
+                'size': object_size
+            }
+
+    def iter_objects_from_inventory(self, prefix=''):
+        """Objects from the local bucket inventory snapshot instead of the API"""
+        root = prefix.strip('/').split('/')[0] if prefix else ''
+        inventory = SpacesInventory(self.s3_client, self.bucket_name, prefix=root, rate_limiter=self.rate_limiter.for_operation('LIST'))
+        inventory.ensure_fresh()
+        return inventory.iter_objects(prefix)
+
+    def iter_objects_sharded(self, prefix=''):
+        """
+        Stream every object under prefix, listing shards in parallel
+        
+        Delimiter listings expand the prefix tree down to shard_depth levels
+        (city/map_type/zoom); each shard is then paged by its own worker. Pages
+        go through a bounded queue, so the first objects arrive after one LIST
+        call and memory stays flat however large the bucket is.
+        """
+        pages = queue.Queue(maxsize=self.max_buffered_pages)
+        stop = threading.Event()
+        outstanding = [0]
+        outstanding_lock = threading.Lock()
+        shard_done = object()
+        failed_shards = []
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def submit(executor, task, shard_prefix, depth=None):
+            with outstanding_lock:
+                outstanding[0] += 1
+            try:
+                executor.submit(run, executor, task, shard_prefix, depth)
+            except RuntimeError:
+                # Executor already shut down (consumer stopped early)
+                with outstanding_lock:
+                    outstanding[0] -= 1
+        
+        def run(executor, task, shard_prefix, depth):
+            try:
+                task(executor, shard_prefix, depth)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not list {shard_prefix}: {e}")
+                failed_shards.append(shard_prefix)
+            finally:
+                put(shard_done)
+        
+        def expand(executor, shard_prefix, depth):
+            """One level of the prefix tree: objects at this level plus sub-prefixes"""
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=shard_prefix, Delimiter='/'):
+                if stop.is_set():
+                    return
+                self.rate_limit_check('LIST')
+                for common_prefix in page.get('CommonPrefixes', []):
+                    child = common_prefix['Prefix']
+                    if depth + 1 >= self.shard_depth:
+                        submit(executor, list_shard, child)
+                    else:
+                        submit(executor, expand, child, depth + 1)
+                if page.get('Contents') and not put(page['Contents']):
+                    return
+        
+        def list_shard(executor, shard_prefix, depth):
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=shard_prefix, PaginationConfig={'PageSize': 1000}):
+                if stop.is_set():
+                    return
+                self.rate_limit_check('LIST')
+                if page.get('Contents') and not put(page['Contents']):
+                    return
+        
+        executor = ThreadPoolExecutor(max_workers=self.list_workers)
+        # A prefix that is not a "directory" (e.g. guland-tiles/han) is listed as a single shard
+        if prefix and not prefix.endswith('/'):
+            submit(executor, list_shard, prefix)
+        else:
+            submit(executor, expand, prefix, 0)
+        
+        try:
+            while True:
+                with outstanding_lock:
+                    if outstanding[0] == 0 and pages.empty():
+                        break
+                try:
+                    item = pages.get(timeout=0.5)
+                except queue.Empty:
+                    continue
                 
-                if fix_result['success']:
-                    self.stats['fixed_objects'] += 1
-                    self.stats['fixed_size_bytes'] += object_size
-                    self.processed_objects.add(object_key)
-                    
-                    logger.info(f"🔧 Fixed ACL for: {object_key}")
-                    return {
-                        'object_key': object_key,
-                        'action': 'fixed',
-                        'size': object_size
-                    }
+                if item is shard_done:
+                    with outstanding_lock:
+                        outstanding[0] -= 1
                 else:
-                    self.stats['failed_objects'] += 1
-                    
-                    logger.error(f"❌ Failed to fix ACL for {object_key}: {fix_result['error']}")
-                    return {
-                        'object_key': object_key,
-                        'action': 'failed_fix',
-                        'error': fix_result['error'],
-                        'size': object_size
-                    }
-
-    def list_all_objects(self, prefix='', max_keys=None):
+                    yield from item
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            if failed_shards:
+                logger.warning(f"⚠️ {len(failed_shards)} prefixes could not be listed - rerun to cover them")
+
+    def iter_all_objects(self, prefix='', max_keys=None, from_inventory=False):
         """
-        List all objects in bucket with optional prefix filter
+        Stream objects (with optional prefix filter), counting them into stats as they pass
         
         Args:
             prefix: Object key prefix to filter by
-            max_keys: Maximum number of objects to return (None for all)
-            
-        Returns:
-            list: List of object info dictionaries
+            max_keys: Stop after this many objects (None for all)
+            from_inventory: Read the local inventory snapshot instead of listing
         """
         logger.info(f"🔍 Listing objects with prefix: '{prefix}'")
         
-        all_objects = []
-        continuation_token = None
-        page_count = 0
+        if from_inventory:
+            objects = self.iter_objects_from_inventory(prefix)
+        else:
+            objects = self.iter_objects_sharded(prefix)
         
         try:
-            while True:
-                page_count += 1
-                
-                # Prepare list_objects_v2 parameters
-                list_params = {
-                    'Bucket': self.bucket_name,
-                    'Prefix': prefix,
-                    'MaxKeys': min(1000, max_keys - len(all_objects)) if max_keys else 1000
-                }
-                
-                if continuation_token:
-                    list_params['ContinuationToken'] = continuation_token
-                
-                # Rate limiting
-                self.rate_limit_check()
-                
-                # List objects
-                response = self.s3_client.list_objects_v2(**list_params)
-                
-                # Add objects from this page
-                page_objects = response.get('Contents', [])
-                all_objects.extend(page_objects)
-                
-                # Update total size
-                page_size = sum(obj.get('Size', 0) for obj in page_objects)
-                self.stats['total_size_bytes'] += page_size
-                
-                logger.debug(f"📄 Page {page_count}: {len(page_objects)} objects ({page_size/1024/1024:.1f} MB)")
-                
-                # Check if we should continue
-                if not response.get('IsTruncated', False):
-                    break
-                    
-                if max_keys and len(all_objects) >= max_keys:
-                    all_objects = all_objects[:max_keys]
-                    break
-                
-                continuation_token = response.get('NextContinuationToken')
-                
-                # Safety break for very large buckets
-                if page_count > 10000:  # More than 10M objects
-                    logger.warning("⚠️ Reached safety limit of 10M objects. Consider using prefix filtering.")
-                    break
-        
-        except Exception as e:
-            logger.error(f"❌ Error listing objects: {e}")
-            raise
-        
-        self.stats['total_objects'] = len(all_objects)
-        logger.info(f"📊 Found {len(all_objects):,} objects ({self.stats['total_size_bytes']/1024/1024:.1f} MB total)")
+            for obj in islice(objects, max_keys):
+                self.count(total_objects=1, total_size_bytes=obj.get('Size', 0))
+                yield obj
+        finally:
+            if hasattr(objects, 'close'):
+                objects.close()  # Stops the listing workers when we end early
+        
+        logger.info(f"📊 Listed {self.stats['total_objects']:,} objects ({self.stats['total_size_bytes']/1024/1024:.1f} MB total)")
+
+    def list_all_objects(self, prefix='', max_keys=None, from_inventory=False):
+        """
+        List all objects in bucket with optional prefix filter
         
-        return all_objects
+        Args:
+            prefix: Object key prefix to filter by
+            max_keys: Maximum number of objects to return (None for all)
+            from_inventory: Read the local inventory snapshot instead of listing
+            
+        Returns:
+            list: List of object info dictionaries
+        """
+        return list(self.iter_all_objects(prefix, max_keys, from_inventory))
 
     def fix_acl_batch(self, objects, max_workers=5, dry_run=False):
         """
-        Fix ACL for a batch of objects using parallel processing
+        Fix ACL for a stream of objects using parallel processing
         
         Args:
-            objects: List of object info dictionaries
+            objects: Iterable of object info dictionaries (list or streaming listing)
             max_workers: Number of parallel workers
             dry_run: If True, only check without fixing
         """
-        if not objects:
-            logger.warning("⚠️ No objects to process")
-            return
-        
         mode_text = "DRY RUN" if dry_run else "FIXING"
-        logger.info(f"🚀 Starting {mode_text} for {len(objects):,} objects with {max_workers} workers")
+        total = len(objects) if isinstance(objects, list) else None
+        logger.info(f"🚀 Starting {mode_text} for {f'{total:,}' if total is not None else 'streamed'} objects with {max_workers} workers")
+        
+        objects = iter(objects)
+        processed = 0
         
-        # Process objects in parallel
+        # Process objects in parallel, keeping only a small window of futures in flight
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            with tqdm(total=len(objects), desc=f"{mode_text} ACLs", unit="object") as pbar:
+            with tqdm(total=total, desc=f"{mode_text} ACLs", unit="object") as pbar:
                 
-                # Submit all tasks
-                future_to_object = {
-                    executor.submit(self.process_single_object, obj, dry_run): obj 
-                    for obj in objects
-                }
+                active_futures = deque()
+                
+                def submit_next():
+                    obj = next(objects, None)
+                    if obj is None:
+                        return False
+                    active_futures.append((executor.submit(self.process_single_object, obj, dry_run), obj))
+                    return True
+                
+                while len(active_futures) < max_workers * 4 and submit_next():
+                    pass
                 
-                # Process completed tasks
-                for future in as_completed(future_to_object):
-                    obj_info = future_to_object[future]
+                while active_futures:
+                    done, _ = wait([future for future, _ in active_futures], return_when=FIRST_COMPLETED)
                     
-                    try:
-                        result = future.result()
+                    remaining = deque()
+                    for future, obj_info in active_futures:
+                        if future not in done:
+                            remaining.append((future, obj_info))
+                            continue
                         
-                        # Update progress bar with meaningful status
-                        action = result.get('action', 'unknown')
-                        object_key = result.get('object_key', 'unknown')
-                        
-                        if action == 'already_public':
-                            pbar.set_postfix(status=f"✅ {os.path.basename(object_key)}")
-                        elif action == 'fixed':
-                            pbar.set_postfix(status=f"🔧 {os.path.basename(object_key)}")
-                        elif action == 'would_fix':
-                            pbar.set_postfix(status=f"🔍 {os.path.basename(object_key)}")
-                        elif action == 'failed_fix':
-                            pbar.set_postfix(status=f"❌ {os.path.basename(object_key)}")
-                        elif action == 'skipped':
-                            pbar.set_postfix(status=f"⏭️ {os.path.basename(object_key)}")
-                        
-                        pbar.update(1)
-                        
-                        # Save resume state periodically
-                        if len(self.processed_objects) % 100 == 0:
-                            self.save_resume_state()
+                        try:
+                            result = future.result()
                             
-                    except Exception as e:
-                        logger.error(f"❌ Task error for {obj_info.get('Key', 'unknown')}: {e}")
+                            # Update progress bar with meaningful status
+                            action = result.get('action', 'unknown')
+                            object_key = result.get('object_key', 'unknown')
+                            
+                            if action == 'already_public':
+                                pbar.set_postfix(status=f"✅ {os.path.basename(object_key)}")
+                            elif action == 'fixed':
+                                pbar.set_postfix(status=f"🔧 {os.path.basename(object_key)}")
+                            elif action == 'would_fix':
+                                pbar.set_postfix(status=f"🔍 {os.path.basename(object_key)}")
+                            elif action == 'failed_fix':
+                                pbar.set_postfix(status=f"❌ {os.path.basename(object_key)}")
+                            elif action == 'skipped':
+                                pbar.set_postfix(status=f"⏭️ {os.path.basename(object_key)}")
+                            
+                        except Exception as e:
+                            logger.error(f"❌ Task error for {obj_info.get('Key', 'unknown')}: {e}")
+                        
+                        processed += 1
                         pbar.update(1)
+                    
+                    active_futures = remaining
+                    while len(active_futures) < max_workers * 4 and submit_next():
+                        pass
+        
+        if processed == 0:
+            logger.warning("⚠️ No objects to process")
         
         # Final save of resume state
         self.save_resume_state()
 
-    def fix_bucket_acl(self, prefix='', max_workers=5, dry_run=False, max_objects=None):
+    def fix_bucket_acl(self, prefix='', max_workers=5, dry_run=False, max_objects=None, from_inventory=False):
         """
         Main method to fix ACL for entire bucket or filtered objects
         
@@ -481,6 +611,7 @@ class DigitalOceanSpacesACLFixer:
             max_workers: Number of parallel workers
             dry_run: If True, only check without fixing
             max_objects: Maximum number of objects to process
+            from_inventory: Take the object list from the inventory snapshot
         """
         logger.info(f"🚀 Starting ACL fix process")
         logger.info(f"🪣 Bucket: {self.bucket_name}")
@@ -491,27 +622,27 @@ class DigitalOceanSpacesACLFixer:
         
         self.stats['start_time'] = time.time()
         
-        # List all objects
-        print("\n🔍 LISTING OBJECTS...")
-        objects = self.list_all_objects(prefix, max_objects)
+        # Stream the listing straight into the fix workers
+        print("\n🔍 LISTING OBJECTS (streaming)...")
+        objects = self.iter_all_objects(prefix, max_objects, from_inventory)
         
-        if not objects:
+        # Show preview of the first page
+        preview = list(islice(objects, 10))
+        if not preview:
             logger.warning("⚠️ No objects found to process")
             return
-        
-        # Show preview
-        self.show_object_preview(objects, prefix)
+        self.show_object_preview(preview, prefix)
         
         # Process objects
         print(f"\n🔧 PROCESSING OBJECTS...")
-        self.fix_acl_batch(objects, max_workers, dry_run)
+        self.fix_acl_batch(chain(preview, objects), max_workers, dry_run)
         
         # Generate report
         self.stats['end_time'] = time.time()
         self.generate_acl_fix_report(dry_run)
 
     def show_object_preview(self, objects, prefix):
-        """Show preview of objects to be processed"""
+        """Show preview of the first objects to be processed"""
         print(f"\n📋 OBJECT PREVIEW:")
         print("=" * 40)
         
@@ -530,11 +661,7 @@ class DigitalOceanSpacesACLFixer:
             else:
                 print(f"  📄 {key} - {size_mb:.2f} MB")
         
-        if len(objects) > 10:
-            print(f"  ... and {len(objects) - 10:,} more objects")
-        
-        total_size_mb = sum(obj.get('Size', 0) for obj in objects) / 1024 / 1024
-        print(f"\n📊 TOTAL: {len(objects):,} objects ({total_size_mb:.1f} MB)")
+        print(f"  ... remaining objects are processed as the listing streams in")
 
     def generate_acl_fix_report(self, dry_run=False):
         """Generate comprehensive report of ACL fix process"""
@@ -561,7 +688,15 @@ class DigitalOceanSpacesACLFixer:
                 'fixed_objects': self.stats['fixed_objects'],
                 'failed_objects': self.stats['failed_objects'],
                 'public_percentage': (self.stats['public_objects'] / self.stats['checked_objects'] * 100) if self.stats['checked_objects'] > 0 else 0,
-                'fix_success_rate': (self.stats['fixed_objects'] / self.stats['private_objects'] * 100) if self.stats['private_objects'] > 0 else 0
+                'fix_success_rate': (self.stats['fixed_objects'] / (self.stats['private_objects'] + self.stats['blind_fixed']) * 100) if self.stats['private_objects'] + self.stats['blind_fixed'] > 0 else 0
+            },
+            'acl_index': {
+                'api_calls': self.stats['api_calls'],
+                'api_calls_saved': self.stats['api_calls_saved'],
+                'blind_fixed': self.stats['blind_fixed'],
+                'verified_samples': self.stats['verified_samples'],
+                'ledger_mismatches': self.stats['ledger_mismatches'],
+                'distrusted_prefixes': sorted(self.distrusted_prefixes)
             },
             'data_info': {
                 'total_size_bytes': self.stats['total_size_bytes'],
@@ -573,7 +708,8 @@ class DigitalOceanSpacesACLFixer:
                 'objects_per_second': objects_per_second,
                 'start_time': datetime.fromtimestamp(self.stats['start_time']).isoformat(),
                 'end_time': datetime.fromtimestamp(self.stats['end_time']).isoformat(),
-                'api_calls_estimated': self.api_call_count
+                'api_calls_estimated': self.rate_limiter.total_calls(),
+                'rate_limits': self.rate_limiter.get_stats()
             }
         }
         
@@ -613,16 +749,24 @@ class DigitalOceanSpacesACLFixer:
         
         print(f"📈 Processing rate: {report['performance']['objects_per_second']:.1f} objects/sec")
         
+        acl_index = report['acl_index']
+        baseline_calls = acl_index['api_calls'] + acl_index['api_calls_saved']
+        if baseline_calls:
+            print(f"📉 API calls: {acl_index['api_calls']:,} ({acl_index['api_calls_saved']:,} saved by the ledger, "
+                  f"{acl_index['api_calls_saved'] / baseline_calls * 100:.0f}%)")
+        if acl_index['ledger_mismatches']:
+            print(f"⚠️ Ledger mismatches: {acl_index['ledger_mismatches']} of {acl_index['verified_samples']} sampled objects")
+        
         if report['summary']['failed_objects'] > 0:
             print(f"\n⚠️ {report['summary']['failed_objects']} objects failed to fix")
             print("Check the log file for details: spaces_acl_fix.log")
 
     def cleanup_resume_state(self):
-        """Clean up resume state file after successful completion"""
+        """Remove the legacy JSON resume file (ACL results stay in the ledger)"""
         try:
             if os.path.exists(self.resume_file):
                 os.remove(self.resume_file)
-                logger.info("🧹 Cleaned up resume state file")
+                logger.info("🧹 Cleaned up legacy resume state file")
         except Exception as e:
             logger.warning(f"⚠️ Could not clean up resume state: {e}")
 
@@ -664,8 +808,10 @@ class DigitalOceanSpacesACLFixer:
                     error_count += 1
                 elif acl_check['is_public']:
                     public_count += 1
+                    self.ledger.record_acl(obj['Key'], 'public-read', obj.get('Size'))
                 else:
                     private_count += 1
+                    self.ledger.record_acl(obj['Key'], 'private', obj.get('Size'))
                     
                     # Analyze grantee patterns
                     for grantee in acl_check['grantees']:
@@ -674,6 +820,9 @@ class DigitalOceanSpacesACLFixer:
                 
                 pbar.update(1)
         
+        # Sampled ACLs feed the index used by the fixer
+        self.ledger.flush()
+        
         # Print analysis results
         print(f"\n📈 ANALYSIS RESULTS:")
         print(f"✅ Public objects: {public_count:,} ({public_count/len(objects)*100:.1f}%)")
@@ -751,6 +900,18 @@ Examples:
                        action='store_true',
                        help='Analyze current ACL status with sampling')
     
+    parser.add_argument('--list-workers',
+                       type=int, default=16,
+                       help='Parallel prefix listings feeding the fix workers (default: 16)')
+    
+    parser.add_argument('--verify-rate',
+                       type=float, default=0.01,
+                       help='Fraction of ledger-known public objects re-checked with GET ACL (default: 0.01)')
+    
+    parser.add_argument('--from-inventory',
+                       action='store_true',
+                       help='Take the object list from the local bucket inventory snapshot')
+    
     parser.add_argument('--sample-size',
                        type=int, default=100,
                        help='Sample size for analysis (default: 100)')
@@ -918,11 +1079,12 @@ def interactive_mode():
 def main():
     """Main entry point"""
     args = parse_command_line_args()
+    metrics.start_exporters()  # $GULAND_METRICS_PORT / $GULAND_METRICS_TEXTFILE
     
     # Check if running in CLI mode
     cli_mode = any([
         args.prefix, args.max_objects, args.dry_run, 
-        args.analyze, args.workers != 5
+        args.analyze, args.workers != 5, args.from_inventory
     ])
     
     if cli_mode:
@@ -947,6 +1109,8 @@ def main():
                 bucket_name=config['bucket_name'],
                 region=config['region']
             )
+            fixer.list_workers = args.list_workers
+            fixer.verify_sample_rate = args.verify_rate
             
             # Execute based on arguments
             if args.analyze:
@@ -956,7 +1120,8 @@ def main():
                     prefix=args.prefix,
                     max_workers=args.workers,
                     dry_run=args.dry_run,
-                    max_objects=args.max_objects
+                    max_objects=args.max_objects,
+                    from_inventory=args.from_inventory
                 )
             
         except Exception as e:
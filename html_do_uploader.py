@@ -20,19 +20,34 @@ Features:
 import os
 import json
 import boto3
-import hashlib
 import logging
+import threading
 import mimetypes
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from botocore.exceptions import ClientError, NoCredentialsError
 from tqdm import tqdm
+from async_spaces_uploader import AsyncSpacesUploadEngine
+from spaces_inventory import SpacesInventory
+from upload_ledger import UploadLedger
+from file_hash_cache import FileHashCache
+from tile_watcher import create_watcher
+from tile_scanner import iter_tiles, prefetch
+from tile_pack import TilePackUploader
+from spaces_sync import SpacesSync
+from rate_limiter import get_shared_limiter
+from upload_metadata import MetadataTemplates, sanitize_metadata_value
+from upload_stats import ShardedStats
+from upload_scheduler import UploadScheduler, parse_city_weights, DEFAULT_LOOKAHEAD
+from combination_completeness import (
+    compute_completeness, tally_file, finish_report, remote_matches, group_by_city_map_type,
+    describe as describe_completeness
+)
+import metrics
 import time
 import argparse
 import sys
-import unicodedata
-import re
 
 # Setup logging
 logging.basicConfig(
@@ -135,6 +150,7 @@ class EnhancedMultiMapSpacesUploader:
                 aws_access_key_id=access_key,
                 aws_secret_access_key=secret_key
             )
+            metrics.instrument_s3_client(self.s3_client)
             
             # Test connection
             self.s3_client.head_bucket(Bucket=bucket_name)
@@ -148,7 +164,8 @@ class EnhancedMultiMapSpacesUploader:
             raise
         
         # Enhanced statistics with comprehensive tracking
-        self.stats = {
+        # (per-thread shards merged on read; breakdowns: city, map type, district, combination, zoom)
+        self.stats = ShardedStats({
             'total_files': 0,
             'uploaded_files': 0,
             'skipped_files': 0,
@@ -159,21 +176,22 @@ class EnhancedMultiMapSpacesUploader:
             'end_time': None,
             'cities_processed': 0,
             'map_types_processed': 0,
-            'city_stats': {},        # Per-city detailed statistics
-            'map_type_stats': {},    # Per-map-type detailed statistics
-            'combination_stats': {}, # Per city+map_type combination stats
-            'zoom_level_stats': {},  # Per zoom level statistics
             'hourly_progress': []    # Hourly progress tracking
-        }
+        })
         
-        # Resume state management
+        # Resume state management - SQLite ledger, legacy JSON imported once
         self.resume_file = 'enhanced_upload_resume_state.json'
-        self.uploaded_files = self.load_resume_state()
+        self.ledger = UploadLedger()
+        self.load_resume_state()
+        
+        # Persistent (path, size, mtime, inode) -> MD5 cache
+        self.hash_cache = FileHashCache()
         
-        # Rate limiting and performance optimization
-        self.api_call_count = 0
-        self.last_api_reset = time.time()
-        self.max_api_calls_per_second = 200  # Increase from 100
+        # Sanitized metadata per (city, map_type, district, zoom) group
+        self.metadata_templates = MetadataTemplates(MAP_TYPE_CONFIG)
+        
+        # Rate limiting (token buckets shared with every Spaces client in this process)
+        self.rate_limiter = get_shared_limiter()
         self.batch_check_size = 100  # Check existence in batches
         self.upload_timeout = 30  # Add timeout for uploads
         self.retry_attempts = 3  # Add retry logic
@@ -192,84 +210,63 @@ class EnhancedMultiMapSpacesUploader:
                 region_name=region
             )
         )
+        metrics.instrument_s3_client(self.s3_client)
         self.max_cache_size = 1000
         self.stats_save_interval = 50  # Save stats every 50 operations
         self.last_stats_save = 0
         
-        # Optimize API settings
-        self.max_api_calls_per_second = 250  # Increase further if stable
-    
-    def batch_check_existence(self, s3_keys):
-        """Check multiple files existence in batch for better performance"""
-        existing_files = set()
-        
-        # Group files by common prefixes for efficient checking
-        prefix_groups = {}
-        for s3_key in s3_keys:
-            prefix = '/'.join(s3_key.split('/')[:-1])  # Get directory path
-            if prefix not in prefix_groups:
-                prefix_groups[prefix] = []
-            prefix_groups[prefix].append(s3_key)
+        # Bucket inventory snapshot - existence checks are answered from memory
+        self.inventory = None
+        self.inventory_max_age_hours = 24
         
-        for prefix, keys in prefix_groups.items():
-            try:
-                self.rate_limit_check()
-                
-                # List objects with this prefix
-                response = self.s3_client.list_objects_v2(
-                    Bucket=self.bucket_name,
-                    Prefix=prefix + '/',
-                    MaxKeys=1000
-                )
-                
-                if 'Contents' in response:
-                    existing_keys = {obj['Key'] for obj in response['Contents']}
-                    # Find which of our target keys exist
-                    for key in keys:
-                        if key in existing_keys:
-                            existing_files.add(key)
-                            
-            except Exception as e:
-                logger.warning(f"Error batch checking {prefix}: {e}")
-                # Fallback to individual checks
-                for key in keys:
-                    if self.file_exists_in_spaces(key):
-                        existing_files.add(key)
-        
-        return existing_files
+        # Upload ordering: {city: weight} for the scheduler's fair share (default 1 each)
+        self.city_weights = {}
+    
+    def new_scheduler(self):
+        """Prefix-interleaving, priority and city fair-share ordering for one upload run"""
+        return UploadScheduler(MAP_TYPE_CONFIG, city_weights=self.city_weights)
+    
+    def get_inventory(self, s3_prefix='', force_refresh=False):
+        """Load the local bucket inventory for a prefix, refreshing stale shards"""
+        if self.inventory is None or self.inventory.prefix != s3_prefix.strip('/'):
+            self.inventory = SpacesInventory(
+                self.s3_client, self.bucket_name, prefix=s3_prefix, rate_limiter=self.rate_limiter.for_operation('LIST')
+            )
+        if force_refresh:
+            self.inventory.refresh(force=True)
+        else:
+            self.inventory.ensure_fresh(self.inventory_max_age_hours)
+        return self.inventory
+    
+    def batch_check_existence(self, files, s3_prefix=''):
+        """Keys already in Spaces with the same content (size + MD5 ETag), from the inventory snapshot"""
+        inventory = self.get_inventory(s3_prefix)
+        existing = set()
+        for file_data in files:
+            remote = inventory.get(file_data['s3_key'])
+            if remote and remote_matches(remote, file_data['file_info']['size'], file_data['file_info'].get('md5')):
+                existing.add(file_data['s3_key'])
+        return existing
     
-    def upload_single_file_optimized(self, local_path, s3_key, file_info=None, city=None, map_type=None, zoom=None, district=None):
-        """Optimized upload with retry logic and better error handling"""
+    def upload_single_file_optimized(self, local_path, s3_key, file_info=None, city=None, map_type=None, zoom=None, district=None,
+                                     force=False):
+        """Optimized upload with retry logic and better error handling (force: ignore the ledger)"""
         for attempt in range(self.retry_attempts):
             try:
-                # Resume functionality check (optimized)
-                resume_key = f"{s3_key}:{file_info['md5'] if file_info else 'unknown'}"
-                if resume_key in self.uploaded_files:
-                    self.stats['skipped_files'] += 1
+                # Resume functionality check (indexed ledger lookup)
+                if not force and file_info and self.ledger.is_uploaded(s3_key, file_info['md5']):
+                    self.stats.incr('skipped_files')
                     self.update_comprehensive_stats(city, map_type, zoom, 'skipped', file_info['size'] if file_info else 0, district)
                     return {'success': True, 'skipped': True, 'file': s3_key, 'size': file_info['size'] if file_info else 0}
                 
                 # Get file info if not provided (cached)
                 if not file_info:
-                    file_info = self.get_file_info_cached(local_path)
+                    file_info = self.get_file_info(local_path)
                     if not file_info:
                         return {'success': False, 'error': 'Could not get file info', 'file': s3_key}
                 
                 # Prepare upload with optimized settings
-                content_type = self.determine_content_type(local_path, file_info)
-                metadata = self.create_file_metadata(local_path, file_info, city, map_type, zoom, district)
-                
-                # Debug log for problematic metadata
-                if district and any('đ' in str(v) or any(ord(c) > 127 for c in str(v)) for v in metadata.values()):
-                    logger.debug(f"🔍 Metadata for {s3_key}: {metadata}")
-                
-                extra_args = {
-                    'ACL': 'public-read',
-                    'ContentType': content_type,
-                    'CacheControl': 'max-age=31536000, public',
-                    'ContentDisposition': 'inline',
-                    'Metadata': metadata
-                }
+                extra_args = self.build_upload_extra_args(local_path, s3_key, file_info, city, map_type, zoom, district)
                 
                 # Upload with timeout
                 self.rate_limit_check()
@@ -287,10 +284,7 @@ class EnhancedMultiMapSpacesUploader:
                 )
                 
                 # Success - update tracking
-                self.uploaded_files.add(resume_key)
-                self.stats['uploaded_files'] += 1
-                self.stats['uploaded_bytes'] += file_info['size']
-                self.update_comprehensive_stats(city, map_type, zoom, 'uploaded', file_info['size'])
+                self.record_uploaded(s3_key, file_info, city, map_type, zoom)
                 
                 return {
                     'success': True,
@@ -301,6 +295,7 @@ class EnhancedMultiMapSpacesUploader:
                 
             except Exception as e:
                 error_msg = str(e)
+                self.rate_limiter.check_error('PUT', e)
                 if "Non ascii characters found" in error_msg:
                     logger.error(f"❌ ASCII metadata error for {s3_key}")
                     logger.error(f"    District: {district}")
@@ -314,86 +309,143 @@ class EnhancedMultiMapSpacesUploader:
                     continue
                 else:
                     logger.error(f"❌ All {self.retry_attempts} upload attempts failed for {s3_key}: {e}")
-                    self.stats['failed_files'] += 1
+                    self.stats.incr('failed_files')
                     self.update_comprehensive_stats(city, map_type, zoom, 'failed', 0, district)
                     return {'success': False, 'error': str(e), 'file': s3_key}
 
-    # Cache for file info to avoid repeated disk operations
-    _file_info_cache = {}
-    def get_file_info_cached(self, file_path):
-        """Get file info with caching to avoid repeated disk operations"""
-        stat = os.stat(file_path)
-        cache_key = f"{file_path}:{stat.st_mtime}"
-        
-        if cache_key in self._file_info_cache:
-            return self._file_info_cache[cache_key]
-        
-        file_info = self.get_file_info(file_path)
-        if file_info:
-            self._file_info_cache[cache_key] = file_info
+    def build_upload_extra_args(self, local_path, s3_key, file_info, city=None, map_type=None, zoom=None, district=None):
+        """ACL, caching and metadata headers shared by every upload engine"""
+        content_type = self.determine_content_type(local_path, file_info)
+        metadata = self.create_file_metadata(local_path, file_info, city, map_type, zoom, district)
+        
+        # Debug log for problematic metadata
+        if district and any('đ' in str(v) or any(ord(c) > 127 for c in str(v)) for v in metadata.values()):
+            logger.debug(f"🔍 Metadata for {s3_key}: {metadata}")
+        
+        return {
+            'ACL': 'public-read',
+            'ContentType': content_type,
+            'CacheControl': 'max-age=31536000, public',
+            'ContentDisposition': 'inline',
+            'Metadata': metadata
+        }
+
+    def record_uploaded(self, s3_key, file_info, city, map_type, zoom):
+        """Book-keeping after a successful upload"""
+        self.ledger.record_upload(s3_key, file_info['md5'], file_info['size'])
+        if self.inventory:
+            self.inventory.record_put(s3_key, file_info['size'], file_info['md5'])
+        self.stats.incr('uploaded_files')
+        self.stats.incr('uploaded_bytes', file_info['size'])
+        self.update_comprehensive_stats(city, map_type, zoom, 'uploaded', file_info['size'])
+
+    def perform_async_upload(self, files_to_upload, concurrency):
+        """Upload through the asyncio engine: hundreds of signed PUTs in flight on one connection pool"""
+        total = None
+        lookahead = DEFAULT_LOOKAHEAD
+        if isinstance(files_to_upload, list):
+            logger.info(f"📤 Starting async upload of {len(files_to_upload):,} files ({concurrency} concurrent PUTs)...")
+            files_to_upload.sort(key=lambda x: x['file_info']['size'])
+            total = len(files_to_upload)
+            lookahead = None
+        else:
+            logger.info(f"📤 Starting async upload while scanning ({concurrency} concurrent PUTs)...")
+        
+        engine = AsyncSpacesUploadEngine(
+            self.access_key, self.secret_key, self.endpoint_url, self.bucket_name, self.region,
+            concurrency=concurrency, timeout=self.upload_timeout, retry_attempts=self.retry_attempts,
+            rate_limiter=self.rate_limiter
+        )
+        
+        scheduler = self.new_scheduler()
+        in_progress = 0
+        depth_lock = threading.Lock()  # jobs() runs in a worker thread, on_result on the event loop
+        
+        with tqdm(total=total, desc="Uploading (async)", unit="file") as pbar:
+            
+            def jobs():
+                nonlocal in_progress
+                for file_data in scheduler.order(files_to_upload, lookahead):
+                    file_info = file_data['file_info']
+                    
+                    # Resume functionality check
+                    if self.ledger.is_uploaded(file_data['s3_key'], file_info['md5']):
+                        self.stats.incr('skipped_files')
+                        self.update_comprehensive_stats(
+                            file_data['city'], file_data['map_type'], file_data['zoom'], 'skipped',
+                            file_info['size'], file_data.get('district')
+                        )
+                        self.update_progress_bar(pbar, {'success': True, 'skipped': True, 'file': file_data['s3_key']}, file_data)
+                        continue
+                    
+                    extra_args = self.build_upload_extra_args(
+                        file_data['local_path'], file_data['s3_key'], file_info,
+                        file_data['city'], file_data['map_type'], file_data['zoom'], file_data.get('district')
+                    )
+                    with depth_lock:
+                        in_progress += 1
+                        metrics.UPLOAD_QUEUE_DEPTH.set(scheduler.buffered + in_progress, uploader='async')
+                    yield file_data, file_data['local_path'], file_data['s3_key'], extra_args
+            
+            def on_result(file_data, result):
+                nonlocal in_progress
+                with depth_lock:
+                    in_progress -= 1
+                    metrics.UPLOAD_QUEUE_DEPTH.set(scheduler.buffered + in_progress, uploader='async')
+                file_info = file_data['file_info']
+                
+                if result['success']:
+                    self.record_uploaded(
+                        file_data['s3_key'], file_info,
+                        file_data['city'], file_data['map_type'], file_data['zoom']
+                    )
+                else:
+                    self.stats.incr('failed_files')
+                    self.update_comprehensive_stats(
+                        file_data['city'], file_data['map_type'], file_data['zoom'], 'failed', 0, file_data.get('district')
+                    )
+                    scheduler.report_result(file_data, result)
+                
+                self.update_progress_bar(pbar, {
+                    'success': result['success'],
+                    'file': file_data['s3_key'],
+                    'error': result.get('error')
+                }, file_data)
+                
+                if (self.stats['uploaded_files'] + self.stats['skipped_files']) % 100 == 0:
+                    self.save_resume_state_optimized()
             
-            # Limit cache size
-            if len(self._file_info_cache) > 1000:
-                # Remove oldest entries
-                oldest_keys = list(self._file_info_cache.keys())[:100]
-                for key in oldest_keys:
-                    del self._file_info_cache[key]
-        
-        return file_info
+            engine.upload_all(jobs(), on_result)
+        
+        # Final save
+        self.save_resume_state()
 
     def load_resume_state(self):
-        """Load resume state from file with validation"""
+        """Import the legacy JSON resume file into the ledger (once) and report its size"""
         try:
-            if os.path.exists(self.resume_file):
-                with open(self.resume_file, 'r') as f:
-                    data = json.load(f)
-                    
-                # Validate resume state structure
-                if isinstance(data, dict) and 'uploaded_files' in data:
-                    uploaded_files = set(data['uploaded_files'])
-                    logger.info(f"📋 Loaded resume state: {len(uploaded_files)} files already uploaded")
-                    
-                    # Load previous stats if available
-                    if 'stats' in data:
-                        logger.info(f"📊 Previous session stats: {data['stats'].get('uploaded_files', 0)} uploaded")
-                    
-                    return uploaded_files
-                elif isinstance(data, list):
-                    # Legacy format compatibility
-                    uploaded_files = set(data)
-                    logger.info(f"📋 Loaded legacy resume state: {len(uploaded_files)} files")
-                    return uploaded_files
-                    
+            self.ledger.import_legacy_upload_state(self.resume_file)
         except Exception as e:
-            logger.warning(f"⚠️ Could not load resume state: {e}")
+            logger.warning(f"⚠️ Could not import legacy resume state: {e}")
+        
+        logger.info(f"📋 Upload ledger: {self.ledger.count():,} files already uploaded")
         
-        return set()
+        previous_stats = self.ledger.get_meta('last_session_stats')
+        if previous_stats:
+            logger.info(f"📊 Previous session stats: {previous_stats.get('uploaded_files', 0)} uploaded")
 
     def save_resume_state(self):
-        """Save resume state to file with proper error handling"""
+        """Commit buffered ledger writes and the session stats"""
         try:
-            resume_data = {
-                'uploaded_files': list(self.uploaded_files),
-                'stats': {
-                    'uploaded_files': self.stats['uploaded_files'],
-                    'skipped_files': self.stats['skipped_files'],
-                    'failed_files': self.stats['failed_files'],
-                    'total_bytes': self.stats['total_bytes'],
-                    'uploaded_bytes': self.stats['uploaded_bytes']
-                },
-                'timestamp': datetime.now().isoformat(),
-                'version': '2.0-enhanced'
-            }
-            
-            # Write to temporary file first, then rename for atomic operation
-            temp_file = f"{self.resume_file}.tmp"
-            with open(temp_file, 'w') as f:
-                json.dump(resume_data, f, indent=2)
-            
-            # Atomic rename
-            os.rename(temp_file, self.resume_file)
-            
-            logger.debug(f"💾 Resume state saved: {len(self.uploaded_files)} files")
+            self.ledger.flush()
+            self.ledger.set_meta('last_session_stats', {
+                'uploaded_files': self.stats['uploaded_files'],
+                'skipped_files': self.stats['skipped_files'],
+                'failed_files': self.stats['failed_files'],
+                'total_bytes': self.stats['total_bytes'],
+                'uploaded_bytes': self.stats['uploaded_bytes'],
+                'timestamp': datetime.now().isoformat()
+            })
+            logger.debug("💾 Upload ledger flushed")
             
         except Exception as e:
             logger.warning(f"⚠️ Could not save resume state: {e}")
@@ -406,74 +458,64 @@ class EnhancedMultiMapSpacesUploader:
             self.save_resume_state()  # ✅ Gọi function chính, không đệ quy
             self.last_stats_save = current_count
 
-    def rate_limit_check(self):
-        """Implement rate limiting to avoid DO Spaces throttling"""
-        current_time = time.time()
-        
-        # Reset counter every second
-        if current_time - self.last_api_reset >= 1.0:
-            self.api_call_count = 0
-            self.last_api_reset = current_time
-        
-        # If approaching limit, sleep briefly
-        if self.api_call_count >= self.max_api_calls_per_second:
-            sleep_time = 1.0 - (current_time - self.last_api_reset)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-                self.api_call_count = 0
-                self.last_api_reset = time.time()
-        
-        self.api_call_count += 1
+    def rate_limit_check(self, operation='PUT'):
+        """Wait for a token from the shared limiter to avoid DO Spaces throttling"""
+        self.rate_limiter.acquire(operation)
 
     def get_file_info(self, file_path):
-        """Optimized file info gathering"""
+        """File info with the MD5 served from the persistent hash cache"""
         try:
             stat = os.stat(file_path)
-            size = stat.st_size
-            
-            # Skip MD5 for very small files (under 1KB) - not worth the overhead
-            if size < 1024:
-                md5 = f"small_file_{size}_{stat.st_mtime}"
-            else:
-                # Optimized MD5 calculation with larger buffer
-                hash_md5 = hashlib.md5()
-                with open(file_path, "rb") as f:
-                    while chunk := f.read(65536):  # 64KB chunks instead of 4KB
-                        hash_md5.update(chunk)
-                md5 = hash_md5.hexdigest()
-            
-            return {
-                'size': size,
-                'md5': md5,
-                'modified_time': stat.st_mtime,
-                'created_time': stat.st_ctime,
-                'file_extension': os.path.splitext(file_path)[1].lower()
-            }
+            md5 = self.hash_cache.get_hash(file_path, stat)
+            if md5 is None:
+                raise OSError("could not read file")
+            return self.build_file_info(file_path, stat, md5)
         except Exception as e:
             logger.error(f"❌ Error getting file info for {file_path}: {e}")
             return None
 
-    def file_exists_in_spaces(self, s3_key):
-        """Check if file exists in Spaces with rate limiting"""
+    @staticmethod
+    def build_file_info(file_path, stat, md5):
+        return {
+            'size': stat.st_size,
+            'md5': md5,
+            'modified_time': stat.st_mtime,
+            'created_time': stat.st_ctime,
+            'file_extension': os.path.splitext(file_path)[1].lower()
+        }
+
+    def file_exists_in_spaces(self, s3_key, file_info=None):
+        """Check if file exists in Spaces with rate limiting (with the same content when file_info is given)"""
+        # Answer from the inventory snapshot when it covers this key
+        if self.inventory and s3_key.startswith(self.inventory.root_prefix()):
+            remote = self.inventory.get(s3_key)
+        else:
+            remote = self.head_remote(s3_key)
+        if remote is None:
+            return False
+        return file_info is None or remote_matches(remote, file_info['size'], file_info.get('md5'))
+
+    def head_remote(self, s3_key):
+        """(size, etag) of a key from a HEAD request, None when missing"""
         try:
-            self.rate_limit_check()
-            self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-            return True
+            self.rate_limit_check('HEAD')
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            return response['ContentLength'], response.get('ETag', '').strip('"')
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
-                return False
+                return None
             else:
+                self.rate_limiter.check_error('HEAD', e)
                 logger.warning(f"⚠️ Error checking file existence: {e}")
-                return False
+                return None
 
     def upload_single_file(self, local_path, s3_key, file_info=None, city=None, map_type=None, zoom=None, district=None):
         """Upload single file with comprehensive metadata and tracking"""
         try:
             # Resume functionality check
-            resume_key = f"{s3_key}:{file_info['md5'] if file_info else 'unknown'}"
-            if resume_key in self.uploaded_files:
+            if file_info and self.ledger.is_uploaded(s3_key, file_info['md5']):
                 logger.debug(f"⏭️ Skipping already uploaded: {s3_key}")
-                self.stats['skipped_files'] += 1
+                self.stats.incr('skipped_files')
                 self.update_comprehensive_stats(city, map_type, zoom, 'skipped', file_info['size'] if file_info else 0, district)
                 return {
                     'success': True,
@@ -482,19 +524,6 @@ class EnhancedMultiMapSpacesUploader:
                     'size': file_info['size'] if file_info else 0
                 }
             
-            # Double-check existence in Spaces
-            if self.file_exists_in_spaces(s3_key):
-                logger.debug(f"⏭️ File exists in Spaces: {s3_key}")
-                self.uploaded_files.add(resume_key)
-                self.stats['skipped_files'] += 1
-                self.update_comprehensive_stats(city, map_type, zoom, 'skipped', file_info['size'] if file_info else 0)
-                return {
-                    'success': True,
-                    'skipped': True,
-                    'file': s3_key,
-                    'size': file_info['size'] if file_info else 0
-                }
-            
             # Get file info if not provided
             if not file_info:
                 file_info = self.get_file_info(local_path)
@@ -505,6 +534,19 @@ class EnhancedMultiMapSpacesUploader:
                         'file': s3_key
                     }
             
+            # Double-check Spaces: skip only when the remote copy has the same content
+            if self.file_exists_in_spaces(s3_key, file_info):
+                logger.debug(f"⏭️ File exists in Spaces: {s3_key}")
+                self.ledger.record_upload(s3_key, file_info['md5'], file_info['size'], acl=None)
+                self.stats.incr('skipped_files')
+                self.update_comprehensive_stats(city, map_type, zoom, 'skipped', file_info['size'])
+                return {
+                    'success': True,
+                    'skipped': True,
+                    'file': s3_key,
+                    'size': file_info['size']
+                }
+            
             # Determine optimal content type
             content_type = self.determine_content_type(local_path, file_info)
             
@@ -534,10 +576,7 @@ class EnhancedMultiMapSpacesUploader:
             )
             
             # Update tracking and statistics
-            self.uploaded_files.add(resume_key)
-            self.stats['uploaded_files'] += 1
-            self.stats['uploaded_bytes'] += file_info['size']
-            self.update_comprehensive_stats(city, map_type, zoom, 'uploaded', file_info['size'])
+            self.record_uploaded(s3_key, file_info, city, map_type, zoom)
             
             # Generate public access URLs
             direct_url = f"https://{self.bucket_name}.{self.region}.digitaloceanspaces.com/{s3_key}"
@@ -561,7 +600,8 @@ class EnhancedMultiMapSpacesUploader:
             
         except Exception as e:
             logger.error(f"❌ Error uploading {local_path}: {e}")
-            self.stats['failed_files'] += 1
+            self.rate_limiter.check_error('PUT', e)
+            self.stats.incr('failed_files')
             self.update_comprehensive_stats(city, map_type, zoom, 'failed', 0, district)
             return {
                 'success': False,
@@ -590,158 +630,16 @@ class EnhancedMultiMapSpacesUploader:
 
     def sanitize_metadata_value(self, value):
         """Sanitize metadata value to ensure ASCII-only characters"""
-        if not value:
-            return value
-        
-        try:
-            # First try to normalize Unicode characters
-            normalized = unicodedata.normalize('NFKD', str(value))
-            
-            # Remove diacritics and convert to ASCII
-            ascii_value = normalized.encode('ascii', 'ignore').decode('ascii')
-            
-            # Replace common Vietnamese characters manually if needed
-            vietnamese_replacements = {
-                'đ': 'd', 'Đ': 'D',
-                'ă': 'a', 'â': 'a', 'á': 'a', 'à': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a',
-                'Ă': 'A', 'Â': 'A', 'Á': 'A', 'À': 'A', 'Ả': 'A', 'Ã': 'A', 'Ạ': 'A',
-                'ê': 'e', 'é': 'e', 'è': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
-                'Ê': 'E', 'É': 'E', 'È': 'E', 'Ẻ': 'E', 'Ẽ': 'E', 'Ẹ': 'E',
-                'ô': 'o', 'ơ': 'o', 'ó': 'o', 'ò': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o',
-                'Ô': 'O', 'Ơ': 'O', 'Ó': 'O', 'Ò': 'O', 'Ỏ': 'O', 'Õ': 'O', 'Ọ': 'O',
-                'ư': 'u', 'ú': 'u', 'ù': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
-                'Ư': 'U', 'Ú': 'U', 'Ù': 'U', 'Ủ': 'U', 'Ũ': 'U', 'Ụ': 'U',
-                'í': 'i', 'ì': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
-                'Í': 'I', 'Ì': 'I', 'Ỉ': 'I', 'Ĩ': 'I', 'Ị': 'I',
-                'ý': 'y', 'ỳ': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
-                'Ý': 'Y', 'Ỳ': 'Y', 'Ỷ': 'Y', 'Ỹ': 'Y', 'Ỵ': 'Y'
-            }
-            
-            # Apply Vietnamese replacements if ASCII conversion failed
-            if not ascii_value or len(ascii_value) < len(value) * 0.5:
-                for vietnamese_char, replacement in vietnamese_replacements.items():
-                    value = value.replace(vietnamese_char, replacement)
-                ascii_value = value
-            
-            # Ensure only ASCII characters remain
-            ascii_value = re.sub(r'[^\x00-\x7F]', '', ascii_value)
-            
-            # Replace spaces and special characters with hyphens
-            ascii_value = re.sub(r'[^\w\-.]', '-', ascii_value)
-            
-            # Clean up multiple hyphens
-            ascii_value = re.sub(r'-+', '-', ascii_value).strip('-')
-            
-            return ascii_value if ascii_value else 'unknown'
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Error sanitizing metadata value '{value}': {e}")
-            # Fallback: remove all non-ASCII characters
-            return re.sub(r'[^\x00-\x7F]', '', str(value)) or 'unknown'
+        return sanitize_metadata_value(value)
 
     def create_file_metadata(self, local_path, file_info, city, map_type, zoom, district=None):
-        """Create comprehensive metadata for uploaded files with district support and ASCII sanitization"""
-        metadata = {
-            'original-name': self.sanitize_metadata_value(os.path.basename(local_path)),
-            'upload-time': datetime.now().isoformat(),
-            'md5-hash': file_info['md5'],
-            'file-size': str(file_info['size']),
-            'tile-type': 'map-tile',
-            'public-access': 'enabled',
-            'uploader-version': '2.0-enhanced'
-        }
-        
-        # Add location and map type metadata with sanitization
-        if city:
-            metadata['city'] = self.sanitize_metadata_value(city)
-            metadata['city-original'] = city  # Keep original for reference (will be sanitized)
-        
-        if district:
-            metadata['district'] = self.sanitize_metadata_value(district)
-            metadata['district-original'] = self.sanitize_metadata_value(district)  # Also sanitize original
-            metadata['structure-type'] = 'kh-2025-district'
-        else:
-            metadata['structure-type'] = 'standard'
-        
-        if map_type:
-            metadata['map-type'] = self.sanitize_metadata_value(map_type)
-            map_config = MAP_TYPE_CONFIG.get(map_type, {})
-            if map_config:
-                metadata['map-type-display'] = self.sanitize_metadata_value(map_config.get('display_name', map_type))
-                metadata['map-type-priority'] = str(map_config.get('priority', 99))
-        
-        if zoom:
-            metadata['zoom-level'] = str(zoom)
-            metadata['tile-detail'] = 'high' if int(zoom) >= 14 else 'medium' if int(zoom) >= 10 else 'low'
-        
-        # Final sanitization pass for all metadata values
-        sanitized_metadata = {}
-        for key, value in metadata.items():
-            sanitized_key = self.sanitize_metadata_value(key).replace(' ', '-')
-            sanitized_value = self.sanitize_metadata_value(str(value))
-            sanitized_metadata[sanitized_key] = sanitized_value
-        
-        return sanitized_metadata
+        """Create comprehensive metadata for uploaded files (group fields come from a precompiled template)"""
+        return self.metadata_templates.create(os.path.basename(local_path), file_info, city, map_type, zoom, district)
 
     def update_comprehensive_stats(self, city, map_type, zoom, status, size, district=None):
-        """Update comprehensive statistics across all dimensions with safety checks"""
+        """Update comprehensive statistics across all dimensions (thread-local shard, no locking)"""
         try:
-            # City statistics
-            if city:
-                if city not in self.stats['city_stats']:
-                    self.stats['city_stats'][city] = {
-                        'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0
-                    }
-                self.stats['city_stats'][city][status] += 1
-                if status in ['uploaded', 'skipped']:
-                    self.stats['city_stats'][city]['bytes'] += size
-            
-            # Map type statistics
-            if map_type:
-                if map_type not in self.stats['map_type_stats']:
-                    self.stats['map_type_stats'][map_type] = {
-                        'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0
-                    }
-                self.stats['map_type_stats'][map_type][status] += 1
-                if status in ['uploaded', 'skipped']:
-                    self.stats['map_type_stats'][map_type]['bytes'] += size
-            
-            # District statistics (for KH_2025)
-            if district:
-                if 'district_stats' not in self.stats:
-                    self.stats['district_stats'] = {}
-                if district not in self.stats['district_stats']:
-                    self.stats['district_stats'][district] = {
-                        'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0
-                    }
-                self.stats['district_stats'][district][status] += 1
-                if status in ['uploaded', 'skipped']:
-                    self.stats['district_stats'][district]['bytes'] += size
-            
-            # Combination statistics (city + map_type + district)
-            if city and map_type:
-                combo_key = f"{city}:{map_type}"
-                if district:
-                    combo_key += f":{district}"
-                
-                if combo_key not in self.stats['combination_stats']:
-                    self.stats['combination_stats'][combo_key] = {
-                        'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0
-                    }
-                self.stats['combination_stats'][combo_key][status] += 1
-                if status in ['uploaded', 'skipped']:
-                    self.stats['combination_stats'][combo_key]['bytes'] += size
-            
-            # Zoom level statistics
-            if zoom:
-                if zoom not in self.stats['zoom_level_stats']:
-                    self.stats['zoom_level_stats'][zoom] = {
-                        'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0
-                    }
-                self.stats['zoom_level_stats'][zoom][status] += 1
-                if status in ['uploaded', 'skipped']:
-                    self.stats['zoom_level_stats'][zoom]['bytes'] += size
-        
+            self.stats.record(city, map_type, zoom, status, size, district)
         except Exception as e:
             logger.warning(f"⚠️ Error updating stats: {e}")
 
@@ -842,166 +740,78 @@ class EnhancedMultiMapSpacesUploader:
             }
 
     def scan_multi_map_directory(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None, target_zoom_levels=None):
-        """Parallel directory scanning for better performance"""
-        import concurrent.futures
-        from pathlib import Path
-        
+        """Scan the whole tree into a list (dry runs and callers that need every file up front)"""
         files_to_upload = []
-        scan_summary = {
-            'cities': {},
-            'map_types': set(),
-            'zoom_levels': set(),
-            'total_size': 0,
-            'file_count': 0
-        }
+        scan_summary = self.new_scan_summary()
         
         logger.info(f"🔍 Starting parallel directory scan: {local_dir}")
         
-        # Use pathlib for faster directory traversal
-        base_path = Path(local_dir)
-        if not base_path.exists():
+        if not os.path.isdir(local_dir):
             logger.error(f"Directory not found: {local_dir}")
             return []
         
-        # Find all image files in parallel
-        def scan_city_directory(city_path):
-            city_files = []
-            city_name = city_path.name
-            
-            # Apply city filter early
-            if target_cities and city_name not in target_cities:
-                return city_files
-            
-            try:
-                for map_type_path in city_path.iterdir():
-                    if not map_type_path.is_dir():
-                        continue
-                    
-                    map_type_name = map_type_path.name
-                    
-                    # Apply map type filter early
-                    if target_map_types and map_type_name not in target_map_types:
-                        continue
-                    
-                    # Handle both standard and KH-2025 district structure
-                    if map_type_name == 'kh-2025':
-                        # KH-2025 structure: city/kh-2025/district/zoom/files
-                        for district_path in map_type_path.iterdir():
-                            if not district_path.is_dir():
-                                continue
-                                
-                            for zoom_path in district_path.iterdir():
-                                if not zoom_path.is_dir():
-                                    continue
-                                    
-                                zoom_str = zoom_path.name
-                                try:
-                                    zoom_int = int(zoom_str)
-                                    if target_zoom_levels and zoom_int not in target_zoom_levels:
-                                        continue
-                                except ValueError:
-                                    continue
-                                
-                                # Scan files in this zoom directory
-                                for file_path in zoom_path.iterdir():
-                                    if file_path.is_file() and not self.should_skip_file(file_path.name):
-                                        city_files.append((str(file_path), city_name, map_type_name, district_path.name, zoom_str))
-                    else:
-                        # Standard structure: city/map_type/zoom/files
-                        for zoom_path in map_type_path.iterdir():
-                            if not zoom_path.is_dir():
-                                continue
-                                
-                            zoom_str = zoom_path.name
-                            try:
-                                zoom_int = int(zoom_str)
-                                if target_zoom_levels and zoom_int not in target_zoom_levels:
-                                    continue
-                            except ValueError:
-                                continue
-                            
-                            # Scan files in this zoom directory
-                            for file_path in zoom_path.iterdir():
-                                if file_path.is_file() and not self.should_skip_file(file_path.name):
-                                    city_files.append((str(file_path), city_name, map_type_name, None, zoom_str))
-                                    
-            except Exception as e:
-                logger.warning(f"Error scanning city {city_name}: {e}")
-            
-            return city_files
-        
-        # Get all city directories
-        city_paths = [p for p in base_path.iterdir() if p.is_dir()]
+        scanned_files = self.iter_scanned_files(local_dir, s3_prefix, target_cities, target_map_types, target_zoom_levels)
+        for file_data in tqdm(scanned_files, desc="Scanning files", unit="file"):
+            files_to_upload.append(file_data)
+            self.update_scan_summary(scan_summary, file_data, file_data['file_info'])
+            self.stats.incr('total_files')
+            self.stats.incr('total_bytes', file_data['file_info']['size'])
         
-        # Scan cities in parallel
-        all_files = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(city_paths), 10)) as executor:
-            future_to_city = {executor.submit(scan_city_directory, city_path): city_path.name 
-                             for city_path in city_paths}
-            
-            with tqdm(total=len(future_to_city), desc="Scanning cities") as pbar:
-                for future in concurrent.futures.as_completed(future_to_city):
-                    city_name = future_to_city[future]
-                    try:
-                        city_files = future.result()
-                        all_files.extend(city_files)
-                        pbar.set_postfix(files=len(all_files))
-                    except Exception as e:
-                        logger.error(f"Error processing city {city_name}: {e}")
-                    pbar.update(1)
-        
-        # Process file information in parallel
-        def process_file(file_data):
-            local_path, city, map_type, district, zoom = file_data
-            
-            # Generate S3 key
-            rel_path = os.path.relpath(local_path, local_dir)
-            s3_key = os.path.join(s3_prefix, rel_path).replace('\\', '/') if s3_prefix else rel_path.replace('\\', '/')
-            
-            # Get file information
-            file_info = self.get_file_info_cached(local_path)
-            if not file_info:
-                return None
-            
-            return {
-                'local_path': local_path,
-                's3_key': s3_key,
-                'file_info': file_info,
-                'city': city,
-                'map_type': map_type,
-                'district': district,
-                'zoom': zoom
-            }
+        self.log_scan_results(scan_summary, len(files_to_upload))
+        return files_to_upload
+
+    def iter_scanned_files(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None,
+                           target_zoom_levels=None, batch_size=1000, scan_errors=None):
+        """
+        Stream upload records while the directory walk is still running
         
-        # Process files in parallel
-        logger.info(f"📊 Processing {len(all_files)} files...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            with tqdm(total=len(all_files), desc="Processing files") as pbar:
-                future_to_file = {executor.submit(process_file, file_data): file_data 
-                                for file_data in all_files}
+        Tiles come from the scandir scanner; each batch of batch_size is hashed
+        through the hash cache (only new/changed files are read) and yielded.
+        Unreadable directories and unhashable tiles are appended to scan_errors.
+        """
+        batch = []
+        
+        def hashed(batch):
+            hashes = self.hash_cache.get_hashes({tile[0]: tile[5] for tile in batch})
+            for local_path, city, map_type, district, zoom, stat in batch:
+                md5 = hashes.get(local_path)
+                if md5 is None:
+                    if scan_errors is not None:
+                        scan_errors.append(local_path)
+                    continue
                 
-                for future in concurrent.futures.as_completed(future_to_file):
-                    try:
-                        result = future.result()
-                        if result:
-                            files_to_upload.append(result)
-                            
-                            # Update scan summary
-                            path_info = {
-                                'city': result['city'],
-                                'map_type': result['map_type'],
-                                'zoom': result['zoom']
-                            }
-                            self.update_scan_summary(scan_summary, path_info, result['file_info'])
-                            self.stats['total_files'] += 1
-                            self.stats['total_bytes'] += result['file_info']['size']
-                            
-                    except Exception as e:
-                        logger.warning(f"Error processing file: {e}")
-                    pbar.update(1)
+                rel_path = os.path.relpath(local_path, local_dir)
+                s3_key = os.path.join(s3_prefix, rel_path).replace('\\', '/') if s3_prefix else rel_path.replace('\\', '/')
+                
+                yield {
+                    'local_path': local_path,
+                    's3_key': s3_key,
+                    'file_info': self.build_file_info(local_path, stat, md5),
+                    'city': city,
+                    'map_type': map_type,
+                    'district': district,
+                    'zoom': zoom
+                }
         
-        self.log_scan_results(scan_summary, len(files_to_upload))
-        return files_to_upload
+        tiles = iter_tiles(local_dir, target_cities, target_map_types, target_zoom_levels, skip_file=self.should_skip_file,
+                           errors=scan_errors)
+        for tile in tiles:
+            batch.append(tile)
+            if len(batch) >= batch_size:
+                yield from hashed(batch)
+                batch = []
+        if batch:
+            yield from hashed(batch)
+
+    @staticmethod
+    def new_scan_summary():
+        return {
+            'cities': {},
+            'map_types': set(),
+            'zoom_levels': set(),
+            'total_size': 0,
+            'file_count': 0
+        }
 
     def should_skip_file(self, filename):
         """Determine if file should be skipped during scanning"""
@@ -1099,34 +909,8 @@ class EnhancedMultiMapSpacesUploader:
             
             logger.debug(f"🔍 Checking combination: {check_prefix}")
             
-            # Use rate limiting for API calls
-            self.rate_limit_check()
-            
-            # List objects with this prefix (limited check for efficiency)
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=check_prefix,
-                MaxKeys=10  # Just need to know if it exists
-            )
-            
-            if 'Contents' not in response:
-                return {
-                    'exists': False,
-                    'file_count': 0,
-                    'total_size': 0,
-                    'sample_files': []
-                }
-            
-            contents = response['Contents']
-            total_size = sum(obj['Size'] for obj in contents)
-            sample_files = [obj['Key'] for obj in contents[:3]]
-            
-            return {
-                'exists': True,
-                'file_count': len(contents),
-                'total_size': total_size,
-                'sample_files': sample_files
-            }
+            # Exact counts straight from the inventory snapshot
+            return self.get_inventory(s3_prefix).summarize_prefix(check_prefix)
             
         except Exception as e:
             logger.error(f"❌ Error checking combination {city_name}/{map_type}: {e}")
@@ -1137,65 +921,62 @@ class EnhancedMultiMapSpacesUploader:
                 'sample_files': []
             }
 
-    def scan_existing_combinations_in_spaces(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None):
+    def scan_existing_combinations_in_spaces(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None,
+                                             files=None):
         """
-        Efficiently scan what combinations already exist in Spaces
+        Exact completeness of every local city/map_type combination that exists in Spaces
+
+        One pass over the local tiles (hash cache) against the inventory and
+        ledger; each info carries 'complete' plus matched/missing/changed counts.
+        Pass already scanned files to avoid a second walk.
         """
-        existing_combinations = {}
+        if files is None:
+            logger.info("🔍 Scanning local tiles for combination completeness...")
+            files = self.iter_scanned_files(local_dir, s3_prefix, target_cities, target_map_types)
         
-        # First analyze local structure to know what to check
-        logger.info("🔍 Analyzing local structure for combinations...")
-        local_combinations = set()
+        report = compute_completeness(files, self.get_inventory(s3_prefix), self.ledger)
+        return self.existing_combinations_from(report)
+
+    def existing_combinations_from(self, report):
+        """{city: {map_type: info}} for the combinations of a completeness report that are in Spaces"""
+        combinations = group_by_city_map_type(report)
         
-        if os.path.exists(local_dir):
-            for city_item in os.listdir(local_dir):
-                city_path = os.path.join(local_dir, city_item)
-                if os.path.isdir(city_path):
-                    # Apply city filter
-                    if target_cities and city_item not in target_cities:
-                        continue
-                        
-                    for map_type_item in os.listdir(city_path):
-                        map_type_path = os.path.join(city_path, map_type_item)
-                        if os.path.isdir(map_type_path):
-                            # Apply map type filter
-                            if target_map_types and map_type_item not in target_map_types:
-                                continue
-                                
-                            local_combinations.add((city_item, map_type_item))
-        
-        logger.info(f"📊 Found {len(local_combinations)} local combinations to check")
-        
-        # Check each combination in Spaces
-        logger.info("🔍 Checking existing combinations in Spaces...")
-        with tqdm(total=len(local_combinations), desc="Checking combinations") as pbar:
-            for city, map_type in local_combinations:
-                check_result = self.check_city_map_type_exists_in_spaces(city, map_type, s3_prefix)
-                
-                if check_result['exists']:
-                    if city not in existing_combinations:
-                        existing_combinations[city] = {}
-                    existing_combinations[city][map_type] = check_result
-                
-                pbar.update(1)
-                pbar.set_postfix(existing=len(existing_combinations))
+        existing_combinations = {}
+        for city, map_types in combinations.items():
+            for map_type, info in map_types.items():
+                if info['exists'] or info['ledger_only']:
+                    existing_combinations.setdefault(city, {})[map_type] = info
         
+        complete = sum(info['complete'] for map_types in existing_combinations.values() for info in map_types.values())
+        logger.info(f"📊 {sum(len(m) for m in combinations.values())} local combinations, "
+                    f"{sum(len(m) for m in existing_combinations.values())} in Spaces, {complete} complete")
         return existing_combinations
 
     def upload_with_enhanced_filtering(self, local_dir, s3_prefix='', max_workers=5, 
                                      target_cities=None, target_map_types=None, target_zoom_levels=None,
-                                     skip_existing_combinations=True, dry_run=False):
+                                     skip_existing_combinations=True, dry_run=False, async_concurrency=None):
         """Optimized upload method with batch processing and better performance"""
         
         # Increase default workers for better performance
         max_workers = min(max_workers, 15)  # Cap at 15 for DO Spaces
         
         logger.info(f"🚀 Starting Optimized Enhanced Multi-Map Upload")
-        logger.info(f"👥 Using {max_workers} parallel workers")
+        if async_concurrency:
+            logger.info(f"⚡ Using async engine with {async_concurrency} concurrent PUTs")
+        else:
+            logger.info(f"👥 Using {max_workers} parallel workers")
         
         self.stats['start_time'] = time.time()
         
-        # Use parallel scanning
+        if not dry_run:
+            # Upload while the scan is still running
+            self.stream_upload(
+                local_dir, s3_prefix, max_workers, target_cities, target_map_types, target_zoom_levels,
+                skip_existing_combinations, async_concurrency
+            )
+            return
+        
+        # Dry run: scan everything first for the full summary
         files_to_upload = self.scan_multi_map_directory(
             local_dir, s3_prefix, target_cities, target_map_types, target_zoom_levels
         )
@@ -1206,16 +987,20 @@ class EnhancedMultiMapSpacesUploader:
         
         # Batch check existing files for better performance
         if skip_existing_combinations:
+            existing_combinations = self.scan_existing_combinations_in_spaces(local_dir, s3_prefix, files=files_to_upload)
+            if existing_combinations:
+                self.log_existing_combinations(existing_combinations)
+                files_to_upload = self.filter_existing_combinations(files_to_upload, existing_combinations)
+
             logger.info("🔍 Batch checking existing files...")
-            s3_keys = [f['s3_key'] for f in files_to_upload]
-            existing_files = self.batch_check_existence(s3_keys)
+            existing_files = self.batch_check_existence(files_to_upload, s3_prefix)
             
             if existing_files:
-                # Filter out existing files
+                # Filter out files already in Spaces with the same content; changed ones are re-uploaded
                 original_count = len(files_to_upload)
                 files_to_upload = [f for f in files_to_upload if f['s3_key'] not in existing_files]
                 skipped_count = original_count - len(files_to_upload)
-                logger.info(f"⏭️ Skipping {skipped_count} existing files")
+                logger.info(f"⏭️ Skipping {skipped_count} unchanged files")
         
         if not files_to_upload:
             logger.info("✅ All content already exists!")
@@ -1225,95 +1010,336 @@ class EnhancedMultiMapSpacesUploader:
         self.stats['total_files'] = len(files_to_upload)
         self.stats['total_bytes'] = sum(f['file_info']['size'] for f in files_to_upload)
         
-        if dry_run:
-            self.show_dry_run_summary(files_to_upload)
+        self.show_dry_run_summary(files_to_upload)
+    
+    def stream_upload(self, local_dir, s3_prefix, max_workers, target_cities=None, target_map_types=None,
+                      target_zoom_levels=None, skip_existing_combinations=True, async_concurrency=None):
+        """Scan and upload concurrently: jobs go to the upload engine as soon as their directory is scanned"""
+        if not os.path.isdir(local_dir):
+            logger.error(f"Directory not found: {local_dir}")
             return
         
-        # Optimized parallel upload
-        self.perform_optimized_parallel_upload(files_to_upload, max_workers)
+        # Load the snapshot before the first job so existence checks never block the stream
+        inventory = self.get_inventory(s3_prefix) if skip_existing_combinations else None
+        scan_summary = self.new_scan_summary()
+        self.stats['total_files'] = 0
+        self.stats['total_bytes'] = 0
+        existing_count = [0]
+        report = {}  # Per-combination completeness, tallied as the scan streams past
+        
+        def upload_jobs():
+            for file_data in self.iter_scanned_files(local_dir, s3_prefix, target_cities, target_map_types, target_zoom_levels):
+                # Skip only tiles whose remote copy has the same content; changed tiles are re-uploaded
+                if inventory and tally_file(report, file_data, inventory, self.ledger) == 'matched':
+                    existing_count[0] += 1
+                    continue
+                self.update_scan_summary(scan_summary, file_data, file_data['file_info'])
+                self.stats.incr('total_files')
+                self.stats.incr('total_bytes', file_data['file_info']['size'])
+                yield file_data
+        
+        logger.info(f"🔍 Streaming scan of {local_dir} into the upload queue...")
+        jobs = prefetch(upload_jobs())
+        if async_concurrency:
+            self.perform_async_upload(jobs, async_concurrency)
+        else:
+            self.perform_optimized_parallel_upload(jobs, max_workers)
+        
+        if existing_count[0]:
+            logger.info(f"⏭️ Skipped {existing_count[0]:,} files already in Spaces")
+        if report:
+            existing_combinations = self.existing_combinations_from(finish_report(report, inventory))
+            if existing_combinations:
+                self.log_existing_combinations(existing_combinations)
+        self.log_scan_results(scan_summary, self.stats['total_files'])
+        
+        if not self.stats['total_files']:
+            logger.info("✅ All content already exists!" if existing_count[0] else "⚠️ No files found to upload after filtering")
+            return
+        
+        # Keep the snapshot current with what we just uploaded
+        if self.inventory and self.inventory.dirty:
+            self.inventory.save()
         
         # Generate report
         self.stats['end_time'] = time.time()
         self.generate_comprehensive_report()
     
+    def upload_tile_packs(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None,
+                          target_zoom_levels=None, dry_run=False):
+        """Archive mode: one multipart pack + byte-range index per zoom folder instead of a PUT per tile"""
+        self.stats['start_time'] = time.time()
+        stats = TilePackUploader(self).upload_packs(
+            local_dir, s3_prefix, target_cities, target_map_types, target_zoom_levels, dry_run
+        )
+        self.stats['end_time'] = time.time()
+        return stats
+    
+    def describe_local_tile(self, local_path, local_dir, s3_prefix=''):
+        """Upload record (without file_info) for one tile under local_dir; None outside the tile layout"""
+        if self.should_skip_file(os.path.basename(local_path)):
+            return None
+        
+        path_info = self.parse_file_path(local_path, local_dir)
+        if not path_info['valid']:
+            return None
+        
+        rel_path = os.path.relpath(local_path, local_dir)
+        s3_key = os.path.join(s3_prefix, rel_path).replace('\\', '/') if s3_prefix else rel_path.replace('\\', '/')
+        return {
+            'local_path': local_path,
+            's3_key': s3_key,
+            'city': path_info['city'],
+            'map_type': path_info['map_type'],
+            'district': path_info['district'],
+            'zoom': str(path_info['zoom'])
+        }
+
+    def upload_watched_files(self, paths, local_dir, s3_prefix, concurrency):
+        """Upload one debounced batch from watch mode; returns (done_paths, failed_paths)"""
+        done = []
+        path_stats = {}
+        for path in paths:
+            try:
+                path_stats[path] = os.stat(path)
+            except OSError:
+                done.append(path)  # Removed before we got to it
+        
+        hashes = self.hash_cache.get_hashes(path_stats)
+        
+        files = []
+        for path, stat in path_stats.items():
+            file_data = self.describe_local_tile(path, local_dir, s3_prefix)
+            if not file_data or path not in hashes:
+                done.append(path)
+                continue
+            file_data['file_info'] = self.build_file_info(path, stat, hashes[path])
+            files.append(file_data)
+        
+        if files:
+            self.perform_async_upload(files, concurrency)
+        
+        failed = []
+        for file_data in files:
+            if self.ledger.is_uploaded(file_data['s3_key'], file_data['file_info']['md5']):
+                done.append(file_data['local_path'])
+            else:
+                failed.append(file_data['local_path'])
+        
+        return done, failed
+
+    def watch_and_upload(self, local_dir, s3_prefix='', concurrency=64, debounce_seconds=2.0,
+                         batch_size=500, report_interval=30, max_attempts=3):
+        """
+        Continuous incremental upload: watch local_dir and upload tiles once they are complete
+        
+        Args:
+            local_dir: Tile root to watch (e.g. downloaded_tiles/cities)
+            s3_prefix: S3 prefix for uploads
+            concurrency: Concurrent PUTs per batch (async engine)
+            debounce_seconds: A file is uploaded after this long without further writes
+            batch_size: Maximum files per upload batch
+            report_interval: Seconds between queue depth / latency log lines
+            max_attempts: Failed uploads are retried this many times before being dropped
+        """
+        watcher = create_watcher(local_dir)
+        watch_stats = {
+            'files_detected': 0,
+            'files_processed': 0,
+            'files_dropped': 0,
+            'queue_size': 0,
+            'average_processing_time': 0,
+            'max_processing_time': 0
+        }
+        total_latency = 0.0
+        
+        # Pick up whatever a previous session left queued
+        pending = {path: 0 for path, _, _ in self.ledger.queue_items()}  # path -> last write event
+        if pending:
+            logger.info(f"📋 Resuming {len(pending):,} queued files from the ledger")
+        
+        logger.info(f"👀 Watch mode: {local_dir} -> {self.bucket_name}/{s3_prefix} (debounce {debounce_seconds}s, Ctrl+C to stop)")
+        self.stats['start_time'] = time.time()
+        last_report = time.time()
+        
+        try:
+            while True:
+                events = watcher.read_events(min(debounce_seconds / 2, 1.0))
+                now = time.time()
+                
+                new_paths = [path for path in events if not self.should_skip_file(os.path.basename(path))]
+                if new_paths:
+                    fresh = [path for path in set(new_paths) if path not in pending]
+                    self.ledger.queue_add(fresh, now)
+                    watch_stats['files_detected'] += len(fresh)
+                    for path in new_paths:
+                        pending[path] = now
+                
+                ready = [path for path, last_event in pending.items() if now - last_event >= debounce_seconds]
+                for i in range(0, len(ready), batch_size):
+                    batch = ready[i:i + batch_size]
+                    for path in batch:
+                        del pending[path]
+                    
+                    queued = {path: (detected_at, attempts) for path, detected_at, attempts in self.ledger.queue_items(batch)}
+                    done, failed = self.upload_watched_files(batch, local_dir, s3_prefix, concurrency)
+                    finished_at = time.time()
+                    
+                    for path in done:
+                        latency = finished_at - queued.get(path, (finished_at, 0))[0]
+                        total_latency += latency
+                        watch_stats['max_processing_time'] = max(watch_stats['max_processing_time'], latency)
+                    watch_stats['files_processed'] += len(done)
+                    self.ledger.queue_remove(done)
+                    
+                    if failed:
+                        self.ledger.queue_retry(failed)
+                        dropped = [path for path in failed if queued.get(path, (0, 0))[1] + 1 >= max_attempts]
+                        if dropped:
+                            logger.warning(f"⚠️ Giving up on {len(dropped)} files after {max_attempts} attempts")
+                            self.ledger.queue_remove(dropped)
+                            watch_stats['files_dropped'] += len(dropped)
+                        for path in set(failed) - set(dropped):
+                            pending[path] = finished_at  # Retry after another debounce period
+                
+                if now - last_report >= report_interval:
+                    watch_stats['queue_size'] = self.ledger.queue_depth()
+                    if watch_stats['files_processed']:
+                        watch_stats['average_processing_time'] = total_latency / watch_stats['files_processed']
+                    logger.info(
+                        f"📊 Watch: {watch_stats['files_detected']:,} detected, {watch_stats['files_processed']:,} processed, "
+                        f"queue depth {watch_stats['queue_size']:,}, "
+                        f"latency avg {watch_stats['average_processing_time']:.1f}s / max {watch_stats['max_processing_time']:.1f}s"
+                    )
+                    last_report = now
+        
+        except KeyboardInterrupt:
+            logger.info("⏹️ Watch mode stopped")
+        finally:
+            watcher.close()
+            self.save_resume_state()
+            if self.inventory and self.inventory.dirty:
+                self.inventory.save()
+            
+            self.stats['end_time'] = time.time()
+            watch_stats['queue_size'] = self.ledger.queue_depth()
+            if watch_stats['files_processed']:
+                watch_stats['average_processing_time'] = total_latency / watch_stats['files_processed']
+            self.save_watch_report(watch_stats)
+
+    def save_watch_report(self, watch_stats):
+        """JSON report for a watch mode session"""
+        duration = self.stats['end_time'] - self.stats['start_time']
+        report = {
+            'session_info': {
+                'mode': 'watch',
+                'uploader_version': '2.0-enhanced',
+                'timestamp': datetime.now().isoformat(),
+                'duration_seconds': duration,
+                'duration_minutes': duration / 60
+            },
+            'watch_mode_stats': watch_stats,
+            'summary': {
+                'uploaded_files': self.stats['uploaded_files'],
+                'skipped_files': self.stats['skipped_files'],
+                'failed_files': self.stats['failed_files'],
+                'uploaded_size_mb': self.stats['uploaded_bytes'] / 1024 / 1024,
+                'upload_rate_per_minute': self.stats['uploaded_files'] / (duration / 60) if duration > 0 else 0
+            },
+            'breakdowns': {
+                'city_stats': self.stats['city_stats'],
+                'map_type_stats': self.stats['map_type_stats']
+            }
+        }
+        
+        report_file = f"watch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"📋 Watch report saved: {report_file}")
+
     def perform_optimized_parallel_upload(self, files_to_upload, max_workers):
-        """Optimized parallel upload with better resource management"""
-        logger.info(f"📤 Starting optimized upload of {len(files_to_upload):,} files...")
+        """Optimized parallel upload with a bounded in-flight window (list or streaming iterable)"""
+        total = None
+        lookahead = DEFAULT_LOOKAHEAD
+        if isinstance(files_to_upload, list):
+            logger.info(f"📤 Starting optimized upload of {len(files_to_upload):,} files...")
+            # Smaller files first within each prefix for faster initial progress
+            files_to_upload.sort(key=lambda x: x['file_info']['size'])
+            total = len(files_to_upload)
+            lookahead = None
+        else:
+            logger.info("📤 Starting optimized upload while scanning...")
         
-        # Sort files by size (upload smaller files first for faster initial progress)
-        files_to_upload.sort(key=lambda x: x['file_info']['size'])
+        # Interleaved prefixes, map type priority, fair share across cities, small files batched
+        scheduler = self.new_scheduler()
+        upload_queue = scheduler.schedule(files_to_upload, lookahead)
+        unsaved_uploads = 0
+        max_in_flight = max_workers * 2  # Keep the pool busy without queueing everything
         
-        upload_queue = files_to_upload.copy()
-        completed_uploads = 0
+        def submit_next(executor, active_futures):
+            batch = next(upload_queue, None)
+            if batch is None:
+                return False
+            future = executor.submit(self.upload_batch, batch)
+            active_futures[future] = batch
+            return True
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            with tqdm(total=len(files_to_upload), desc="Uploading", unit="file") as pbar:
+            with tqdm(total=total, desc="Uploading", unit="file") as pbar:
                 
-                # Submit initial batch
                 active_futures = {}
-                for _ in range(min(max_workers * 2, len(upload_queue))):  # Queue more tasks
-                    if upload_queue:
-                        file_data = upload_queue.pop(0)
-                        future = executor.submit(
-                            self.upload_single_file_optimized,
-                            file_data['local_path'],
-                            file_data['s3_key'],
-                            file_data['file_info'],
-                            file_data['city'],
-                            file_data['map_type'],
-                            file_data['zoom'],
-                            file_data.get('district')
-                        )
-                        active_futures[future] = file_data
+                while len(active_futures) < max_in_flight and submit_next(executor, active_futures):
+                    pass
                 
-                # Process completions and submit new tasks
+                # Block until something finishes, then refill the window
                 while active_futures:
-                    # Wait for at least one to complete
-                    done_futures = []
-                    for future in list(active_futures.keys()):
-                        if future.done():
-                            done_futures.append(future)
-                    
-                    if not done_futures:
-                        time.sleep(0.01)  # Small sleep to prevent busy waiting
-                        continue
+                    done_futures, _ = wait(active_futures, return_when=FIRST_COMPLETED)
                     
-                    # Process completed futures
                     for future in done_futures:
-                        file_data = active_futures.pop(future)
-                        try:
-                            result = future.result()
+                        batch = active_futures.pop(future)
+                        for file_data, result in zip(batch, future.result()):
                             self.update_progress_bar(pbar, result, file_data)
-                            completed_uploads += 1
-                            
-                            # Save resume state periodically - FIX: Use optimized version
-                            if completed_uploads % 100 == 0:
-                                self.save_resume_state_optimized()
-                                
-                        except Exception as e:
-                            logger.error(f"❌ Task error for {file_data['s3_key']}: {e}")
-                            pbar.update(1)
+                            scheduler.report_result(file_data, result)
+                        
+                        # Save resume state periodically
+                        unsaved_uploads += len(batch)
+                        if unsaved_uploads >= 100:
+                            self.save_resume_state_optimized()
+                            unsaved_uploads = 0
+                        
+                        submit_next(executor, active_futures)
                     
-                    # Submit new tasks to keep queue full
-                    while len(active_futures) < max_workers * 2 and upload_queue:
-                        file_data = upload_queue.pop(0)
-                        future = executor.submit(
-                            self.upload_single_file_optimized,
-                            file_data['local_path'],
-                            file_data['s3_key'],
-                            file_data['file_info'],
-                            file_data['city'],
-                            file_data['map_type'],
-                            file_data['zoom'],
-                            file_data.get('district')
-                        )
-                        active_futures[future] = file_data
+                    metrics.UPLOAD_QUEUE_DEPTH.set(
+                        scheduler.buffered + sum(len(batch) for batch in active_futures.values()), uploader='threads'
+                    )
+        
+        logger.info(f"📊 Scheduler: {scheduler.stats['files']:,} files in {scheduler.stats['batches']:,} batches, "
+                    f"{scheduler.stats['slowdown_cooldowns']} prefix cooldowns")
         
         # Final save
         self.save_resume_state()
 
+    def upload_batch(self, batch):
+        """Upload a batch back to back on one worker (and its pooled connection)"""
+        results = []
+        for file_data in batch:
+            try:
+                results.append(self.upload_single_file_optimized(
+                    file_data['local_path'],
+                    file_data['s3_key'],
+                    file_data['file_info'],
+                    file_data['city'],
+                    file_data['map_type'],
+                    file_data['zoom'],
+                    file_data.get('district')
+                ))
+            except Exception as e:
+                logger.error(f"❌ Task error for {file_data['s3_key']}: {e}")
+                results.append({'success': False, 'error': str(e), 'file': file_data['s3_key']})
+        return results
+
     def log_existing_combinations(self, existing_combinations):
-        """Log existing combinations found in Spaces"""
+        """Log existing combinations found in Spaces with their completeness"""
         print("\n📋 EXISTING COMBINATIONS IN SPACES:")
         print("=" * 40)
         
@@ -1328,36 +1354,43 @@ class EnhancedMultiMapSpacesUploader:
                 map_display = MAP_TYPE_CONFIG.get(map_type, {}).get('display_name', map_type)
                 color = MAP_TYPE_CONFIG.get(map_type, {}).get('color', '⚫')
                 size_mb = info['total_size'] / 1024 / 1024
+                status = '✅' if info['complete'] else '⚠️'
                 
-                print(f"   {color} {map_display}: {info['file_count']:,} files ({size_mb:.1f} MB)")
+                print(f"   {color} {map_display}: {info['file_count']:,} files ({size_mb:.1f} MB) - {status} {describe_completeness(info)}")
+                for district, entry in sorted(info['districts'].items()):
+                    if not entry['complete']:
+                        print(f"      ⚠️ {district}: {describe_completeness(entry)}")
                 
                 total_existing_files += info['file_count']
                 total_existing_size += info['total_size']
         
         print(f"\n📊 TOTAL EXISTING: {total_existing_files:,} files ({total_existing_size/1024/1024:.1f} MB)")
-        print("⏭️ These combinations will be SKIPPED during upload")
+        print("⏭️ COMPLETE combinations will be SKIPPED; incomplete ones resume with their missing/changed tiles")
 
     def filter_existing_combinations(self, files_to_upload, existing_combinations):
-        """Filter out files from existing combinations"""
+        """Filter out files from combinations that are completely uploaded"""
         original_count = len(files_to_upload)
         filtered_files = []
         
         for file_data in files_to_upload:
             city = file_data['city']
             map_type = file_data['map_type']
+            district = file_data.get('district')
+            
+            info = existing_combinations.get(city, {}).get(map_type) if city and map_type else None
+            if info and district:
+                info = info['districts'].get(district)
             
-            # Skip if this combination already exists
-            if (city and map_type and 
-                city in existing_combinations and 
-                map_type in existing_combinations[city]):
-                logger.debug(f"⏭️ Skipping existing combination: {city}/{map_type}")
+            # Skip only when every local tile of the combination is in Spaces with the same content
+            if info and info['complete']:
+                logger.debug(f"⏭️ Skipping complete combination: {city}/{map_type}")
                 continue
             
             filtered_files.append(file_data)
         
         skipped_count = original_count - len(filtered_files)
         if skipped_count > 0:
-            logger.info(f"⏭️ Filtered out {skipped_count:,} files from existing combinations")
+            logger.info(f"⏭️ Filtered out {skipped_count:,} files from complete combinations")
             logger.info(f"📤 Will upload {len(filtered_files):,} files")
         
         return filtered_files
@@ -1493,7 +1526,8 @@ class EnhancedMultiMapSpacesUploader:
                 'files_per_second': files_per_second,
                 'start_time': datetime.fromtimestamp(self.stats['start_time']).isoformat(),
                 'end_time': datetime.fromtimestamp(self.stats['end_time']).isoformat(),
-                'api_calls_estimated': self.api_call_count
+                'api_calls_estimated': self.rate_limiter.total_calls(),
+                'rate_limits': self.rate_limiter.get_stats()
             },
             'breakdowns': {
                 'city_stats': self.stats['city_stats'],
@@ -1645,11 +1679,11 @@ class EnhancedMultiMapSpacesUploader:
                 print(f"  {color} {map_display}: {total_map:,} files ({stats['bytes']/1024/1024:.1f} MB)")
 
     def cleanup_resume_state(self):
-        """Clean up resume state file after successful upload"""
+        """Remove the legacy JSON resume file (the ledger is kept as the upload record)"""
         try:
             if os.path.exists(self.resume_file):
                 os.remove(self.resume_file)
-                logger.info("🧹 Cleaned up resume state file")
+                logger.info("🧹 Cleaned up legacy resume state file")
         except Exception as e:
             logger.warning(f"⚠️ Could not clean up resume state: {e}")
 
@@ -1738,9 +1772,19 @@ Examples:
   %(prog)s --dry-run                         # Preview what would be uploaded
   %(prog)s --skip-existing=false             # Force re-upload existing files
   %(prog)s --workers 10                      # Use 10 parallel workers
+  %(prog)s --async-upload --concurrency 256  # Async engine, 256 PUTs in flight
+  %(prog)s --watch                           # Upload new tiles continuously as they are downloaded
+  %(prog)s --pack                            # One multipart tile pack + range index per zoom folder
+  %(prog)s sync --delete                     # Make --s3-prefix match the local tree (copy/upload/delete)
+  %(prog)s sync --sync-from old-layout       # Server-side copy of another layout root into --s3-prefix
+  %(prog)s --metrics-port 9464               # Prometheus/OpenMetrics endpoint at :9464/metrics
         """
     )
     
+    parser.add_argument('command',
+                       nargs='?', choices=['upload', 'sync'], default='upload',
+                       help='upload (default) or sync: diff against the bucket inventory and copy/upload/delete only what differs')
+    
     parser.add_argument('--local-dir', 
                        default='downloaded_tiles/cities',
                        help='Local directory to upload (default: downloaded_tiles/cities)')
@@ -1766,6 +1810,50 @@ Examples:
                        type=int, default=5,
                        help='Number of parallel workers (default: 5)')
     
+    parser.add_argument('--city-weights',
+                       help='Fair-share weights for the upload order (e.g., hanoi=2,danang=1; default 1 each)')
+    
+    parser.add_argument('--async-upload',
+                       action='store_true',
+                       help='Use the asyncio upload engine instead of the thread pool')
+    
+    parser.add_argument('--concurrency',
+                       type=int, default=256,
+                       help='Concurrent PUTs for --async-upload (default: 256)')
+    
+    parser.add_argument('--watch',
+                       action='store_true',
+                       help='Watch --local-dir and upload new tiles as they are written (async engine)')
+    
+    parser.add_argument('--debounce',
+                       type=float, default=2.0,
+                       help='Seconds without writes before a watched tile is uploaded (default: 2.0)')
+    
+    parser.add_argument('--pack',
+                       action='store_true',
+                       help='Upload each zoom folder as tile pack objects plus a byte-range index.json')
+    
+    parser.add_argument('--sync-from',
+                       help='sync: source layout root in the bucket (prefix -> --s3-prefix, no local files)')
+    
+    parser.add_argument('--copy-from',
+                       help='sync: layout root whose objects are server-side copied when their content matches a local tile')
+    
+    parser.add_argument('--delete',
+                       action='store_true',
+                       help='sync: delete destination tiles missing from the source')
+    
+    parser.add_argument('--refresh-inventory',
+                       action='store_true',
+                       help='Re-list the whole bucket prefix before checking existing files')
+    
+    parser.add_argument('--metrics-port',
+                       type=int,
+                       help='Serve Prometheus/OpenMetrics metrics on this port (default: $GULAND_METRICS_PORT)')
+    
+    parser.add_argument('--metrics-textfile',
+                       help='Write metrics to this node_exporter textfile (default: $GULAND_METRICS_TEXTFILE)')
+    
     parser.add_argument('--dry-run',
                        action='store_true',
                        help='Show what would be uploaded without actually uploading')
@@ -2035,11 +2123,15 @@ def main():
         create_sample_config()
         return
     
+    metrics.start_exporters(args.metrics_port, args.metrics_textfile)
+    
     # Determine if running in CLI mode or interactive mode
     cli_mode = any([
         args.cities, args.map_types, args.zoom_levels, 
         args.dry_run, args.local_dir != 'downloaded_tiles/cities',
-        args.s3_prefix != 'guland-tiles', args.workers != 5
+        args.s3_prefix != 'guland-tiles', args.workers != 5,
+        args.async_upload, args.refresh_inventory, args.watch, args.pack,
+        args.command == 'sync'
     ])
     
     if cli_mode:
@@ -2071,6 +2163,41 @@ def main():
                 region=config['region']
             )
             
+            uploader.city_weights = parse_city_weights(args.city_weights)
+            
+            if args.refresh_inventory:
+                uploader.get_inventory(args.s3_prefix, force_refresh=True)
+            
+            if args.watch:
+                uploader.watch_and_upload(
+                    local_dir=args.local_dir,
+                    s3_prefix=args.s3_prefix,
+                    concurrency=args.concurrency,
+                    debounce_seconds=args.debounce
+                )
+                return
+            
+            if args.command == 'sync':
+                syncer = SpacesSync(uploader, delete=args.delete, dry_run=args.dry_run)
+                if args.sync_from:
+                    syncer.sync_prefixes(args.sync_from, args.s3_prefix, target_cities, target_map_types, target_zoom_levels)
+                else:
+                    syncer.sync_local(
+                        args.local_dir, args.s3_prefix, args.copy_from, target_cities, target_map_types, target_zoom_levels
+                    )
+                return
+            
+            if args.pack:
+                uploader.upload_tile_packs(
+                    local_dir=args.local_dir,
+                    s3_prefix=args.s3_prefix,
+                    target_cities=target_cities,
+                    target_map_types=target_map_types,
+                    target_zoom_levels=target_zoom_levels,
+                    dry_run=args.dry_run
+                )
+                return
+            
             uploader.upload_with_enhanced_filtering(
                 local_dir=args.local_dir,
                 s3_prefix=args.s3_prefix,
@@ -2079,7 +2206,8 @@ def main():
                 target_map_types=target_map_types,
                 target_zoom_levels=target_zoom_levels,
                 skip_existing_combinations=args.skip_existing,
-                dry_run=args.dry_run
+                dry_run=args.dry_run,
+                async_concurrency=args.concurrency if args.async_upload else None
             )
             
         except Exception as e:
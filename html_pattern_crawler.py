@@ -14,10 +14,15 @@ from pathlib import Path
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 import math
+import random
 import re
+import shutil
 import unicodedata
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 import hashlib
+from array import array
+from pattern_registry import PatternRegistry, canonicalize_pattern_url
+import metrics
 
 # Setup optimized logging
 logging.basicConfig(
@@ -65,6 +70,134 @@ MAP_TYPE_CONFIG = {
     }
 }
 
+# Province name variants used to match district JSON files to city keys
+CITY_NAME_VARIANTS = {
+    'backan': ['Bắc_Kạn', 'Bắc Kạn', 'bac-kan', 'backan'],
+    'hanoi': ['Hà_Nội', 'Hà Nội', 'ha-noi', 'hanoi'],
+    'hcm': ['Hồ_Chí_Minh', 'Hồ Chí Minh', 'ho-chi-minh', 'hcm', 'tphcm'],
+    'danang': ['Đà_Nẵng', 'Đà Nẵng', 'da-nang', 'danang'],
+    'haiphong': ['Hải_Phòng', 'Hải Phòng', 'hai-phong', 'haiphong'],
+    'cantho': ['Cần_Thơ', 'Cần Thơ', 'can-tho', 'cantho'],
+    'dongnai': ['Đồng_Nai', 'Đồng Nai', 'dong-nai', 'dongnai'],
+    'baria_vungtau': ['Bà_Rịa_Vũng_Tàu', 'Bà Rịa - Vũng Tàu', 'ba-ria-vung-tau', 'baria_vungtau'],
+    'angiang': ['An_Giang', 'An Giang', 'an-giang', 'angiang'],
+    'bacgiang': ['Bắc_Giang', 'Bắc Giang', 'bac-giang', 'bacgiang'],
+    'baclieu': ['Bạc_Liêu', 'Bạc Liêu', 'bac-lieu', 'baclieu'],
+    'bacninh': ['Bắc_Ninh', 'Bắc Ninh', 'bac-ninh', 'bacninh'],
+    'bentre': ['Bến_Tre', 'Bến Tre', 'ben-tre', 'bentre'],
+    'binhduong': ['Bình_Dương', 'Bình Dương', 'binh-duong', 'binhduong'],
+    'binhphuoc': ['Bình_Phước', 'Bình Phước', 'binh-phuoc', 'binhphuoc'],
+    'binhthuan': ['Bình_Thuận', 'Bình Thuận', 'binh-thuan', 'binhthuan'],
+    'binhdinh': ['Bình_Định', 'Bình Định', 'binh-dinh', 'binhdinh'],
+    'camau': ['Cà_Mau', 'Cà Mau', 'ca-mau', 'camau'],
+    'caobang': ['Cao_Bằng', 'Cao Bằng', 'cao-bang', 'caobang'],
+    'gialai': ['Gia_Lai', 'Gia Lai', 'gia-lai', 'gialai'],
+    'hanam': ['Hà_Nam', 'Hà Nam', 'ha-nam', 'hanam'],
+    'hagiang': ['Hà_Giang', 'Hà Giang', 'ha-giang', 'hagiang'],
+    'hatinh': ['Hà_Tĩnh', 'Hà Tĩnh', 'ha-tinh', 'hatinh'],
+    'haiduong': ['Hải_Dương', 'Hải Dương', 'hai-duong', 'haiduong'],
+    'haugiang': ['Hậu_Giang', 'Hậu Giang', 'hau-giang', 'haugiang'],
+    'hoabinh': ['Hòa_Bình', 'Hòa Bình', 'hoa-binh', 'hoabinh'],
+    'hungyen': ['Hưng_Yên', 'Hưng Yên', 'hung-yen', 'hungyen'],
+    'khanhhoa': ['Khánh_Hòa', 'Khánh Hòa', 'khanh-hoa', 'khanhhoa'],
+    'kiengiang': ['Kiên_Giang', 'Kiên Giang', 'kien-giang', 'kiengiang'],
+    'kontum': ['Kon_Tum', 'Kon Tum', 'kon-tum', 'kontum'],
+    'laichau': ['Lai_Châu', 'Lai Châu', 'lai-chau', 'laichau'],
+    'lamdong': ['Lâm_Đồng', 'Lâm Đồng', 'lam-dong', 'lamdong'],
+    'langson': ['Lạng_Sơn', 'Lạng Sơn', 'lang-son', 'langson'],
+    'laocai': ['Lào_Cai', 'Lào Cai', 'lao-cai', 'laocai'],
+    'longan': ['Long_An', 'Long An', 'long-an', 'longan'],
+    'namdinh': ['Nam_Định', 'Nam Định', 'nam-dinh', 'namdinh'],
+    'nghean': ['Nghệ_An', 'Nghệ An', 'nghe-an', 'nghean'],
+    'ninhbinh': ['Ninh_Bình', 'Ninh Bình', 'ninh-binh', 'ninhbinh'],
+    'ninhthuan': ['Ninh_Thuận', 'Ninh Thuận', 'ninh-thuan', 'ninhthuan'],
+    'phutho': ['Phú_Thọ', 'Phú Thọ', 'phu-tho', 'phutho'],
+    'phuyen': ['Phú_Yên', 'Phú Yên', 'phu-yen', 'phuyen'],
+    'quangbinh': ['Quảng_Bình', 'Quảng Bình', 'quang-binh', 'quangbinh'],
+    'quangnam': ['Quảng_Nam', 'Quảng Nam', 'quang-nam', 'quangnam'],
+    'quangngai': ['Quảng_Ngãi', 'Quảng Ngãi', 'quang-ngai', 'quangngai'],
+    'quangninh': ['Quảng_Ninh', 'Quảng Ninh', 'quang-ninh', 'quangninh'],
+    'quangtri': ['Quảng_Trị', 'Quảng Trị', 'quang-tri', 'quangtri'],
+    'soctrang': ['Sóc_Trăng', 'Sóc Trăng', 'soc-trang', 'soctrang'],
+    'sonla': ['Sơn_La', 'Sơn La', 'son-la', 'sonla'],
+    'tayninh': ['Tây_Ninh', 'Tây Ninh', 'tay-ninh', 'tayninh'],
+    'thaibinh': ['Thái_Bình', 'Thái Bình', 'thai-binh', 'thaibinh'],
+    'thainguyen': ['Thái_Nguyên', 'Thái Nguyên', 'thai-nguyen', 'thainguyen'],
+    'thanhhoa': ['Thanh_Hóa', 'Thanh Hóa', 'thanh-hoa', 'thanhhoa'],
+    'thuathienhue': ['Thừa_Thiên_Huế', 'Thừa Thiên Huế', 'thua-thien-hue', 'thuathienhue'],
+    'tiengiang': ['Tiền_Giang', 'Tiền Giang', 'tien-giang', 'tiengiang'],
+    'travinh': ['Trà_Vinh', 'Trà Vinh', 'tra-vinh', 'travinh'],
+    'tuyenquang': ['Tuyên_Quang', 'Tuyên Quang', 'tuyen-quang', 'tuyenquang'],
+    'vinhlong': ['Vĩnh_Long', 'Vĩnh Long', 'vinh-long', 'vinhlong'],
+    'vinhphuc': ['Vĩnh_Phúc', 'Vĩnh Phúc', 'vinh-phuc', 'vinhphuc'],
+    'yenbai': ['Yên_Bái', 'Yên Bái', 'yen-bai', 'yenbai'],
+    'daklak': ['Đắk_Lắk', 'Đắk Lắk', 'dak-lak', 'daklak'],
+    'daknong': ['Đắk_Nông', 'Đắk Nông', 'dak-nong', 'daknong'],
+    'dienbien': ['Điện_Biên', 'Điện Biên', 'dien-bien', 'dienbien'],
+    'dongthap': ['Đồng_Tháp', 'Đồng Tháp', 'dong-thap', 'dongthap']
+}
+
+def wilson_upper_bound(successes: int, trials: int, z: float = 1.96) -> float:
+    """Upper bound of the Wilson score interval for an observed hit rate"""
+    if trials <= 0:
+        return 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = p + z * z / (2 * trials)
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials))
+    return min(1.0, (centre + margin) / denominator)
+
+def pack_tile_key(zoom: int, x: int, y: int) -> int:
+    """Pack a tile address into one 64-bit integer (x/y fit in 28 bits up to zoom 28)"""
+    return (zoom << 56) | (x << 28) | y
+
+def unpack_tile_key(key: int) -> Tuple[int, int, int]:
+    """Inverse of pack_tile_key"""
+    return key >> 56, (key >> 28) & 0xFFFFFFF, key & 0xFFFFFFF
+
+class TileResult:
+    """Outcome of a single tile download - slotted, no per-tile dicts"""
+    __slots__ = ('success', 'status', 'zoom', 'x', 'y', 'filepath', 'size', 'reason', 'http_status')
+
+    def __init__(self, success, zoom, x, y, status=None, filepath=None, size=0, reason=None, http_status=None):
+        self.success = success
+        self.status = status
+        self.zoom = zoom
+        self.x = x
+        self.y = y
+        self.filepath = filepath
+        self.size = size
+        self.reason = reason
+        self.http_status = http_status
+
+class CrawlCounters:
+    """Streaming tile counters aggregated across batches, zooms and patterns"""
+    __slots__ = ('tried', 'hits', 'cached', 'downloaded', 'bytes')
+
+    def __init__(self):
+        self.tried = 0
+        self.hits = 0
+        self.cached = 0
+        self.downloaded = 0
+        self.bytes = 0
+
+    def add_result(self, result: TileResult):
+        self.tried += 1
+        if result.success:
+            self.hits += 1
+            self.bytes += result.size
+            if result.status == 'cached':
+                self.cached += 1
+            elif result.status == 'downloaded':
+                self.downloaded += 1
+
+    def merge(self, other: 'CrawlCounters'):
+        self.tried += other.tried
+        self.hits += other.hits
+        self.cached += other.cached
+        self.downloaded += other.downloaded
+        self.bytes += other.bytes
+
 class UltraOptimizedTileDownloader:
     def __init__(self, 
                  max_workers=50,
@@ -98,21 +231,40 @@ class UltraOptimizedTileDownloader:
             'total_bytes': 0,
             'total_skipped': 0,
             'cache_hits': 0,
+            'patterns_probed': 0,
+            'patterns_aborted': 0,
             'map_type_stats': {}
         }
         
-        # Cache for file existence checks
+        # Pattern health probing - stop burning requests on dead patterns
+        self.probe_max_coarse_tiles = 256   # Probe the coarsest zoom exhaustively up to this size
+        self.probe_grid_size = 4            # Grid samples per axis for the other zoom levels
+        self.min_pattern_hit_rate = 0.005   # Abort once the hit rate is confidently below this
+        self.max_blocked_batches = 3        # Abort after this many fully blocked batches (403/HTML)
+        self.pattern_health = {}
+        
+        # Shared on-disk pattern registry: sources, dedup and health across runs
+        self.pattern_registry = PatternRegistry()
+        self.health_ttl_hours = 24          # Dead/blocked verdicts older than this are re-probed
+        self.persisted_demotions = self.pattern_registry.demoted_patterns(self.health_ttl_hours)
+        
+        # KH_2025: learn each district's extent at the coarsest zoom instead of crawling the city bbox
+        self.district_zoom_descent = True
+        
+        # Cache for file existence checks - filled per city on first use
         self.file_exists_cache = set()
-        self.build_file_cache()
+        self._file_cache_cities = set()
         
-        # District data
+        # District data - loaded per city on first use
         self.district_data = {}
-        self.load_district_data()
+        self._district_sources_refreshed = False
+        
+        # Optional crawl-to-Spaces stage (CrawlUploadPipeline): new tiles are uploaded from memory
+        self.upload_pipeline = None
         
         logger.info(f"🚀 ULTRA-OPTIMIZED Downloader initialized")
         logger.info(f"⚡ Max workers: {max_workers}, Batch size: {batch_size}")
         logger.info(f"🔗 Connection pool: {max_connections}/{max_connections_per_host}")
-        logger.info(f"📁 Cache built: {len(self.file_exists_cache)} existing files")
         
         self._session = None
         self._session_lock = asyncio.Lock()
@@ -130,51 +282,100 @@ class UltraOptimizedTileDownloader:
         if self._session and not self._session.closed:
             await self._session.close()
 
-    def build_file_cache(self):
-        """Build cache of existing files for ultra-fast existence checks"""
+    def city_file_index_path(self, city_name: str) -> Path:
+        """Compact per-city index of downloaded tiles"""
+        return Path(self.base_download_dir) / 'cities' / city_name / '.file_index'
+
+    def ensure_city_file_cache(self, city_name: str):
+        """Load a city's existing files into the cache on first use"""
+        if city_name in self._file_cache_cities:
+            return
+        self._file_cache_cities.add(city_name)
+        
         start_time = time.time()
-        cache_file = f"{self.base_download_dir}/.file_cache.txt"
+        index_path = self.city_file_index_path(city_name)
         
-        # Try to load from cache file first
-        if os.path.exists(cache_file) and os.path.getmtime(cache_file) > time.time() - 3600:
+        # Index lines: "<relative dir>\t<file>\t<file>..." - one line per zoom directory
+        if index_path.exists() and index_path.stat().st_mtime > time.time() - 3600:
             try:
-                with open(cache_file, 'r') as f:
-                    self.file_exists_cache = set(line.strip() for line in f)
-                logger.info(f"📋 Loaded file cache: {len(self.file_exists_cache)} files in {time.time() - start_time:.2f}s")
+                loaded = 0
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        directory, *names = line.rstrip('\n').split('\t')
+                        self.file_exists_cache.update(f"{directory}/{name}" for name in names)
+                        loaded += len(names)
+                logger.info(f"📋 Loaded file index for {city_name}: {loaded} files in {time.time() - start_time:.2f}s")
                 return
-            except:
+            except OSError:
                 pass
         
-        # Build cache from scratch
-        cities_dir = Path(self.base_download_dir) / 'cities'
-        if cities_dir.exists():
-            for tile_file in cities_dir.rglob('*.*'):
-                if tile_file.is_file() and tile_file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.webp']:
-                    relative_path = str(tile_file.relative_to(self.base_download_dir))
-                    self.file_exists_cache.add(relative_path)
+        files_by_dir = self.scan_city_files(city_name)
+        for directory, names in files_by_dir.items():
+            self.file_exists_cache.update(f"{directory}/{name}" for name in names)
+        self.save_city_file_index(city_name, files_by_dir)
+        
+        total = sum(len(names) for names in files_by_dir.values())
+        logger.info(f"🏗️ Built file index for {city_name}: {total} files in {time.time() - start_time:.2f}s")
+
+    def scan_city_files(self, city_name: str) -> Dict[str, List[str]]:
+        """Walk one city folder with os.scandir, grouping tile names by directory"""
+        files_by_dir = {}
+        city_dir = os.path.join(self.base_download_dir, 'cities', city_name)
+        pending = [city_dir]
+        
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    names = []
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in ('.png', '.jpg', '.jpeg', '.webp'):
+                            names.append(entry.name)
+            except OSError:
+                continue
+            if names:
+                files_by_dir[os.path.relpath(current, self.base_download_dir)] = names
+        
+        return files_by_dir
+
+    def save_city_file_index(self, city_name: str, files_by_dir: Optional[Dict[str, List[str]]] = None):
+        """Write the compact index of a city (from the in-memory cache if no scan is given)"""
+        if files_by_dir is None:
+            prefix = f"cities/{city_name}/"
+            files_by_dir = {}
+            for relative_path in self.file_exists_cache:
+                if relative_path.startswith(prefix):
+                    directory, _, name = relative_path.rpartition('/')
+                    files_by_dir.setdefault(directory, []).append(name)
+        
+        index_path = self.city_file_index_path(city_name)
+        if not index_path.parent.exists():
+            return
         
-        # Save cache
         try:
-            with open(cache_file, 'w') as f:
-                for file_path in sorted(self.file_exists_cache):
-                    f.write(f"{file_path}\n")
-        except:
+            temp_path = index_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for directory in sorted(files_by_dir):
+                    f.write('\t'.join([directory] + sorted(files_by_dir[directory])) + '\n')
+            os.replace(temp_path, index_path)
+        except OSError:
             pass
-        
-        build_time = time.time() - start_time
-        logger.info(f"🏗️ Built file cache: {len(self.file_exists_cache)} files in {build_time:.2f}s")
 
     def fast_file_exists(self, filepath: str) -> bool:
         """Ultra-fast file existence check using cache"""
-        relative_path = str(Path(filepath).relative_to(self.base_download_dir))
-        exists = relative_path in self.file_exists_cache
+        relative_path = Path(filepath).relative_to(self.base_download_dir)
+        if len(relative_path.parts) > 1 and relative_path.parts[0] == 'cities':
+            self.ensure_city_file_cache(relative_path.parts[1])
+        exists = relative_path.as_posix() in self.file_exists_cache
         if exists:
             self.stats['cache_hits'] += 1
         return exists
 
     def add_to_cache(self, filepath: str):
         """Add new file to cache"""
-        relative_path = str(Path(filepath).relative_to(self.base_download_dir))
+        relative_path = Path(filepath).relative_to(self.base_download_dir).as_posix()
         self.file_exists_cache.add(relative_path)
 
     async def create_session(self) -> aiohttp.ClientSession:
@@ -212,7 +413,7 @@ class UltraOptimizedTileDownloader:
         city_name: str,
         map_type: str,
         district_name: Optional[str] = None
-    ) -> Dict:
+    ) -> TileResult:
         """Ultra-optimized async tile download"""
         try:
             url = tile_info['url']
@@ -240,21 +441,13 @@ class UltraOptimizedTileDownloader:
                 try:
                     file_size = os.path.getsize(filepath)
                     self.stats['total_skipped'] += 1
-                    return {
-                        'success': True,
-                        'filepath': filepath,
-                        'size': file_size,
-                        'status': 'cached',
-                        'tile_info': tile_info,
-                        'map_type': map_type,
-                        'district_name': district_name
-                    }
+                    return TileResult(True, zoom, x, y, status='cached', filepath=filepath, size=file_size)
                 except:
                     # File corrupted, download again
                     pass
             
             if not self.enable_download:
-                return {'success': False, 'reason': 'Download disabled'}
+                return TileResult(False, zoom, x, y, reason='Download disabled')
             
             # Download with streaming for memory efficiency
             async with session.get(url) as response:
@@ -262,10 +455,17 @@ class UltraOptimizedTileDownloader:
                     content_type = response.headers.get('content-type', '').lower()
                     
                     if any(img_type in content_type for img_type in ['image/', 'application/octet-stream']):
-                        # Stream to file for memory efficiency
+                        # Stream to file for memory efficiency (keep the body only when streaming uploads)
+                        body = bytearray() if self.upload_pipeline else None
+                        write_seconds = 0.0
                         async with aiofiles.open(filepath, 'wb') as f:
                             async for chunk in response.content.iter_chunked(8192):
+                                write_started = time.perf_counter()
                                 await f.write(chunk)
+                                write_seconds += time.perf_counter() - write_started
+                                if body is not None:
+                                    body.extend(chunk)
+                        metrics.DISK_WRITE_SECONDS.observe(write_seconds, engine='ultra')
                         
                         # Check file size
                         size = os.path.getsize(filepath)
@@ -274,20 +474,16 @@ class UltraOptimizedTileDownloader:
                             # Add to cache
                             self.add_to_cache(filepath)
                             
+                            if body is not None:
+                                self.upload_pipeline.enqueue(filepath, bytes(body))
+                            
                             # Update stats atomically
                             self.stats['total_successful'] += 1
                             self.stats['total_bytes'] += size
                             
-                            return {
-                                'success': True,
-                                'filepath': filepath,
-                                'size': size,
-                                'status': 'downloaded',
-                                'tile_info': tile_info,
-                                'map_type': map_type,
-                                'district_name': district_name,
-                                'content_type': content_type
-                            }
+                            return TileResult(
+                                True, zoom, x, y, status='downloaded', filepath=filepath, size=size, http_status=200
+                            )
                         else:
                             # Remove invalid file
                             try:
@@ -296,50 +492,26 @@ class UltraOptimizedTileDownloader:
                                 pass
                             
                             self.stats['total_failed'] += 1
-                            return {
-                                'success': False,
-                                'reason': f'Invalid file size: {size}',
-                                'tile_info': tile_info,
-                                'map_type': map_type,
-                                'district_name': district_name
-                            }
+                            return TileResult(False, zoom, x, y, reason=f'Invalid file size: {size}', http_status=200)
                     else:
                         self.stats['total_failed'] += 1
-                        return {
-                            'success': False,
-                            'reason': f'Invalid content type: {content_type}',
-                            'tile_info': tile_info,
-                            'map_type': map_type,
-                            'district_name': district_name
-                        }
+                        return TileResult(
+                            False, zoom, x, y, reason=f'Invalid content type: {content_type}', http_status=200
+                        )
                 else:
                     self.stats['total_failed'] += 1
-                    return {
-                        'success': False,
-                        'reason': f'HTTP {response.status}',
-                        'tile_info': tile_info,
-                        'map_type': map_type,
-                        'district_name': district_name
-                    }
+                    return TileResult(
+                        False, zoom, x, y, reason=f'HTTP {response.status}', http_status=response.status
+                    )
                     
         except asyncio.TimeoutError:
             self.stats['total_failed'] += 1
-            return {
-                'success': False,
-                'reason': 'Timeout',
-                'tile_info': tile_info,
-                'map_type': map_type,
-                'district_name': district_name
-            }
+            return TileResult(False, tile_info.get('zoom'), tile_info.get('x'), tile_info.get('y'), reason='Timeout')
         except Exception as e:
             self.stats['total_failed'] += 1
-            return {
-                'success': False,
-                'reason': f'Error: {str(e)}',
-                'tile_info': tile_info,
-                'map_type': map_type,
-                'district_name': district_name
-            }
+            return TileResult(
+                False, tile_info.get('zoom'), tile_info.get('x'), tile_info.get('y'), reason=f'Error: {str(e)}'
+            )
 
     async def download_batch_async(
         self,
@@ -347,9 +519,12 @@ class UltraOptimizedTileDownloader:
         city_name: str,
         map_type: str,
         district_name: Optional[str] = None
-    ) -> List[Dict]:
+    ) -> List[TileResult]:
         """Ultra-optimized batch download with async processing"""
         
+        if self.upload_pipeline:
+            await self.upload_pipeline.wait_for_capacity()
+        
         # FIX: Await the session creation and use it properly
         session = await self.create_session()
         try:
@@ -357,12 +532,25 @@ class UltraOptimizedTileDownloader:
             semaphore = asyncio.Semaphore(self.max_workers)
             
             async def download_with_semaphore(tile_info):
-                async with semaphore:
-                    return await self.download_single_tile_async(
-                        session, tile_info, city_name, map_type, district_name
-                    )
+                try:
+                    async with semaphore:
+                        started = time.perf_counter()
+                        with metrics.TILES_IN_FLIGHT.track_inprogress(engine='ultra'):
+                            result = await self.download_single_tile_async(
+                                session, tile_info, city_name, map_type, district_name
+                            )
+                        if result.status != 'cached' and self.enable_download:
+                            metrics.observe_tile(
+                                'ultra', tile_info['url'],
+                                result.http_status or ('timeout' if result.reason == 'Timeout' else 'error'),
+                                time.perf_counter() - started, result.size if result.status == 'downloaded' else 0
+                            )
+                        return result
+                finally:
+                    metrics.CRAWL_QUEUE_DEPTH.dec(engine='ultra')
             
             # Execute all downloads concurrently
+            metrics.CRAWL_QUEUE_DEPTH.inc(len(tile_batch), engine='ultra')
             tasks = [download_with_semaphore(tile_info) for tile_info in tile_batch]
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
@@ -370,13 +558,11 @@ class UltraOptimizedTileDownloader:
             processed_results = []
             for i, result in enumerate(results):
                 if isinstance(result, Exception):
-                    processed_results.append({
-                        'success': False,
-                        'reason': f'Exception: {str(result)}',
-                        'tile_info': tile_batch[i],
-                        'map_type': map_type,
-                        'district_name': district_name
-                    })
+                    tile_info = tile_batch[i]
+                    processed_results.append(TileResult(
+                        False, tile_info.get('zoom'), tile_info.get('x'), tile_info.get('y'),
+                        reason=f'Exception: {str(result)}'
+                    ))
                 else:
                     processed_results.append(result)
             
@@ -740,148 +926,51 @@ class UltraOptimizedTileDownloader:
         return clean_name
 
 
-    def load_district_data(self):
-        """Load district data from JSON files with improved name matching"""
+    def get_city_districts(self, city_name: str) -> Dict:
+        """District data of one city, loaded on first use"""
+        if city_name not in self.district_data:
+            self.district_data[city_name] = self.load_district_data(city_name)
+        return self.district_data[city_name]
+
+    def load_district_data(self, city_name: str) -> Dict:
+        """Load KH_2025 district patterns of a single city from the pattern registry"""
         districts_dir = Path('output_enhanced_patterns/districts')
         if not districts_dir.exists():
             logger.warning(f"📁 Districts directory not found: {districts_dir}")
-            return
+            return {}
         
-        # City name mapping for better matching
-        city_name_mapping = {
-            'backan': ['Bắc_Kạn', 'Bắc Kạn', 'bac-kan', 'backan'],
-            'hanoi': ['Hà_Nội', 'Hà Nội', 'ha-noi', 'hanoi'],
-            'hcm': ['Hồ_Chí_Minh', 'Hồ Chí Minh', 'ho-chi-minh', 'hcm', 'tphcm'],
-            'danang': ['Đà_Nẵng', 'Đà Nẵng', 'da-nang', 'danang'],
-            'haiphong': ['Hải_Phòng', 'Hải Phòng', 'hai-phong', 'haiphong'],
-            'cantho': ['Cần_Thơ', 'Cần Thơ', 'can-tho', 'cantho'],
-            'dongnai': ['Đồng_Nai', 'Đồng Nai', 'dong-nai', 'dongnai'],
-            'baria_vungtau': ['Bà_Rịa_Vũng_Tàu', 'Bà Rịa - Vũng Tàu', 'ba-ria-vung-tau', 'baria_vungtau'],
-            'angiang': ['An_Giang', 'An Giang', 'an-giang', 'angiang'],
-            'bacgiang': ['Bắc_Giang', 'Bắc Giang', 'bac-giang', 'bacgiang'],
-            'baclieu': ['Bạc_Liêu', 'Bạc Liêu', 'bac-lieu', 'baclieu'],
-            'bacninh': ['Bắc_Ninh', 'Bắc Ninh', 'bac-ninh', 'bacninh'],
-            'bentre': ['Bến_Tre', 'Bến Tre', 'ben-tre', 'bentre'],
-            'binhduong': ['Bình_Dương', 'Bình Dương', 'binh-duong', 'binhduong'],
-            'binhphuoc': ['Bình_Phước', 'Bình Phước', 'binh-phuoc', 'binhphuoc'],
-            'binhthuan': ['Bình_Thuận', 'Bình Thuận', 'binh-thuan', 'binhthuan'],
-            'binhdinh': ['Bình_Định', 'Bình Định', 'binh-dinh', 'binhdinh'],
-            'camau': ['Cà_Mau', 'Cà Mau', 'ca-mau', 'camau'],
-            'caobang': ['Cao_Bằng', 'Cao Bằng', 'cao-bang', 'caobang'],
-            'gialai': ['Gia_Lai', 'Gia Lai', 'gia-lai', 'gialai'],
-            'hanam': ['Hà_Nam', 'Hà Nam', 'ha-nam', 'hanam'],
-            'hagiang': ['Hà_Giang', 'Hà Giang', 'ha-giang', 'hagiang'],
-            'hatinh': ['Hà_Tĩnh', 'Hà Tĩnh', 'ha-tinh', 'hatinh'],
-            'haiduong': ['Hải_Dương', 'Hải Dương', 'hai-duong', 'haiduong'],
-            'haugiang': ['Hậu_Giang', 'Hậu Giang', 'hau-giang', 'haugiang'],
-            'hoabinh': ['Hòa_Bình', 'Hòa Bình', 'hoa-binh', 'hoabinh'],
-            'hungyen': ['Hưng_Yên', 'Hưng Yên', 'hung-yen', 'hungyen'],
-            'khanhhoa': ['Khánh_Hòa', 'Khánh Hòa', 'khanh-hoa', 'khanhhoa'],
-            'kiengiang': ['Kiên_Giang', 'Kiên Giang', 'kien-giang', 'kiengiang'],
-            'kontum': ['Kon_Tum', 'Kon Tum', 'kon-tum', 'kontum'],
-            'laichau': ['Lai_Châu', 'Lai Châu', 'lai-chau', 'laichau'],
-            'lamdong': ['Lâm_Đồng', 'Lâm Đồng', 'lam-dong', 'lamdong'],
-            'langson': ['Lạng_Sơn', 'Lạng Sơn', 'lang-son', 'langson'],
-            'laocai': ['Lào_Cai', 'Lào Cai', 'lao-cai', 'laocai'],
-            'longan': ['Long_An', 'Long An', 'long-an', 'longan'],
-            'namdinh': ['Nam_Định', 'Nam Định', 'nam-dinh', 'namdinh'],
-            'nghean': ['Nghệ_An', 'Nghệ An', 'nghe-an', 'nghean'],
-            'ninhbinh': ['Ninh_Bình', 'Ninh Bình', 'ninh-binh', 'ninhbinh'],
-            'ninhthuan': ['Ninh_Thuận', 'Ninh Thuận', 'ninh-thuan', 'ninhthuan'],
-            'phutho': ['Phú_Thọ', 'Phú Thọ', 'phu-tho', 'phutho'],
-            'phuyen': ['Phú_Yên', 'Phú Yên', 'phu-yen', 'phuyen'],
-            'quangbinh': ['Quảng_Bình', 'Quảng Bình', 'quang-binh', 'quangbinh'],
-            'quangnam': ['Quảng_Nam', 'Quảng Nam', 'quang-nam', 'quangnam'],
-            'quangngai': ['Quảng_Ngãi', 'Quảng Ngãi', 'quang-ngai', 'quangngai'],
-            'quangninh': ['Quảng_Ninh', 'Quảng Ninh', 'quang-ninh', 'quangninh'],
-            'quangtri': ['Quảng_Trị', 'Quảng Trị', 'quang-tri', 'quangtri'],
-            'soctrang': ['Sóc_Trăng', 'Sóc Trăng', 'soc-trang', 'soctrang'],
-            'sonla': ['Sơn_La', 'Sơn La', 'son-la', 'sonla'],
-            'tayninh': ['Tây_Ninh', 'Tây Ninh', 'tay-ninh', 'tayninh'],
-            'thaibinh': ['Thái_Bình', 'Thái Bình', 'thai-binh', 'thaibinh'],
-            'thainguyen': ['Thái_Nguyên', 'Thái Nguyên', 'thai-nguyen', 'thainguyen'],
-            'thanhhoa': ['Thanh_Hóa', 'Thanh Hóa', 'thanh-hoa', 'thanhhoa'],
-            'thuathienhue': ['Thừa_Thiên_Huế', 'Thừa Thiên Huế', 'thua-thien-hue', 'thuathienhue'],
-            'tiengiang': ['Tiền_Giang', 'Tiền Giang', 'tien-giang', 'tiengiang'],
-            'travinh': ['Trà_Vinh', 'Trà Vinh', 'tra-vinh', 'travinh'],
-            'tuyenquang': ['Tuyên_Quang', 'Tuyên Quang', 'tuyen-quang', 'tuyenquang'],
-            'vinhlong': ['Vĩnh_Long', 'Vĩnh Long', 'vinh-long', 'vinhlong'],
-            'vinhphuc': ['Vĩnh_Phúc', 'Vĩnh Phúc', 'vinh-phuc', 'vinhphuc'],
-            'yenbai': ['Yên_Bái', 'Yên Bái', 'yen-bai', 'yenbai'],
-            'daklak': ['Đắk_Lắk', 'Đắk Lắk', 'dak-lak', 'daklak'],
-            'daknong': ['Đắk_Nông', 'Đắk Nông', 'dak-nong', 'daknong'],
-            'dienbien': ['Điện_Biên', 'Điện Biên', 'dien-bien', 'dienbien'],
-            'dongthap': ['Đồng_Tháp', 'Đồng Tháp', 'dong-thap', 'dongthap']
-        }
+        name_variants = CITY_NAME_VARIANTS.get(city_name)
+        if not name_variants:
+            return {}
         
-        loaded_count = 0
+        # Only re-parses district JSONs that changed since the last run
+        if not self._district_sources_refreshed:
+            self.pattern_registry.refresh(kinds=['district'])
+            self._district_sources_refreshed = True
         
-        for json_file in districts_dir.glob('*_districts.json'):
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                province_name = data.get('province_name', '')
-                
-                # Find matching city key
-                matched_city = None
-                for city_key, name_variants in city_name_mapping.items():
-                    if any(variant in json_file.name or variant == province_name for variant in name_variants):
-                        matched_city = city_key
-                        break
-                
-                if matched_city:
-                    # FIX: Process district data structure correctly
-                    if 'districts' in data:
-                        city_districts = {}
-                        
-                        for district_name, district_info in data['districts'].items():
-                            if 'patterns' in district_info and 'map_types' in district_info['patterns']:
-                                map_types = district_info['patterns']['map_types']
-                                
-                                # Extract KH_2025 patterns
-                                kh_2025_patterns = []
-                                if 'KH_2025' in map_types:
-                                    kh_data = map_types['KH_2025']
-                                    if isinstance(kh_data, dict) and 'tile_url' in kh_data:
-                                        tile_url = kh_data['tile_url']
-                                        if tile_url and tile_url.strip():
-                                            kh_2025_patterns.append(tile_url.strip())
-                                
-                                # Clean district name
-                                clean_district_name = self.clean_district_name(district_name)
-                                
-                                # Store properly structured data
-                                city_districts[clean_district_name] = {
-                                    'original_name': district_name,
-                                    'clean_name': clean_district_name,
-                                    'kh_2025_patterns': kh_2025_patterns
-                                }
-                        
-                        # Only add if we have districts with data
-                        if city_districts:
-                            self.district_data[matched_city] = city_districts                                                       
-                            loaded_count += 1
-                            logger.info(f"✅ Loaded {len(city_districts)} districts for {matched_city}: {json_file.name}")
-                        else:
-                            logger.warning(f"⚠️ No valid districts found for {matched_city}: {json_file.name}")
-                    else:
-                        logger.warning(f"⚠️ No districts section found in {json_file.name}")
-                else:
-                    logger.warning(f"⚠️ No city mapping found for: {json_file.name} (province: {province_name})")
-                    
-            except Exception as e:
-                logger.error(f"❌ Error loading {json_file}: {e}")
-                import traceback
-                logger.error(f"📍 Traceback: {traceback.format_exc()}")
-        
-        logger.info(f"📊 Loaded district data for {loaded_count} cities")
+        city_districts = {}
+        matched_files = set()
         
-        # Debug: Show what was loaded
-        for city_name, districts in self.district_data.items():
-            valid_districts = sum(1 for d in districts.values() if d.get('kh_2025_patterns'))
-            logger.info(f"   📊 {city_name}: {valid_districts}/{len(districts)} districts with KH_2025 patterns")
+        for row in self.pattern_registry.query_patterns(kinds=['district'], map_type='KH_2025'):
+            file_name = Path(row['source_path']).name
+            if not any(variant in file_name or variant == row['location'] for variant in name_variants):
+                continue
             
+            matched_files.add(file_name)
+            clean_district_name = self.clean_district_name(row['district'])
+            district_entry = city_districts.setdefault(clean_district_name, {
+                'original_name': row['district'],
+                'clean_name': clean_district_name,
+                'kh_2025_patterns': []
+            })
+            if row['url'] not in district_entry['kh_2025_patterns']:
+                district_entry['kh_2025_patterns'].append(row['url'])
+        
+        if city_districts:
+            logger.info(f"✅ Loaded {len(city_districts)} districts for {city_name}: {', '.join(sorted(matched_files))}")
+        
+        return city_districts
+
     def normalize_city_name(self, city_name_raw: str) -> str:
         """Normalize city name from filename to match pattern expectations"""
         # Convert "Kon_Tum" -> "kon_tum" -> "kontum"
@@ -1173,9 +1262,29 @@ class UltraOptimizedTileDownloader:
         
     #     return clean_name
 
-    def generate_tile_urls_optimized(self, pattern: str, city_coverage: Dict) -> List[Dict]:
-        """FIX: Generate ALL tile URLs properly"""
-        all_tiles = []
+    def iter_coverage_tiles(self, coverage: Dict):
+        """Yield (x, y) for a zoom coverage - children of the parent hits when projected, else the bbox"""
+        if coverage.get('parent_hits') is not None:
+            factor = coverage['factor']
+            for px, py in sorted(coverage['parent_hits']):
+                for x in range(max(px * factor, coverage['x_min']), min(px * factor + factor - 1, coverage['x_max']) + 1):
+                    for y in range(max(py * factor, coverage['y_min']), min(py * factor + factor - 1, coverage['y_max']) + 1):
+                        yield x, y
+            return
+        for x in range(coverage['x_min'], coverage['x_max'] + 1):
+            for y in range(coverage['y_min'], coverage['y_max'] + 1):
+                yield x, y
+
+    def count_coverage_tiles(self, coverage: Dict) -> int:
+        """Number of tiles a zoom coverage will generate"""
+        if coverage.get('parent_hits') is not None:
+            return coverage['total_tiles']
+        return (coverage['x_max'] - coverage['x_min'] + 1) * (coverage['y_max'] - coverage['y_min'] + 1)
+
+    def generate_tile_keys(self, pattern: str, city_coverage: Dict, exclude: Optional[set] = None) -> array:
+        """Generate ALL tiles of the coverage as packed 64-bit keys (8 bytes per tile)"""
+        tile_keys = array('Q')
+        exclude = exclude or set()
         
         logger.info(f"🔢 Generating tiles for pattern: {pattern}")
         
@@ -1187,58 +1296,280 @@ class UltraOptimizedTileDownloader:
             
             zoom_tiles = 0
             
-            # FIX: Generate ALL tiles in the coverage area
-            for x in range(x_min, x_max + 1):
-                for y in range(y_min, y_max + 1):
-                    url = pattern.replace('{z}', str(zoom)).replace('{x}', str(x)).replace('{y}', str(y))
-                    all_tiles.append({
-                        'url': url,
-                        'zoom': zoom,
-                        'x': x,
-                        'y': y,
-                        'pattern': pattern
-                    })
-                    zoom_tiles += 1
+            # Generate ALL tiles in the coverage area (or the learned tile set)
+            for x, y in self.iter_coverage_tiles(coverage):
+                if (zoom, x, y) in exclude:
+                    continue
+                tile_keys.append(pack_tile_key(zoom, x, y))
+                zoom_tiles += 1
             
             logger.info(f"  📊 Zoom {zoom}: {zoom_tiles:,} tiles (x:{x_min}-{x_max}, y:{y_min}-{y_max})")
         
-        logger.info(f"📊 Total tiles generated: {len(all_tiles):,}")
-        return all_tiles
+        logger.info(f"📊 Total tiles generated: {len(tile_keys):,}")
+        return tile_keys
 
-    async def crawl_pattern_ultra_fast(
+    def tile_info_from_key(self, pattern: str, key: int) -> Dict:
+        """Build the download request of one packed tile key"""
+        zoom, x, y = unpack_tile_key(key)
+        url = pattern.replace('{z}', str(zoom)).replace('{x}', str(x)).replace('{y}', str(y))
+        return {'url': url, 'zoom': zoom, 'x': x, 'y': y}
+
+    def generate_probe_tiles(self, pattern: str, city_coverage: Dict) -> List[Dict]:
+        """Pick a spatially spread sample of tiles to probe a pattern before the full crawl"""
+        probe_tiles = []
+        seen = set()
+        
+        def add_tile(zoom, x, y):
+            if (zoom, x, y) in seen:
+                return
+            seen.add((zoom, x, y))
+            url = pattern.replace('{z}', str(zoom)).replace('{x}', str(x)).replace('{y}', str(y))
+            probe_tiles.append({'url': url, 'zoom': zoom, 'x': x, 'y': y})
+        
+        zooms = sorted(city_coverage.keys())
+        for index, zoom in enumerate(zooms):
+            coverage = city_coverage[zoom]
+            x_min, x_max = coverage['x_min'], coverage['x_max']
+            y_min, y_max = coverage['y_min'], coverage['y_max']
+            zoom_tiles = self.count_coverage_tiles(coverage)
+            
+            # Coarsest zoom is cheap - probe it exhaustively so small districts are never missed
+            if index == 0 and zoom_tiles <= self.probe_max_coarse_tiles:
+                for x, y in self.iter_coverage_tiles(coverage):
+                    add_tile(zoom, x, y)
+                continue
+            
+            grid = self.probe_grid_size
+            
+            # Projected coverages: evenly strided sample of their tiles
+            if coverage.get('parent_hits') is not None:
+                step = max(1, zoom_tiles // (grid * grid))
+                for index_in_zoom, (x, y) in enumerate(self.iter_coverage_tiles(coverage)):
+                    if index_in_zoom % step == 0:
+                        add_tile(zoom, x, y)
+                continue
+            
+            # Other zooms: evenly spaced grid including the centre tile
+            for i in range(grid):
+                for j in range(grid):
+                    x = x_min + (x_max - x_min) * (2 * i + 1) // (2 * grid)
+                    y = y_min + (y_max - y_min) * (2 * j + 1) // (2 * grid)
+                    add_tile(zoom, x, y)
+            if 'center_x' in coverage and 'center_y' in coverage:
+                add_tile(zoom, coverage['center_x'], coverage['center_y'])
+        
+        return probe_tiles
+
+    def classify_tile_failure(self, result: TileResult) -> str:
+        """Classify a failed tile result: missing, blocked (403/HTML) or transient error"""
+        status = result.http_status
+        reason = str(result.reason or '').lower()
+        
+        if status == 404 or status == 204:
+            return 'missing'
+        if status in (401, 403, 451) or 'text/html' in reason:
+            return 'blocked'
+        if status is not None and status >= 500:
+            return 'error'
+        if 'invalid file size' in reason:
+            return 'missing'
+        return 'error'
+
+    async def probe_pattern(
         self,
         pattern: str,
         city_coverage: Dict,
         city_name: str,
         map_type: str,
         district_name: Optional[str] = None
-    ) -> List[Dict]:
-        """Ultra-fast pattern crawling with async batch processing"""
+    ) -> Dict:
+        """Probe a spread of tiles and decide whether the pattern deserves a full crawl"""
+        probe_tiles = self.generate_probe_tiles(pattern, city_coverage)
+        probe_results = await self.download_batch_async(probe_tiles, city_name, map_type, district_name)
+        
+        hits = [r for r in probe_results if r.success]
+        failure_kinds = {'missing': 0, 'blocked': 0, 'error': 0}
+        for result in probe_results:
+            if not result.success:
+                failure_kinds[self.classify_tile_failure(result)] += 1
+        
+        if hits:
+            status = 'healthy'
+        elif failure_kinds['blocked'] and failure_kinds['blocked'] >= failure_kinds['missing']:
+            status = 'blocked'
+        elif failure_kinds['error'] == len(probe_results):
+            # Network trouble says nothing about the pattern itself - let the full crawl decide
+            status = 'unknown'
+        else:
+            status = 'dead'
+        
+        self.stats['patterns_probed'] += 1
+        health = {
+            'status': status,
+            'probed': len(probe_results),
+            'hits': len(hits),
+            'failures': failure_kinds,
+            'probed_at': datetime.now().isoformat()
+        }
+        
+        logger.info(
+            f"🔬 Probe: {len(hits)}/{len(probe_results)} hits "
+            f"(404: {failure_kinds['missing']}, blocked: {failure_kinds['blocked']}, "
+            f"errors: {failure_kinds['error']}) -> {status.upper()}"
+        )
+        
+        return {
+            'health': health,
+            'results': probe_results,
+            'probed_keys': {(t['zoom'], t['x'], t['y']) for t in probe_tiles}
+        }
+
+    def pattern_area(self, city_name: str, district_name: Optional[str] = None) -> str:
+        """Coverage a health verdict was measured over: the city, or city/district"""
+        area = self.clean_city_name(city_name)
+        return f"{area}/{self.clean_district_name(district_name)}" if district_name else area
+
+    def record_pattern_health(self, pattern: str, health: Dict, area: str):
+        """Remember pattern health per area so dead patterns are demoted for the rest of the run"""
+        area_health = self.pattern_health.setdefault(pattern, {})
+        health['crawls'] = area_health.get(area, {}).get('crawls', 0) + 1
+        area_health[area] = health
+        self.pattern_registry.record_health(
+            pattern,
+            health.get('status'),
+            tiles_tried=health.get('tried', health.get('probed', 0)),
+            tiles_hit=health.get('hits', 0),
+            crawled=health.get('status') not in ('dead', 'blocked'),
+            area=area
+        )
+
+    def known_pattern_status(self, pattern: str, area: str) -> Optional[str]:
+        """Status for this area from this run, else a recent verdict from the registry.
+        
+        Blocked applies to every area; dead only to the area it was probed over.
+        """
+        area_health = self.pattern_health.get(pattern, {})
+        status = area_health.get(area, {}).get('status')
+        if status is None and any(health.get('status') == 'blocked' for health in area_health.values()):
+            status = 'blocked'
+        if status is None:
+            canonical = canonicalize_pattern_url(pattern)
+            status = self.persisted_demotions.get((canonical, '')) or self.persisted_demotions.get((canonical, area))
+        return status
+
+    def pattern_priority(self, pattern: str, area: str) -> int:
+        """Sort key: healthy patterns first, then untested, then demoted ones"""
+        status = self.known_pattern_status(pattern, area)
+        order = {'healthy': 0, 'completed': 0, None: 1, 'unknown': 1, 'collapsed': 2, 'blocked': 3, 'dead': 3}
+        return order.get(status, 1)
+
+    async def crawl_pattern_ultra_fast(
+        self,
+        pattern: str,
+        city_coverage: Dict,
+        city_name: str,
+        map_type: str,
+        district_name: Optional[str] = None,
+        on_hit: Optional[Callable[[TileResult], None]] = None
+    ) -> CrawlCounters:
+        """Ultra-fast pattern crawling with a health probe and sequential early abort.
+        
+        Results are streamed: each successful tile is passed to ``on_hit`` and only
+        aggregate counters are kept, so memory is bounded by the batch in flight.
+        """
+        counters = CrawlCounters()
         
         map_display = MAP_TYPE_CONFIG.get(map_type, MAP_TYPE_CONFIG['UNKNOWN'])['display_name']
         district_log = f" - {district_name}" if district_name else ""
         logger.info(f"🚀 ULTRA-FAST: {city_name}{district_log} - {map_display}")
         logger.info(f"🌐 Pattern: {pattern}")
         
-        # Generate all tile URLs
-        all_tile_urls = self.generate_tile_urls_optimized(pattern, city_coverage)
-        total_tiles = len(all_tile_urls)
+        area = self.pattern_area(city_name, district_name)
+        probe = await self.probe_before_crawl(pattern, city_coverage, city_name, map_type, district_name, area, counters, on_hit)
+        if probe is None:
+            return counters
+        health = probe['health']
+        
+        start_time = time.time()
+        abort_reason = await self.crawl_tile_keys(
+            pattern, self.generate_tile_keys(pattern, city_coverage, exclude=probe['probed_keys']),
+            city_name, map_type, district_name, counters, on_hit
+        )
+        self.finish_pattern_health(pattern, health, area, counters, abort_reason, start_time)
+        
+        return counters
+
+    async def probe_before_crawl(
+        self,
+        pattern: str,
+        city_coverage: Dict,
+        city_name: str,
+        map_type: str,
+        district_name: Optional[str],
+        area: str,
+        counters: CrawlCounters,
+        on_hit: Optional[Callable[[TileResult], None]] = None
+    ) -> Optional[Dict]:
+        """Skip demoted patterns and probe the rest; None when the pattern should not be crawled"""
+        # Patterns found dead here or blocked anywhere (this run or recently) are not crawled again
+        known_status = self.known_pattern_status(pattern, area)
+        if known_status in ('dead', 'blocked'):
+            logger.warning(f"⏭️ Skipping demoted pattern ({known_status}): {pattern}")
+            return None
+        
+        # Probe a spread of tiles first
+        probe = await self.probe_pattern(pattern, city_coverage, city_name, map_type, district_name)
+        health = probe['health']
+        for result in probe['results']:
+            counters.add_result(result)
+        
+        if health['status'] in ('dead', 'blocked'):
+            self.stats['patterns_aborted'] += 1
+            self.record_pattern_health(pattern, health, area)
+            logger.warning(f"🛑 Pattern {health['status'].upper()} after probe, skipping full crawl")
+            return None
+        
+        if on_hit:
+            for result in probe['results']:
+                if result.success:
+                    on_hit(result)
+        return probe
+
+    async def crawl_tile_keys(
+        self,
+        pattern: str,
+        tile_keys: array,
+        city_name: str,
+        map_type: str,
+        district_name: Optional[str],
+        counters: CrawlCounters,
+        on_hit: Optional[Callable[[TileResult], None]] = None,
+        allow_collapse: bool = True
+    ) -> Optional[str]:
+        """Crawl packed tile keys in batches; returns the abort reason ('blocked'/'collapsed') or None.
+        
+        ``counters`` accumulates across calls, so the collapse rule sees the whole crawl.
+        With ``allow_collapse=False`` only fully blocked batches stop the crawl.
+        """
+        # Shuffle deterministically so every batch is an unbiased sample of the bbox;
+        # that is what makes the running hit rate a valid stopping statistic
+        random.Random(hashlib.md5(pattern.encode('utf-8')).hexdigest()).shuffle(tile_keys)
+        total_tiles = len(tile_keys)
         
         if total_tiles == 0:
-            logger.warning("⚠️ No tiles generated!")
-            return []
+            return None
         
         logger.info(f"📊 Generated {total_tiles:,} tile URLs")
         
         # Process in large batches for maximum throughput
-        all_results = []
         batch_size = self.batch_size
         total_batches = (total_tiles + batch_size - 1) // batch_size
         
-        start_time = time.time()
+        blocked_batches = 0
+        abort_reason = None
         
         for i in range(0, total_tiles, batch_size):
-            batch = all_tile_urls[i:i + batch_size]
+            batch = [self.tile_info_from_key(pattern, key) for key in tile_keys[i:i + batch_size]]
             batch_num = i // batch_size + 1
             
             batch_start = time.time()
@@ -1249,11 +1580,23 @@ class UltraOptimizedTileDownloader:
             )
             
             batch_time = time.time() - batch_start
-            successful = len([r for r in batch_results if r.get('success')])
-            cached = len([r for r in batch_results if r.get('status') == 'cached'])
-            downloaded = len([r for r in batch_results if r.get('status') == 'downloaded'])
-            
-            all_results.extend(batch_results)
+            batch_counters = CrawlCounters()
+            blocked = 0
+            for result in batch_results:
+                batch_counters.add_result(result)
+                if result.success:
+                    if on_hit:
+                        on_hit(result)
+                elif self.classify_tile_failure(result) == 'blocked':
+                    blocked += 1
+            del batch_results
+            
+            counters.merge(batch_counters)
+            successful = batch_counters.hits
+            cached = batch_counters.cached
+            downloaded = batch_counters.downloaded
+            tried = counters.tried
+            hits = counters.hits
             
             # Performance metrics
             tiles_per_second = len(batch) / batch_time if batch_time > 0 else 0
@@ -1266,20 +1609,220 @@ class UltraOptimizedTileDownloader:
                 f"- {tiles_per_second:.1f} tiles/sec"
             )
             
+            # Sequential stopping rules
+            blocked_batches = blocked_batches + 1 if successful == 0 and blocked == len(batch) else 0
+            if blocked_batches >= self.max_blocked_batches:
+                abort_reason = 'blocked'
+            elif allow_collapse and wilson_upper_bound(hits, tried) < self.min_pattern_hit_rate:
+                abort_reason = 'collapsed'
+            
+            if abort_reason:
+                self.stats['patterns_aborted'] += 1
+                logger.warning(
+                    f"🛑 Aborting pattern ({abort_reason}): {hits}/{tried} hits, "
+                    f"upper bound {wilson_upper_bound(hits, tried) * 100:.2f}% "
+                    f"< {self.min_pattern_hit_rate * 100:.2f}%"
+                )
+                break
+            
             # Brief pause to prevent overwhelming the server
             if batch_num % 10 == 0:
                 await asyncio.sleep(0.1)
         
+        return abort_reason
+
+    def finish_pattern_health(
+        self, pattern: str, health: Dict, area: str, counters: CrawlCounters,
+        abort_reason: Optional[str], start_time: float
+    ):
+        """Record the crawl outcome as the pattern's health for this area"""
         total_time = time.time() - start_time
-        successful_total = len([r for r in all_results if r.get('success')])
-        overall_speed = total_tiles / total_time if total_time > 0 else 0
+        overall_speed = (counters.tried - health['probed']) / total_time if total_time > 0 else 0
+        
+        health.update({
+            'status': abort_reason or 'completed',
+            'tried': counters.tried,
+            'hits': counters.hits,
+            'hit_rate': counters.hits / counters.tried if counters.tried else 0
+        })
+        self.record_pattern_health(pattern, health, area)
         
         logger.info(
-            f"🏁 Pattern complete: {successful_total}/{total_tiles} tiles "
+            f"🏁 Pattern {health['status']}: {counters.hits}/{counters.tried} tiles "
             f"in {total_time:.1f}s ({overall_speed:.1f} tiles/sec)"
         )
+
+    def build_child_coverage(self, parent_hits: set, parent_zoom: int, zoom: int, city_zoom_coverage: Dict) -> Dict:
+        """Project tiles found at a coarse zoom onto a finer zoom, clipped to the city bbox.
+        
+        Only the bbox and count are computed here; iter_coverage_tiles yields the children
+        from parent_hits, so no per-tile set of the finer zoom is ever built.
+        """
+        factor = 2 ** (zoom - parent_zoom)
+        bounds = None
+        total_tiles = 0
+        for px, py in parent_hits:
+            x_lo = max(px * factor, city_zoom_coverage['x_min'])
+            x_hi = min(px * factor + factor - 1, city_zoom_coverage['x_max'])
+            y_lo = max(py * factor, city_zoom_coverage['y_min'])
+            y_hi = min(py * factor + factor - 1, city_zoom_coverage['y_max'])
+            if x_lo > x_hi or y_lo > y_hi:
+                continue
+            # Children of distinct parents never overlap, so the counts add up exactly
+            total_tiles += (x_hi - x_lo + 1) * (y_hi - y_lo + 1)
+            if bounds is None:
+                bounds = [x_lo, x_hi, y_lo, y_hi]
+            else:
+                bounds = [min(bounds[0], x_lo), max(bounds[1], x_hi), min(bounds[2], y_lo), max(bounds[3], y_hi)]
+        
+        if bounds is None:
+            return {}
         
-        return [r for r in all_results if r.get('success')]
+        return {
+            'x_min': bounds[0],
+            'x_max': bounds[1],
+            'y_min': bounds[2],
+            'y_max': bounds[3],
+            'parent_hits': parent_hits,
+            'factor': factor,
+            'total_tiles': total_tiles
+        }
+
+    async def crawl_pattern_by_zoom_descent(
+        self,
+        pattern: str,
+        city_coverage: Dict,
+        city_name: str,
+        map_type: str,
+        district_name: Optional[str] = None,
+        on_hit: Optional[Callable[[TileResult], None]] = None
+    ) -> CrawlCounters:
+        """Crawl zoom by zoom, restricting each finer zoom to children of tiles found above it.
+        
+        A district pattern only has tiles inside the district, so the coarsest zoom over the
+        city bbox is enough to learn its extent; finer zooms then never leave that extent.
+        The pattern is probed once and gets one health verdict for the whole descent. The
+        collapse rule is off at the extent-learning zoom (a small district has a low hit rate
+        over the city bbox); if that zoom finds nothing, the next zoom is crawled over the
+        full bbox to learn the extent instead.
+        """
+        zooms = sorted(city_coverage.keys())
+        counters = CrawlCounters()
+        
+        district_log = f" - {district_name}" if district_name else ""
+        logger.info(f"🚀 ZOOM DESCENT: {city_name}{district_log}")
+        logger.info(f"🌐 Pattern: {pattern}")
+        
+        area = self.pattern_area(city_name, district_name)
+        probe = await self.probe_before_crawl(pattern, city_coverage, city_name, map_type, district_name, area, counters, on_hit)
+        if probe is None:
+            return counters
+        health = probe['health']
+        
+        # Probe hits count towards the extent of their zoom (a probe-sized sample)
+        probe_hits = {}
+        for result in probe['results']:
+            if result.success and result.zoom in city_coverage:
+                probe_hits.setdefault(result.zoom, set()).add((result.x, result.y))
+        
+        start_time = time.time()
+        abort_reason = None
+        parent_zoom = None
+        parent_hits = None  # Only the zoom directly above is kept; older zooms are dropped once projected
+        
+        for index, zoom in enumerate(zooms):
+            if parent_zoom is None:
+                zoom_coverage = city_coverage[zoom]
+            else:
+                zoom_coverage = self.build_child_coverage(parent_hits, parent_zoom, zoom, city_coverage[zoom])
+                if not zoom_coverage:
+                    break
+                full_tiles = self.count_coverage_tiles(city_coverage[zoom])
+                logger.info(
+                    f"   🎯 Zoom {zoom}: district extent {zoom_coverage['total_tiles']:,} tiles "
+                    f"(city bbox {full_tiles:,}, saved {full_tiles - zoom_coverage['total_tiles']:,})"
+                )
+            
+            tile_keys = self.generate_tile_keys(pattern, {zoom: zoom_coverage}, exclude=probe['probed_keys'])
+            zoom_coverage = parent_hits = None  # Projected: the parent zoom's hits are no longer needed
+            zoom_hits = probe_hits.pop(zoom, set())
+            
+            def collect_hit(result, zoom_hits=zoom_hits):
+                zoom_hits.add((result.x, result.y))
+                if on_hit:
+                    on_hit(result)
+            
+            # Extent-learning zooms run without the collapse rule: the coarsest one always, a
+            # fallback one only when the probe saw tiles (otherwise it is a plain bbox crawl)
+            learning_extent = parent_zoom is None and (index == 0 or health['hits'] > 0)
+            abort_reason = await self.crawl_tile_keys(
+                pattern, tile_keys, city_name, map_type, district_name, counters, collect_hit,
+                allow_collapse=not learning_extent
+            )
+            tile_keys = None
+            if abort_reason:
+                break
+            
+            if not zoom_hits:
+                if parent_zoom is None and index + 1 < len(zooms):
+                    # No extent learned yet - the pattern may only start deeper, so crawl the next zoom's full bbox
+                    logger.info(f"   🔄 No tiles at zoom {zoom}, learning the extent at zoom {zooms[index + 1]} over the full bbox")
+                    continue
+                logger.info(f"   ⏹️ No tiles at zoom {zoom}, nothing to descend into")
+                break
+            
+            parent_zoom = zoom
+            parent_hits = zoom_hits
+        
+        self.finish_pattern_health(pattern, health, area, counters, abort_reason, start_time)
+        return counters
+
+    def canonical_pattern_key(self, pattern: str) -> str:
+        """Key used to detect districts that share the same underlying pattern URL"""
+        return canonicalize_pattern_url(pattern)
+
+    def group_district_patterns(self, city_name: str) -> Dict[str, List[str]]:
+        """Map each unique KH_2025 pattern of a city to the districts that use it"""
+        pattern_districts = {}
+        pattern_urls = {}
+        
+        for district_info in self.get_city_districts(city_name).values():
+            for pattern_url in district_info.get('kh_2025_patterns', []):
+                key = self.canonical_pattern_key(pattern_url)
+                pattern_urls.setdefault(key, pattern_url.strip())
+                districts = pattern_districts.setdefault(key, [])
+                if district_info['original_name'] not in districts:
+                    districts.append(district_info['original_name'])
+        
+        return {pattern_urls[key]: districts for key, districts in pattern_districts.items()}
+
+    def make_link_hit(self, city_name: str, map_type: str, districts: List[str], linked: List[int]) -> Callable[[TileResult], None]:
+        """on_hit callback linking each crawled tile into the other districts; counts links in linked[0]"""
+        def link_hit(result):
+            linked[0] += self.link_shared_district_tile(result, city_name, map_type, districts)
+        return link_hit
+
+    def link_shared_district_tile(self, result: TileResult, city_name: str, map_type: str, districts: List[str]) -> int:
+        """Hard-link one tile crawled for a shared pattern into the other districts' folders"""
+        if not result.filepath or result.zoom is None:
+            return 0
+        
+        linked = 0
+        for district_name in districts:
+            folder_path = self.create_map_type_folder_structure(city_name, map_type, result.zoom, district_name)
+            target = os.path.join(folder_path, os.path.basename(result.filepath))
+            if self.fast_file_exists(target) or os.path.exists(target):
+                continue
+            try:
+                os.link(result.filepath, target)
+            except OSError:
+                shutil.copy2(result.filepath, target)
+            self.add_to_cache(target)
+            if self.upload_pipeline and result.status == 'downloaded':
+                self.upload_pipeline.enqueue(target)
+            linked += 1
+        
+        return linked
 
     def deg2num(self, lat_deg: float, lon_deg: float, zoom: int) -> Tuple[int, int]:
         """Optimized lat/lon to tile coordinate conversion"""
@@ -1318,50 +1861,26 @@ class UltraOptimizedTileDownloader:
         """Load patterns with performance optimization"""
         patterns_by_city_and_type = {}
         
-        # Try comprehensive report first
-        html_report_path = 'output_html_patterns/reports/comprehensive_patterns_report.json'
+        self.pattern_registry.refresh(kinds=['html_report'])
+        rows = self.pattern_registry.query_patterns(kinds=['html_report'])
         
-        try:
-            with open(html_report_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            location_breakdown = data.get('location_breakdown', {})
-            
-            for location_name, map_types in location_breakdown.items():
-                clean_city_name = self.clean_city_name(location_name)
-                
-                if clean_city_name not in patterns_by_city_and_type:
-                    patterns_by_city_and_type[clean_city_name] = {}
-                
-                for map_type_key, map_data in map_types.items():
-                    tile_pattern = map_data.get('tile_url')
-                    tile_pattern_2030 = map_data.get('tile_url_2030')
-                    
-                    patterns = []
-                    if tile_pattern:
-                        patterns.append(tile_pattern)
-                    if tile_pattern_2030:
-                        patterns.append(tile_pattern_2030)
-                    
-                    if patterns:
-                        classified_type = self.classify_map_type_from_url(patterns[0])
-                        
-                        if classified_type not in patterns_by_city_and_type[clean_city_name]:
-                            patterns_by_city_and_type[clean_city_name][classified_type] = []
-                        
-                        patterns_by_city_and_type[clean_city_name][classified_type].extend(patterns)
-            
-            # Remove duplicates
-            for city in patterns_by_city_and_type:
-                for map_type in patterns_by_city_and_type[city]:
-                    patterns_by_city_and_type[city][map_type] = list(set(patterns_by_city_and_type[city][map_type]))
+        if not rows:
+            logger.error("❌ No HTML extractor patterns in registry (output_html_patterns/reports/comprehensive_patterns_report.json)")
+            return {}
+        
+        for row in rows:
+            clean_city_name = self.clean_city_name(row['location'])
+            classified_type = self.classify_map_type_from_url(row['url'])
             
-            logger.info(f"✅ Loaded patterns for {len(patterns_by_city_and_type)} cities")
-            return patterns_by_city_and_type
+            city_patterns = patterns_by_city_and_type.setdefault(clean_city_name, {})
+            type_patterns = city_patterns.setdefault(classified_type, [])
             
-        except FileNotFoundError:
-            logger.error(f"❌ HTML extractor report not found at {html_report_path}")
-            return {}
+            # Registry rows are already canonicalised, aliases collapse to one URL
+            if row['url'] not in type_patterns:
+                type_patterns.append(row['url'])
+        
+        logger.info(f"✅ Loaded patterns for {len(patterns_by_city_and_type)} cities")
+        return patterns_by_city_and_type
 
     def classify_map_type_from_url(self, url: str) -> str:
         """Fast URL classification"""
@@ -1500,93 +2019,101 @@ class UltraOptimizedTileDownloader:
                     continue
                     
                 logger.info(f"🗺️ Processing {map_type} for {city_name}")
-                map_type_tiles = []
+                map_type_tiles = CrawlCounters()
+                city_area = self.pattern_area(city_name)
                 
                 # FIX: Proper KH_2025 handling with new data structure
                 if map_type == 'KH_2025':
-                    # Check if we have district-specific data
-                    if city_name in self.district_data and self.district_data[city_name]:
-                        logger.info(f"🏘️ Found {len(self.district_data[city_name])} districts for {city_name}")
+                    # Check if we have district-specific data (registry districts always carry at least one pattern;
+                    # a city without any goes through the city-level branch below)
+                    city_districts = self.get_city_districts(city_name)
+                    if city_districts:
+                        logger.info(f"🏘️ Found {len(city_districts)} districts for {city_name}")
+                        total_patterns_found = sum(len(info['kh_2025_patterns']) for info in city_districts.values())
                         
-                        districts_with_patterns = 0
-                        total_patterns_found = 0
+                        # Districts sharing the same pattern URL are crawled once
+                        shared_patterns = self.group_district_patterns(city_name)
+                        logger.info(
+                            f"🔗 {total_patterns_found} district patterns -> "
+                            f"{len(shared_patterns)} unique patterns to crawl"
+                        )
                         
-                        for district_clean_name, district_info in self.district_data[city_name].items():
-                            district_original_name = district_info['original_name']
-                            kh_patterns = district_info.get('kh_2025_patterns', [])
+                        for pattern_url, districts in sorted(
+                            shared_patterns.items(),
+                            key=lambda item: self.pattern_priority(item[0], self.pattern_area(city_name, item[1][0]))
+                        ):
+                            primary_district = districts[0]
+                            logger.info(f"📍 Processing district: {primary_district}")
+                            if len(districts) > 1:
+                                logger.info(f"   🔗 Shared with: {', '.join(districts[1:])}")
+                            logger.info(f"   🌐 Crawling: {pattern_url[:80]}...")
                             
-                            logger.info(f"📍 Processing district: {district_original_name}")
-                            logger.info(f"   🔗 Patterns found: {len(kh_patterns)}")
+                            # Shared tiles are linked as they arrive, nothing is accumulated
+                            linked = [0]
+                            on_hit = self.make_link_hit(city_name, map_type, districts[1:], linked) if len(districts) > 1 else None
                             
-                            if not kh_patterns:
-                                logger.warning(f"   ⚠️ No patterns for {district_original_name}")
-                                continue
-                            
-                            districts_with_patterns += 1
-                            total_patterns_found += len(kh_patterns)
-                            
-                            # Process each pattern for this district
-                            for pattern_url in kh_patterns:
-                                logger.info(f"   🌐 Crawling: {pattern_url[:80]}...")
-                                
-                                try:
+                            try:
+                                if self.district_zoom_descent:
+                                    district_tiles = await self.crawl_pattern_by_zoom_descent(
+                                        pattern_url, city_coverage, city_name, map_type, primary_district, on_hit=on_hit
+                                    )
+                                else:
                                     district_tiles = await self.crawl_pattern_ultra_fast(
-                                        pattern_url, 
-                                        city_coverage, 
-                                        city_name, 
-                                        map_type, 
-                                        district_original_name
+                                        pattern_url, city_coverage, city_name, map_type, primary_district, on_hit=on_hit
                                     )
+                                
+                                if district_tiles.hits:
+                                    map_type_tiles.merge(district_tiles)
+                                    logger.info(f"   ✅ Success: {district_tiles.hits} tiles")
+                                    if linked[0]:
+                                        logger.info(f"   🔗 Linked {linked[0]:,} shared tiles into {len(districts) - 1} other districts")
+                                else:
+                                    logger.warning(f"   ❌ Failed: No tiles downloaded")
                                     
-                                    if district_tiles:
-                                        map_type_tiles.extend(district_tiles)
-                                        logger.info(f"   ✅ Success: {len(district_tiles)} tiles")
-                                    else:
-                                        logger.warning(f"   ❌ Failed: No tiles downloaded")
-                                        
-                                except Exception as e:
-                                    logger.error(f"   ❌ Error crawling pattern: {e}")
+                            except Exception as e:
+                                logger.error(f"   ❌ Error crawling pattern: {e}")
                         
                         logger.info(f"📊 KH_2025 Summary for {city_name}:")
-                        logger.info(f"   🏘️ Districts processed: {districts_with_patterns}/{len(self.district_data[city_name])}")
+                        logger.info(f"   🏘️ Districts processed: {len(city_districts)}")
                         logger.info(f"   🔗 Total patterns: {total_patterns_found}")
-                        logger.info(f"   📦 Total tiles: {len(map_type_tiles)}")
-                        
-                        if districts_with_patterns == 0:
-                            logger.error(f"❌ NO DISTRICTS WITH PATTERNS for {city_name}!")
-                            # Fallback to city-level patterns if available
-                            logger.info(f"🔄 Trying fallback city-level patterns...")
-                            for pattern in patterns_list:
-                                fallback_tiles = await self.crawl_pattern_ultra_fast(
-                                    pattern, city_coverage, city_name, map_type
-                                )
-                                if fallback_tiles:
-                                    map_type_tiles.extend(fallback_tiles)
+                        logger.info(f"   📦 Total tiles: {map_type_tiles.hits}")
                     
                     else:
                         logger.warning(f"⚠️ No district data found for {city_name}, using city-level patterns")
                         # Use city-level patterns
-                        for pattern in patterns_list:
+                        for pattern in sorted(patterns_list, key=lambda pattern: self.pattern_priority(pattern, city_area)):
                             pattern_tiles = await self.crawl_pattern_ultra_fast(
                                 pattern, city_coverage, city_name, map_type
                             )
-                            if pattern_tiles:
-                                map_type_tiles.extend(pattern_tiles)
+                            map_type_tiles.merge(pattern_tiles)
                 
                 else:
                     # Regular processing for non-KH_2025
-                    for pattern in patterns_list:
+                    for pattern in sorted(patterns_list, key=lambda pattern: self.pattern_priority(pattern, city_area)):
                         pattern_tiles = await self.crawl_pattern_ultra_fast(
                             pattern, city_coverage, city_name, map_type
                         )
-                        if pattern_tiles:
-                            map_type_tiles.extend(pattern_tiles)
+                        map_type_tiles.merge(pattern_tiles)
                 
                 # Log final results
-                if map_type_tiles:
-                    logger.info(f"✅ FINAL: {map_type} for {city_name}: {len(map_type_tiles)} tiles")
+                if map_type_tiles.hits:
+                    logger.info(f"✅ FINAL: {map_type} for {city_name}: {map_type_tiles.hits} tiles")
                 else:
                     logger.error(f"❌ FINAL: {map_type} for {city_name}: NO TILES!")
+                
+                city_results['map_type_results'][map_type] = {
+                    'tiles_tried': map_type_tiles.tried,
+                    'tiles_successful': map_type_tiles.hits,
+                    'tiles_cached': map_type_tiles.cached,
+                    'tiles_downloaded': map_type_tiles.downloaded,
+                    'bytes': map_type_tiles.bytes
+                }
+                city_results['total_tiles'] += map_type_tiles.tried
+                city_results['successful_tiles'] += map_type_tiles.hits
+            
+            # Persist the city's file index so the next run starts from it
+            if city_name in self._file_cache_cities:
+                self.save_city_file_index(city_name)
             
             if city_results['map_type_results']:
                 all_results.append(city_results)
@@ -1625,6 +2152,7 @@ class UltraOptimizedTileDownloader:
                 'KH_2025 district-level folder structure'
             ],
             'stats': self.stats.copy(),
+            'pattern_health': self.pattern_health,
             'city_results': results
         }
         
@@ -1644,13 +2172,39 @@ class UltraOptimizedTileDownloader:
         print(f"🚀  Throughput: {report['performance_metrics']['megabytes_per_second']:.2f} MB/sec")
         print(f"📋  Cache hit rate: {report['performance_metrics']['cache_hit_rate']:.1f}%")
         print(f"⏭️  Skip rate: {report['performance_metrics']['skip_rate']:.1f}%")
+        print(f"🔬  Patterns probed: {self.stats['patterns_probed']} ({self.stats['patterns_aborted']} aborted early)")
         
         logger.info(f"📋 Ultra-performance report saved: {report_file}")
         
         return report
 
+def create_upload_pipeline(downloader: UltraOptimizedTileDownloader, s3_prefix: str = 'guland-tiles'):
+    """Build the crawl-to-Spaces stage from the uploader's config (None if not configured)"""
+    from html_do_uploader import EnhancedMultiMapSpacesUploader, load_config
+    from crawl_upload_pipeline import CrawlUploadPipeline
+    
+    config = load_config()
+    missing_keys = [key for key in ('access_key', 'secret_key', 'endpoint_url', 'bucket_name') if not config.get(key)]
+    if missing_keys:
+        logger.warning(f"⚠️ Streaming upload disabled - missing configuration: {', '.join(missing_keys)}")
+        return None
+    
+    uploader = EnhancedMultiMapSpacesUploader(
+        access_key=config['access_key'],
+        secret_key=config['secret_key'],
+        endpoint_url=config['endpoint_url'],
+        bucket_name=config['bucket_name'],
+        region=config['region']
+    )
+    return CrawlUploadPipeline(
+        uploader,
+        local_root=os.path.join(downloader.base_download_dir, 'cities'),
+        s3_prefix=s3_prefix
+    )
+
 async def main():
     """Ultra-optimized main function"""
+    metrics.start_exporters()  # $GULAND_METRICS_PORT / $GULAND_METRICS_TEXTFILE
     print("🚀 ULTRA-OPTIMIZED TILE DOWNLOADER v3.0")
     print("Maximum performance with async/await and smart caching")
     print("FIXED: Proper tile generation & KH_2025 district structure")
@@ -1816,6 +2370,9 @@ async def main():
         target_cities = ['kontum', 'laichau', 'lamdong']
         print(f"🎯 Selected test cities: {target_cities}")
     
+    # Optional: upload each new tile to DO Spaces as soon as it is downloaded
+    stream_choice = input("Stream new tiles straight to DO Spaces while crawling? (y/N): ").strip().lower()
+    
     # Initialize ultra-optimized downloader
     downloader = UltraOptimizedTileDownloader(
         max_workers=50,      # High concurrency
@@ -1823,14 +2380,23 @@ async def main():
         enable_download=True
     )
     
+    if stream_choice == 'y':
+        downloader.upload_pipeline = create_upload_pipeline(downloader)
+        if downloader.upload_pipeline:
+            await downloader.upload_pipeline.start()
+    
     # Run ultra-fast crawl
     start_time = time.time()
     
-    results = await downloader.ultra_fast_crawl(
-        zoom_levels=zoom_levels,
-        target_map_types=target_map_types,
-        target_cities=target_cities
-    )
+    try:
+        results = await downloader.ultra_fast_crawl(
+            zoom_levels=zoom_levels,
+            target_map_types=target_map_types,
+            target_cities=target_cities
+        )
+    finally:
+        if downloader.upload_pipeline:
+            await downloader.upload_pipeline.close()
     
     if results:
         # Generate performance report
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Local S3-compatible stand-in for benchmarks
+In-memory, stdlib-only HTTP server implementing the subset of the S3 API the
+Spaces tools use, and counting every call by operation
+
+Author: AI Assistant
+Version: 1.0 - Local S3 Stand-in
+
+Supported: HeadBucket, ListObjectsV2 (prefix, delimiter, pagination),
+PutObject, CopyObject, HeadObject, GetObject (Range), DeleteObject,
+DeleteObjects, Get/PutObjectAcl and multipart uploads. Path-style and
+virtual-host addressing; signatures are not verified.
+
+Usage: python local_s3_server.py [--port 9000] [--bucket guland-tiles]
+"""
+
+import re
+import time
+import uuid
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+S3_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+ALL_USERS_URI = 'http://acs.amazonaws.com/groups/global/AllUsers'
+DELETE_KEY_RE = re.compile(r'<Key>(.*?)</Key>', re.S)
+PART_RE = re.compile(r'<PartNumber>(\d+)</PartNumber>', re.S)
+
+
+def iso_time(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def http_time(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+
+class S3Object:
+    __slots__ = ('body', 'etag', 'acl', 'content_type', 'metadata', 'modified')
+
+    def __init__(self, body, etag=None, acl='private', content_type='binary/octet-stream', metadata=None):
+        self.body = body
+        self.etag = etag or hashlib.md5(body).hexdigest()
+        self.acl = acl
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        self.modified = time.time()
+
+
+class LocalS3Store:
+    def __init__(self, buckets=('guland-tiles',)):
+        self.buckets = {name: {} for name in buckets}
+        self.uploads = {}          # upload_id -> {'bucket', 'key', 'parts': {n: bytes}, 'acl', ...}
+        self.calls = Counter()
+        self.bytes_in = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Drop every object and counter (between benchmark runs)"""
+        with self.lock:
+            for objects in self.buckets.values():
+                objects.clear()
+            self.uploads.clear()
+            self.calls.clear()
+            self.bytes_in = 0
+
+    def count(self, operation, received=0):
+        with self.lock:
+            self.calls[operation] += 1
+            self.bytes_in += received
+
+    def call_counts(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def seed(self, bucket, key, body, acl='private'):
+        """Create an object without counting a call"""
+        self.buckets[bucket][key] = S3Object(body, acl=acl)
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # Keep-alive, like real Spaces
+    server_version = 'LocalS3'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    @property
+    def store(self):
+        return self.server.store
+
+    # ------------------------------------------------------------------
+    # Request parsing
+    # ------------------------------------------------------------------
+
+    def parse_target(self):
+        """(bucket, key, query) for path-style or virtual-host requests"""
+        parts = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        path = unquote(parts.path).lstrip('/')
+
+        host = (self.headers.get('Host') or '').split(':')[0]
+        host_bucket = host.split('.')[0] if '.' in host else None
+        if host_bucket in self.store.buckets and not path.startswith(f"{host_bucket}/"):
+            return host_bucket, path, query
+
+        bucket, _, key = path.partition('/')
+        return bucket, key, query
+
+    def read_body(self):
+        if 'chunked' in (self.headers.get('Transfer-Encoding') or '').lower():
+            body = self.read_chunked()
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if 'aws-chunked' in (self.headers.get('Content-Encoding') or '') or self.headers.get('x-amz-decoded-content-length'):
+            body = self.decode_aws_chunked(body)
+        return body
+
+    def read_chunked(self):
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+            if size == 0:
+                # Trailers until the blank line
+                while self.rfile.readline().strip():
+                    pass
+                return b''.join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    @staticmethod
+    def decode_aws_chunked(body):
+        """Strip aws-chunked framing (<hex>[;chunk-signature=...]\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>)"""
+        chunks = []
+        position = 0
+        while position < len(body):
+            line_end = body.index(b'\r\n', position)
+            size = int(body[position:line_end].split(b';')[0], 16)
+            if size == 0:
+                break
+            start = line_end + 2
+            chunks.append(body[start:start + size])
+            position = start + size + 2
+        return b''.join(chunks)
+
+    # ------------------------------------------------------------------
+    # Responses
+    # ------------------------------------------------------------------
+
+    def respond(self, status, body=b'', headers=None, head_only=False):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-amz-request-id', uuid.uuid4().hex[:16])
+        self.end_headers()
+        if body and not head_only:
+            self.wfile.write(body)
+
+    def respond_xml(self, status, xml):
+        self.respond(status, f'<?xml version="1.0" encoding="UTF-8"?>\n{xml}', {'Content-Type': 'application/xml'})
+
+    def respond_error(self, status, code, message, head_only=False):
+        if head_only:
+            self.respond(status, head_only=True)
+            return
+        self.respond_xml(status, f'<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>')
+
+    def object_headers(self, obj):
+        headers = {
+            'ETag': f'"{obj.etag}"',
+            'Last-Modified': http_time(obj.modified),
+            'Content-Type': obj.content_type,
+            'Accept-Ranges': 'bytes'
+        }
+        headers.update({f'x-amz-meta-{name}': value for name, value in obj.metadata.items()})
+        return headers
+
+    def lookup(self, bucket, key, head_only=False):
+        objects = self.store.buckets.get(bucket)
+        if objects is None:
+            self.respond_error(404, 'NoSuchBucket', bucket, head_only)
+            return None
+        obj = objects.get(key)
+        if obj is None:
+            self.respond_error(404, 'NoSuchKey', key, head_only)
+        return obj
+
+    # ------------------------------------------------------------------
+    # Verbs
+    # ------------------------------------------------------------------
+
+    def do_HEAD(self):
+        bucket, key, _ = self.parse_target()
+        if not key:
+            self.store.count('HeadBucket')
+            status = 200 if bucket in self.store.buckets else 404
+            self.respond(status, head_only=True)
+            return
+        self.store.count('HeadObject')
+        obj = self.lookup(bucket, key, head_only=True)
+        if obj is None:
+            return
+        headers = self.object_headers(obj)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(obj.body)))
+        self.end_headers()
+
+    def do_GET(self):
+        bucket, key, query = self.parse_target()
+        if not key:
+            self.store.count('ListObjectsV2')
+            self.list_objects(bucket, query)
+            return
+
+        if 'acl' in query:
+            self.store.count('GetObjectAcl')
+            obj = self.lookup(bucket, key)
+            if obj is not None:
+                self.respond_xml(200, self.acl_xml(obj.acl))
+            return
+
+        self.store.count('GetObject')
+        obj = self.lookup(bucket, key)
+        if obj is None:
+            return
+        headers = self.object_headers(obj)
+        body = obj.body
+        status = 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(body) - 1
+            headers['Content-Range'] = f"bytes {start}-{min(end, len(body) - 1)}/{len(body)}"
+            body = body[start:end + 1]
+            status = 206
+        self.respond(status, body, headers)
+
+    def do_PUT(self):
+        bucket, key, query = self.parse_target()
+        body = self.read_body()
+        objects = self.store.buckets.get(bucket)
+        if objects is None:
+            self.respond_error(404, 'NoSuchBucket', bucket)
+            return
+
+        if 'acl' in query:
+            self.store.count('PutObjectAcl')
+            obj = self.lookup(bucket, key)
+            if obj is not None:
+                obj.acl = self.headers.get('x-amz-acl') or ('public-read' if ALL_USERS_URI.encode() in body else 'private')
+                self.respond(200)
+            return
+
+        if 'uploadId' in query:
+            self.store.count('UploadPart', len(body))
+            upload = self.store.uploads.get(query['uploadId'])
+            if upload is None:
+                self.respond_error(404, 'NoSuchUpload', query['uploadId'])
+                return
+            upload['parts'][int(query['partNumber'])] = body
+            self.respond(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+            return
+
+        copy_source = self.headers.get('x-amz-copy-source')
+        if copy_source:
+            self.store.count('CopyObject')
+            source_bucket, _, source_key = unquote(copy_source).lstrip('/').partition('/')
+            source = self.lookup(source_bucket, source_key)
+            if source is None:
+                return
+            obj = S3Object(source.body, source.etag, self.headers.get('x-amz-acl') or 'private',
+                           source.content_type, dict(source.metadata))
+            objects[key] = obj
+            self.respond_xml(200, f'<CopyObjectResult><ETag>"{obj.etag}"</ETag>'
+                                  f'<LastModified>{iso_time(obj.modified)}</LastModified></CopyObjectResult>')
+            return
+
+        self.store.count('PutObject', len(body))
+        obj = S3Object(body, acl=self.headers.get('x-amz-acl') or 'private',
+                       content_type=self.headers.get('Content-Type') or 'binary/octet-stream',
+                       metadata=self.request_metadata())
+        objects[key] = obj
+        self.respond(200, headers={'ETag': f'"{obj.etag}"'})
+
+    def do_POST(self):
+        bucket, key, query = self.parse_target()
+        body = self.read_body()
+
+        if 'delete' in query:
+            self.store.count('DeleteObjects')
+            objects = self.store.buckets.get(bucket, {})
+            deleted = []
+            for deleted_key in DELETE_KEY_RE.findall(body.decode('utf-8')):
+                deleted_key = deleted_key.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+                objects.pop(deleted_key, None)
+                deleted.append(f'<Deleted><Key>{escape(deleted_key)}</Key></Deleted>')
+            self.respond_xml(200, f'<DeleteResult xmlns="{S3_NS}">{"".join(deleted)}</DeleteResult>')
+            return
+
+        if 'uploads' in query:
+            self.store.count('CreateMultipartUpload')
+            upload_id = uuid.uuid4().hex
+            self.store.uploads[upload_id] = {
+                'bucket': bucket, 'key': key, 'parts': {},
+                'acl': self.headers.get('x-amz-acl') or 'private',
+                'content_type': self.headers.get('Content-Type') or 'binary/octet-stream',
+                'metadata': self.request_metadata()
+            }
+            self.respond_xml(200, f'<InitiateMultipartUploadResult xmlns="{S3_NS}"><Bucket>{escape(bucket)}</Bucket>'
+                                  f'<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>')
+            return
+
+        if 'uploadId' in query:
+            self.store.count('CompleteMultipartUpload')
+            upload = self.store.uploads.pop(query['uploadId'], None)
+            if upload is None:
+                self.respond_error(404, 'NoSuchUpload', query['uploadId'])
+                return
+            numbers = [int(number) for number in PART_RE.findall(body.decode('utf-8'))] or sorted(upload['parts'])
+            parts = [upload['parts'][number] for number in numbers]
+            digest = hashlib.md5(b''.join(hashlib.md5(part).digest() for part in parts)).hexdigest()
+            obj = S3Object(b''.join(parts), f"{digest}-{len(parts)}", upload['acl'], upload['content_type'], upload['metadata'])
+            self.store.buckets[bucket][key] = obj
+            self.respond_xml(200, f'<CompleteMultipartUploadResult xmlns="{S3_NS}"><Bucket>{escape(bucket)}</Bucket>'
+                                  f'<Key>{escape(key)}</Key><ETag>"{obj.etag}"</ETag></CompleteMultipartUploadResult>')
+            return
+
+        self.respond_error(400, 'InvalidRequest', 'Unsupported POST')
+
+    def do_DELETE(self):
+        bucket, key, query = self.parse_target()
+        if 'uploadId' in query:
+            self.store.count('AbortMultipartUpload')
+            self.store.uploads.pop(query['uploadId'], None)
+        else:
+            self.store.count('DeleteObject')
+            self.store.buckets.get(bucket, {}).pop(key, None)
+        self.respond(204)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def request_metadata(self):
+        return {
+            name[len('x-amz-meta-'):]: value
+            for name, value in self.headers.items()
+            if name.lower().startswith('x-amz-meta-')
+        }
+
+    @staticmethod
+    def acl_xml(acl):
+        grants = ('<Grant><Grantee xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:type="CanonicalUser">'
+                  '<ID>owner</ID><DisplayName>owner</DisplayName></Grantee><Permission>FULL_CONTROL</Permission></Grant>')
+        if acl == 'public-read':
+            grants += ('<Grant><Grantee xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:type="Group">'
+                       f'<URI>{ALL_USERS_URI}</URI></Grantee><Permission>READ</Permission></Grant>')
+        return (f'<AccessControlPolicy xmlns="{S3_NS}"><Owner><ID>owner</ID><DisplayName>owner</DisplayName></Owner>'
+                f'<AccessControlList>{grants}</AccessControlList></AccessControlPolicy>')
+
+    def list_objects(self, bucket, query):
+        objects = self.store.buckets.get(bucket)
+        if objects is None:
+            self.respond_error(404, 'NoSuchBucket', bucket)
+            return
+
+        prefix = query.get('prefix', '')
+        delimiter = query.get('delimiter', '')
+        max_keys = int(query.get('max-keys') or 1000)
+        after = query.get('continuation-token') or query.get('start-after') or ''
+
+        contents, common_prefixes = [], []
+        seen_prefixes = set()
+        truncated = False
+        last = None
+        for key in sorted(k for k in list(objects) if k.startswith(prefix) and k > after):
+            if delimiter:
+                cut = key.find(delimiter, len(prefix))
+                if cut != -1:
+                    common = key[:cut + len(delimiter)]
+                    if common in seen_prefixes:
+                        continue
+                    if len(contents) + len(common_prefixes) >= max_keys:
+                        truncated = True
+                        break
+                    seen_prefixes.add(common)
+                    common_prefixes.append(common)
+                    # Skip the rest of this common prefix
+                    last = common + '\uffff'
+                    continue
+            if len(contents) + len(common_prefixes) >= max_keys:
+                truncated = True
+                break
+            contents.append(key)
+            last = key
+
+        xml = [f'<ListBucketResult xmlns="{S3_NS}"><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>',
+               f'<KeyCount>{len(contents) + len(common_prefixes)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>',
+               f'<IsTruncated>{"true" if truncated else "false"}</IsTruncated>']
+        if delimiter:
+            xml.append(f'<Delimiter>{escape(delimiter)}</Delimiter>')
+        if truncated:
+            xml.append(f'<NextContinuationToken>{escape(last)}</NextContinuationToken>')
+        for key in contents:
+            obj = objects.get(key)
+            if obj is None:
+                continue
+            xml.append(f'<Contents><Key>{escape(key)}</Key><LastModified>{iso_time(obj.modified)}</LastModified>'
+                       f'<ETag>"{obj.etag}"</ETag><Size>{len(obj.body)}</Size><StorageClass>STANDARD</StorageClass></Contents>')
+        for common in common_prefixes:
+            xml.append(f'<CommonPrefixes><Prefix>{escape(common)}</Prefix></CommonPrefixes>')
+        xml.append('</ListBucketResult>')
+        self.respond_xml(200, ''.join(xml))
+
+
+class LocalS3Server:
+    def __init__(self, host='127.0.0.1', port=0, buckets=('guland-tiles',)):
+        """
+        Args:
+            host: Bind address (an IP keeps botocore on path-style addressing)
+            port: 0 picks a free port
+            buckets: Buckets that exist from the start
+        """
+        self.store = LocalS3Store(buckets)
+        self.httpd = ThreadingHTTPServer((host, port), S3RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = self.store
+        self.thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='local-s3', daemon=True)
+        self.thread.start()
+        logger.info(f"🪣 Local S3 stand-in listening on {self.endpoint_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local S3-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=9000, help='Port (default: 9000)')
+    parser.add_argument('--bucket', action='append', help='Bucket to create (repeatable, default: guland-tiles)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = LocalS3Server(args.host, args.port, tuple(args.bucket or ['guland-tiles']))
+    print(f"🪣 Serving {', '.join(server.store.buckets)} at {server.endpoint_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"📊 Calls: {server.store.call_counts()}")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Local tile-server stand-in for download benchmarks
+Async HTTP server emulating the vcdn.cloud tile hosts
+(/<pattern path>/{z}/{x}/{y}.png) with configurable latency, error rate,
+404 density, payload sizes and connection limits
+
+Author: AI Assistant
+Version: 1.0 - Local Tile Server
+
+Responses are deterministic per tile (a hash of z/x/y decides 404s and the
+payload size), so every engine sees the same tile set. Each emulated host is
+its own 127.0.0.N:port site; connections are counted per host by client
+address, which gives the connection-reuse ratio.
+
+Usage: python local_tile_server.py [--port 8800] [--latency-ms 40] [--not-found-rate 0.3]
+"""
+
+import re
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+TILE_PATH_RE = re.compile(r'/(\d+)/(\d+)/(\d+)\.(png|jpg|jpeg|webp)$')
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+PAYLOAD_POOL_SIZE = 64
+
+
+class TileServerConfig:
+    def __init__(self, latency_ms=40.0, jitter_ms=20.0, error_rate=0.0, not_found_rate=0.3,
+                 min_payload=2048, max_payload=30000, max_connections=0, hosts=1, seed=42):
+        """
+        Args:
+            latency_ms: Mean time to first byte per tile
+            jitter_ms: Uniform +/- jitter around latency_ms
+            error_rate: Fraction of requests answered 503 (random per request)
+            not_found_rate: Fraction of tiles that do not exist (deterministic per tile)
+            min_payload / max_payload: Tile body size range in bytes
+            max_connections: Concurrent requests served per host (0 = unlimited; the rest wait)
+            hosts: Emulated tile hosts (127.0.0.1 .. 127.0.0.N)
+            seed: Payload/jitter seed
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.min_payload = min_payload
+        self.max_payload = max_payload
+        self.max_connections = max_connections
+        self.hosts = hosts
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class TileServerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_out = 0
+            self.statuses = Counter()
+            self.connections = defaultdict(set)   # host -> {client (ip, port)}
+            self.requests_by_host = Counter()
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def snapshot(self):
+        with self.lock:
+            connections = sum(len(peers) for peers in self.connections.values())
+            return {
+                'requests': self.requests,
+                'bytes_out': self.bytes_out,
+                'statuses': {str(status): count for status, count in self.statuses.items()},
+                'connections': connections,
+                'requests_per_connection': self.requests / connections if connections else 0,
+                'by_host': {
+                    host: {'requests': self.requests_by_host[host], 'connections': len(self.connections[host])}
+                    for host in self.requests_by_host
+                },
+                'max_in_flight': self.max_in_flight
+            }
+
+
+class LocalTileServer:
+    def __init__(self, config=None, port=0):
+        """
+        Args:
+            config: TileServerConfig
+            port: First port (0 = free ports); host N uses port + N - 1
+        """
+        self.config = config or TileServerConfig()
+        self.port = port
+        self.stats = TileServerStats()
+        self.base_urls = []
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.limits = {}
+
+        rng = random.Random(self.config.seed)
+        sizes = [rng.randint(self.config.min_payload, self.config.max_payload) for _ in range(PAYLOAD_POOL_SIZE)]
+        self.payloads = [PNG_HEADER + rng.randbytes(max(0, size - len(PNG_HEADER))) for size in sizes]
+        self.rng = random.Random(self.config.seed + 1)
+
+    @staticmethod
+    def tile_hash(zoom, x, y):
+        return int.from_bytes(hashlib.md5(f"{zoom}/{x}/{y}".encode()).digest()[:8], 'big')
+
+    def tile_exists(self, zoom, x, y):
+        """Deterministic 404 density"""
+        return (self.tile_hash(zoom, x, y) % 10000) >= self.config.not_found_rate * 10000
+
+    async def handle(self, request):
+        host = request.host
+        peer = request.transport.get_extra_info('peername') if request.transport else None
+        with self.stats.lock:
+            self.stats.requests += 1
+            self.stats.requests_by_host[host] += 1
+            if peer:
+                self.stats.connections[host].add(peer[:2])
+
+        limit = self.limits.get(host)
+        if limit is None and self.config.max_connections:
+            limit = self.limits[host] = asyncio.Semaphore(self.config.max_connections)
+
+        if limit:
+            async with limit:
+                return await self.respond(request)
+        return await self.respond(request)
+
+    async def respond(self, request):
+        with self.stats.lock:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        try:
+            delay = self.config.latency_ms + self.rng.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+            if delay > 0:
+                await asyncio.sleep(delay / 1000)
+
+            match = TILE_PATH_RE.search(request.path)
+            if not match:
+                return self.finish(web.Response(status=404, text='Not Found'))
+            if self.config.error_rate and self.rng.random() < self.config.error_rate:
+                return self.finish(web.Response(status=503, text='Service Unavailable'))
+
+            zoom, x, y = (int(value) for value in match.group(1, 2, 3))
+            if not self.tile_exists(zoom, x, y):
+                return self.finish(web.Response(status=404, text='Not Found'))
+
+            body = self.payloads[self.tile_hash(zoom, x, y) % len(self.payloads)]
+            return self.finish(web.Response(body=body, content_type='image/png',
+                                            headers={'Cache-Control': 'public, max-age=86400'}))
+        finally:
+            with self.stats.lock:
+                self.stats.in_flight -= 1
+
+    def finish(self, response):
+        with self.stats.lock:
+            self.stats.statuses[response.status] += 1
+            self.stats.bytes_out += len(response.body or b'')
+        return response
+
+    async def start_sites(self):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        for index in range(self.config.hosts):
+            host = f"127.0.0.{index + 1}"
+            site = web.TCPSite(self.runner, host, self.port + index if self.port else 0, backlog=1024)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.base_urls.append(f"http://{host}:{port}")
+
+    def run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.start_sites())
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run_loop, name='local-tile-server', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        logger.info(f"🗺️ Local tile server on {', '.join(self.base_urls)}")
+        return self
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_config_arguments(parser):
+    """Shared CLI options for the server and the download benchmark"""
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='Mean latency per tile (default: 40)')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='Latency jitter +/- (default: 20)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 503 responses (default: 0)')
+    parser.add_argument('--not-found-rate', type=float, default=0.3, help='Fraction of missing tiles (default: 0.3)')
+    parser.add_argument('--min-payload', type=int, default=2048, help='Smallest tile in bytes (default: 2048)')
+    parser.add_argument('--max-payload', type=int, default=30000, help='Largest tile in bytes (default: 30000)')
+    parser.add_argument('--max-connections', type=int, default=0,
+                        help='Concurrent requests served per host, the rest queue (default: 0 = unlimited)')
+    parser.add_argument('--hosts', type=int, default=1, help='Emulated tile hosts (default: 1)')
+
+
+def config_from_args(args):
+    return TileServerConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate, min_payload=args.min_payload, max_payload=args.max_payload,
+        max_connections=args.max_connections, hosts=args.hosts
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local vcdn.cloud tile-server stand-in')
+    parser.add_argument('--port', type=int, default=8800, help='First port (default: 8800)')
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = LocalTileServer(config_from_args(args), port=args.port)
+    server.start()
+    print(f"🗺️ Serving tiles at {', '.join(url + '/ha-noi-2030-2/{z}/{x}/{y}.png' for url in server.base_urls)}")
+    print("Press Ctrl+C to stop")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"📊 {server.stats.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
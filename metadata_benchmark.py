@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-file CPU cost of upload metadata generation
+Original per-file sanitization vs precompiled per-group templates
+
+Author: AI Assistant
+Version: 1.0 - Metadata Benchmark
+
+Usage: python metadata_benchmark.py [--files 20000] [--repeat 3]
+"""
+
+import re
+import time
+import argparse
+import unicodedata
+from datetime import datetime
+from upload_metadata import MetadataTemplates, VIETNAMESE_REPLACEMENTS
+from html_do_uploader import MAP_TYPE_CONFIG
+
+# Representative folders: plain cities, KH-2025 districts with Vietnamese names
+SAMPLE_GROUPS = [
+    ('hanoi', 'qh-2030', None, '14'),
+    ('hanoi', 'kh-2025', 'Quận Đống Đa', '16'),
+    ('ho-chi-minh', 'kh-2025', 'Thành phố Thủ Đức', '12'),
+    ('da-nang', 'qh-phan-khu', None, '18'),
+    ('can-tho', 'kh-2025', 'Huyện Phong Điền', '10')
+]
+
+
+def legacy_sanitize(value):
+    """The original per-call sanitizer (NFKD, replacement table, three uncompiled regexes)"""
+    if not value:
+        return value
+    try:
+        normalized = unicodedata.normalize('NFKD', str(value))
+        ascii_value = normalized.encode('ascii', 'ignore').decode('ascii')
+        vietnamese_replacements = dict(VIETNAMESE_REPLACEMENTS)
+        if not ascii_value or len(ascii_value) < len(value) * 0.5:
+            for vietnamese_char, replacement in vietnamese_replacements.items():
+                value = value.replace(vietnamese_char, replacement)
+            ascii_value = value
+        ascii_value = re.sub(r'[^\x00-\x7F]', '', ascii_value)
+        ascii_value = re.sub(r'[^\w\-.]', '-', ascii_value)
+        ascii_value = re.sub(r'-+', '-', ascii_value).strip('-')
+        return ascii_value if ascii_value else 'unknown'
+    except Exception:
+        return re.sub(r'[^\x00-\x7F]', '', str(value)) or 'unknown'
+
+
+def legacy_file_metadata(file_name, file_info, city, map_type, zoom, district=None):
+    """The original create_file_metadata: every field sanitized for every file"""
+    metadata = {
+        'original-name': legacy_sanitize(file_name),
+        'upload-time': datetime.now().isoformat(),
+        'md5-hash': file_info['md5'],
+        'file-size': str(file_info['size']),
+        'tile-type': 'map-tile',
+        'public-access': 'enabled',
+        'uploader-version': '2.0-enhanced'
+    }
+    if city:
+        metadata['city'] = legacy_sanitize(city)
+        metadata['city-original'] = city
+    if district:
+        metadata['district'] = legacy_sanitize(district)
+        metadata['district-original'] = legacy_sanitize(district)
+        metadata['structure-type'] = 'kh-2025-district'
+    else:
+        metadata['structure-type'] = 'standard'
+    if map_type:
+        metadata['map-type'] = legacy_sanitize(map_type)
+        map_config = MAP_TYPE_CONFIG.get(map_type, {})
+        if map_config:
+            metadata['map-type-display'] = legacy_sanitize(map_config.get('display_name', map_type))
+            metadata['map-type-priority'] = str(map_config.get('priority', 99))
+    if zoom:
+        metadata['zoom-level'] = str(zoom)
+        metadata['tile-detail'] = 'high' if int(zoom) >= 14 else 'medium' if int(zoom) >= 10 else 'low'
+    return {
+        legacy_sanitize(key).replace(' ', '-'): legacy_sanitize(str(value))
+        for key, value in metadata.items()
+    }
+
+
+def sample_files(count):
+    for i in range(count):
+        city, map_type, district, zoom = SAMPLE_GROUPS[i % len(SAMPLE_GROUPS)]
+        file_info = {'md5': f"{i:032x}", 'size': 4096 + i % 20000}
+        yield f"{102000 + i}_{57000 + i}.png", file_info, city, map_type, zoom, district
+
+
+def time_per_file(create, files, repeat):
+    """Best-of-repeat microseconds per file"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in files:
+            create(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(files) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark upload metadata generation')
+    parser.add_argument('--files', type=int, default=20000, help='Files per run (default: 20000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs, best is reported (default: 3)')
+    args = parser.parse_args()
+
+    files = list(sample_files(args.files))
+    templates = MetadataTemplates(MAP_TYPE_CONFIG)
+
+    # Same headers apart from the timestamp
+    for sample in files[:len(SAMPLE_GROUPS)]:
+        expected = legacy_file_metadata(*sample)
+        actual = templates.create(*sample)
+        expected.pop('upload-time'), actual.pop('upload-time')
+        assert actual == expected, f"Metadata mismatch for {sample}: {actual} != {expected}"
+
+    legacy_us = time_per_file(legacy_file_metadata, files, args.repeat)
+    template_us = time_per_file(templates.create, files, args.repeat)
+
+    print(f"📊 Metadata generation, {args.files:,} files across {len(SAMPLE_GROUPS)} folders (best of {args.repeat})")
+    print(f"   Per-file sanitization: {legacy_us:8.2f} µs/file")
+    print(f"   Group templates:       {template_us:8.2f} µs/file")
+    print(f"   🚀 Speed-up: {legacy_us / template_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Prometheus / OpenMetrics instrumentation for the crawlers and uploaders
+Thread-safe counters, gauges and histograms in one process-wide registry,
+exposed over HTTP (/metrics) or written to a node_exporter textfile
+
+Author: AI Assistant
+Version: 1.0 - Metrics
+
+No client library needed: the text formats are rendered here. The HTTP
+endpoint answers OpenMetrics when the scraper asks for it and Prometheus text
+0.0.4 otherwise; the textfile exporter writes 0.0.4 atomically every few
+seconds and once more at exit.
+
+Exporters start from the CLI flags or the environment:
+    GULAND_METRICS_PORT=9464              -> http://0.0.0.0:9464/metrics
+    GULAND_METRICS_TEXTFILE=/var/lib/node_exporter/textfile/guland.prom
+
+Example alert on throughput collapse:
+    sum(rate(guland_tile_responses_total{status="200"}[5m])) < 10
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PORT_ENV = 'GULAND_METRICS_PORT'
+TEXTFILE_ENV = 'GULAND_METRICS_TEXTFILE'
+TEXTFILE_INTERVAL = 15.0
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DISK_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+S3_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+INF_LABEL = 'le="+Inf"'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return f"{value:.1f}"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self, family):
+        return [f"# HELP {family} {self.documentation}", f"# TYPE {family} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self.key(labels), 0)
+
+    def render(self, openmetrics):
+        # OpenMetrics names the family without _total; Prometheus 0.0.4 types the sample name
+        lines = self.header(self.name if openmetrics else f"{self.name}_total")
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}_total{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self.key(labels), 0)
+
+    def track_inprogress(self, **labels):
+        """Context manager: +1 while the block runs"""
+        return _InProgress(self, labels)
+
+    def render(self, openmetrics):
+        lines = self.header(self.name)
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class _InProgress:
+    __slots__ = ('gauge', 'labels')
+
+    def __init__(self, gauge, labels):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+
+    def __exit__(self, *exc):
+        self.gauge.dec(**self.labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # per-bucket counts, sum, count
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the block's duration in seconds"""
+        return _Timer(self, labels)
+
+    def render(self, openmetrics):
+        lines = self.header(self.name)
+        with self._lock:
+            values = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(float(total))}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Get-or-create by name, so modules can declare the same metric independently"""
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered with a different type or labels")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, openmetrics=False):
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# ----------------------------------------------------------------------
+# Shared metric families (engine: ultra / pattern / guland)
+# ----------------------------------------------------------------------
+
+TILE_REQUEST_SECONDS = REGISTRY.histogram(
+    'guland_tile_request_duration_seconds', 'Tile request latency until the body is received',
+    ('engine', 'host'), LATENCY_BUCKETS
+)
+TILE_RESPONSES = REGISTRY.counter(
+    'guland_tile_responses', 'Tile responses by HTTP status (timeout/error when none arrived)',
+    ('engine', 'host', 'status')
+)
+TILE_BYTES = REGISTRY.counter('guland_tile_bytes', 'Tile bytes downloaded', ('engine', 'host'))
+TILES_IN_FLIGHT = REGISTRY.gauge('guland_tile_requests_in_flight', 'Tile requests currently open', ('engine',))
+CRAWL_QUEUE_DEPTH = REGISTRY.gauge(
+    'guland_crawl_queue_depth', 'Tiles submitted to a download batch and not finished yet', ('engine',)
+)
+DISK_WRITE_SECONDS = REGISTRY.histogram(
+    'guland_disk_write_duration_seconds', 'Time spent writing one tile file', ('engine',), DISK_BUCKETS
+)
+
+S3_REQUEST_SECONDS = REGISTRY.histogram(
+    'guland_s3_request_duration_seconds', 'S3 call latency by operation',
+    ('operation',), S3_BUCKETS
+)
+S3_REQUESTS = REGISTRY.counter('guland_s3_requests', 'S3 calls by operation and HTTP status', ('operation', 'status'))
+S3_IN_FLIGHT = REGISTRY.gauge('guland_s3_requests_in_flight', 'S3 calls currently open', ('operation',))
+UPLOAD_QUEUE_DEPTH = REGISTRY.gauge(
+    'guland_upload_queue_depth', 'Files scheduled or submitted for upload and not finished yet', ('uploader',)
+)
+
+
+def host_of(url):
+    """'https://host:port/path' -> 'host:port' (cheaper than urlparse per tile)"""
+    parts = url.split('/', 3)
+    return parts[2] if len(parts) > 2 else ''
+
+
+def observe_tile(engine, url, status, seconds, size=0):
+    """Record one tile request outcome"""
+    host = host_of(url)
+    TILE_REQUEST_SECONDS.observe(seconds, engine=engine, host=host)
+    TILE_RESPONSES.inc(engine=engine, host=host, status=status)
+    if size:
+        TILE_BYTES.inc(size, engine=engine, host=host)
+
+
+# ----------------------------------------------------------------------
+# S3 clients
+# ----------------------------------------------------------------------
+
+def _s3_before_call(model, context, **kwargs):
+    context['metrics_operation'] = model.name
+    context['metrics_started'] = time.perf_counter()
+    S3_IN_FLIGHT.inc(operation=model.name)
+
+
+def observe_s3_call(operation, status, seconds):
+    """Record one S3 call outcome (status: HTTP code, or 'error' when no response arrived)"""
+    S3_REQUEST_SECONDS.observe(seconds, operation=operation)
+    S3_REQUESTS.inc(operation=operation, status=status)
+
+
+def _s3_finish_call(context, status):
+    operation = context.pop('metrics_operation', None)
+    started = context.pop('metrics_started', None)
+    if operation is None:
+        return
+    S3_IN_FLIGHT.dec(operation=operation)
+    observe_s3_call(operation, status, time.perf_counter() - started)
+
+
+def _s3_after_call(http_response, context, **kwargs):
+    _s3_finish_call(context, http_response.status_code)
+
+
+def _s3_after_call_error(exception, context, **kwargs):
+    _s3_finish_call(context, 'error')
+
+
+def instrument_s3_client(client):
+    """Time every call of a boto3 S3 client (uploads through s3transfer included) via botocore events"""
+    events = client.meta.events
+    events.register('before-call.s3', _s3_before_call, unique_id='guland-metrics-before')
+    events.register('after-call.s3', _s3_after_call, unique_id='guland-metrics-after')
+    events.register('after-call-error.s3', _s3_after_call_error, unique_id='guland-metrics-error')
+    return client
+
+
+# ----------------------------------------------------------------------
+# Exporters
+# ----------------------------------------------------------------------
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        body = self.registry.render(openmetrics).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the crawl log
+
+
+def start_http_server(port, addr='0.0.0.0', registry=REGISTRY):
+    """Serve /metrics from a daemon thread; returns the server"""
+    handler = type('BoundMetricsHandler', (MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"📈 Metrics endpoint: http://{addr}:{server.server_address[1]}/metrics")
+    return server
+
+
+class TextfileExporter:
+    def __init__(self, path, interval=TEXTFILE_INTERVAL, registry=REGISTRY):
+        """
+        Args:
+            path: .prom file read by node_exporter's textfile collector
+            interval: Seconds between writes
+        """
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='metrics-textfile', daemon=True)
+
+    def write(self):
+        """Write via a temp file + rename so the collector never reads a partial file"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.registry.render(openmetrics=False))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write metrics textfile {self.path}: {e}")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.write()
+        self.thread.start()
+        atexit.register(self.stop)
+        logger.info(f"📈 Metrics textfile: {self.path} (every {self.interval:.0f}s)")
+        return self
+
+    def stop(self):
+        if not self.stop_event.is_set():
+            self.stop_event.set()
+            self.write()
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port=None, textfile=None):
+    """
+    Start the HTTP endpoint and/or textfile exporter once per process
+
+    Args:
+        port: /metrics port (default: $GULAND_METRICS_PORT, unset = no endpoint)
+        textfile: .prom path (default: $GULAND_METRICS_TEXTFILE, unset = no textfile)
+    """
+    global _exporters_started
+    port = port or os.getenv(PORT_ENV)
+    textfile = textfile or os.getenv(TEXTFILE_ENV)
+    with _exporters_lock:
+        if _exporters_started or not (port or textfile):
+            return
+        _exporters_started = True
+    if port:
+        try:
+            start_http_server(int(port))
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Metrics endpoint not started on port {port}: {e}")
+    if textfile:
+        TextfileExporter(textfile).start()
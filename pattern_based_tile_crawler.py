@@ -18,6 +18,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
 import math
 from tile_downloader import GulandTileDownloader
+from pattern_registry import PatternRegistry
+import metrics
 
 # Setup logging
 logging.basicConfig(
@@ -55,6 +57,9 @@ class PatternBasedTileCrawler:
         self.base_download_dir = 'downloaded_tiles'
         self.base_output_dir = 'pattern_verification'
         
+        # Shared pattern registry (deduplicated across all discovery outputs)
+        self.pattern_registry = PatternRegistry()
+        
         # Create base directories
         os.makedirs(self.base_download_dir, exist_ok=True)
         os.makedirs(f'{self.base_download_dir}/cities', exist_ok=True)
@@ -126,6 +131,23 @@ class PatternBasedTileCrawler:
         
         return city_mapping.get(clean_name, clean_name)
 
+    def fetch_tile(self, url):
+        """GET a tile through the shared session, recording latency and status per host"""
+        started = time.perf_counter()
+        status = 'error'
+        size = 0
+        try:
+            with metrics.TILES_IN_FLIGHT.track_inprogress(engine='pattern'):
+                response = self.session.get(url, timeout=self.timeout)
+            status = response.status_code
+            size = len(response.content) if status == 200 else 0
+            return response
+        except requests.exceptions.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            metrics.observe_tile('pattern', url, status, time.perf_counter() - started, size)
+
     def download_single_tile_with_structure(self, tile_info, city_name):
         """Download single tile with new folder structure"""
         try:
@@ -165,7 +187,7 @@ class PatternBasedTileCrawler:
                 }
             
             # Download tile
-            response = self.session.get(url, timeout=self.timeout)
+            response = self.fetch_tile(url)
             
             if response.status_code == 200:
                 # Check if it's actually an image
@@ -176,8 +198,9 @@ class PatternBasedTileCrawler:
                     # Additional validation - check image size
                     if size > 100:  # Minimum size for valid tile
                         # Save file
-                        with open(filepath, 'wb') as f:
-                            f.write(response.content)
+                        with metrics.DISK_WRITE_SECONDS.time(engine='pattern'):
+                            with open(filepath, 'wb') as f:
+                                f.write(response.content)
                         
                         with self.stats_lock:
                             self.stats['total_successful'] += 1
@@ -241,6 +264,7 @@ class PatternBasedTileCrawler:
         results = []
         
         # Download tiles in parallel
+        metrics.CRAWL_QUEUE_DEPTH.inc(len(tile_urls), engine='pattern')
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_tile = {
                 executor.submit(self.download_single_tile_with_structure, tile_info, city_name): tile_info 
@@ -248,6 +272,7 @@ class PatternBasedTileCrawler:
             }
             
             for future in as_completed(future_to_tile):
+                metrics.CRAWL_QUEUE_DEPTH.dec(engine='pattern')
                 try:
                     result = future.result()
                     results.append(result)
@@ -317,46 +342,30 @@ class PatternBasedTileCrawler:
         
     def load_patterns_from_final_report(self):
         """Load patterns from new final report structure - FILTER for -2030 only"""
-        patterns = set()
+        self.pattern_registry.refresh(kinds=['final_report', 'browser_city_report'])
         
-        # Try new final report location first
-        final_report_path = 'output_browser_crawl/reports/final_patterns_report.json'
-        try:
-            with open(final_report_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            all_patterns = data.get('tile_patterns', [])
+        # Try new final report first
+        all_patterns = self.pattern_registry.unique_pattern_urls(kinds=['final_report'])
+        if all_patterns:
             # FILTER: Only patterns containing '-2030'
             filtered_patterns = [p for p in all_patterns if '-2030' in p]
-            patterns.update(filtered_patterns)
             logger.info(f"📋 Loaded {len(filtered_patterns)} patterns (with -2030) from final report")
             logger.info(f"📋 Filtered out {len(all_patterns) - len(filtered_patterns)} patterns without -2030")
-            return list(patterns)
-        except FileNotFoundError:
-            logger.warning(f"⚠️ Final report not found at {final_report_path}")
+            return filtered_patterns
         
-        # Fallback: load from all city reports
-        cities_dir = Path('output_browser_crawl/cities')
-        if cities_dir.exists():
-            for city_dir in cities_dir.iterdir():
-                if city_dir.is_dir():
-                    reports_dir = city_dir / 'reports'
-                    if reports_dir.exists():
-                        # Find latest patterns file for this city
-                        pattern_files = list(reports_dir.glob('patterns_*.json'))
-                        if pattern_files:
-                            latest_file = max(pattern_files, key=os.path.getctime)
-                            try:
-                                with open(latest_file, 'r', encoding='utf-8') as f:
-                                    data = json.load(f)
-                                all_city_patterns = data.get('discovered_patterns', [])
-                                # FILTER: Only patterns containing '-2030'
-                                filtered_city_patterns = [p for p in all_city_patterns if '-2030' in p]
-                                patterns.update(filtered_city_patterns)
-                                logger.info(f"📋 Added {len(filtered_city_patterns)} patterns (with -2030) from {city_dir.name}")
-                                if len(all_city_patterns) > len(filtered_city_patterns):
-                                    logger.info(f"📋 Filtered out {len(all_city_patterns) - len(filtered_city_patterns)} patterns without -2030 from {city_dir.name}")
-                            except Exception as e:
-                                logger.warning(f"⚠️ Failed to load {latest_file}: {e}")
+        logger.warning("⚠️ Final report not found at output_browser_crawl/reports/final_patterns_report.json")
+        
+        # Fallback: all city reports
+        patterns = set()
+        for location in self.pattern_registry.locations('browser_city_report'):
+            rows = self.pattern_registry.query_patterns(kinds=['browser_city_report'], location=location)
+            all_city_patterns = {row['url'] for row in rows}
+            # FILTER: Only patterns containing '-2030'
+            filtered_city_patterns = {p for p in all_city_patterns if '-2030' in p}
+            patterns.update(filtered_city_patterns)
+            logger.info(f"📋 Added {len(filtered_city_patterns)} patterns (with -2030) from {location}")
+            if len(all_city_patterns) > len(filtered_city_patterns):
+                logger.info(f"📋 Filtered out {len(all_city_patterns) - len(filtered_city_patterns)} patterns without -2030 from {location}")
         
         logger.info(f"📋 Total patterns loaded from all cities (with -2030): {len(patterns)}")
         return list(patterns)
@@ -465,7 +474,7 @@ class PatternBasedTileCrawler:
         url = tile_info['url']
         
         try:
-            response = self.session.get(url, timeout=self.timeout)
+            response = self.fetch_tile(url)
             
             if response.status_code == 200:
                 # Check if it's actually an image
@@ -1136,93 +1145,30 @@ downloaded_tiles/
 
     def load_all_discovered_patterns_from_txt(self):
         """Load patterns from TXT coverage reports - FILTER for -2030 only"""
-        patterns = set()
-        
-        # Look for TXT coverage reports in output_browser_crawl structure
         cities_dir = Path('output_browser_crawl/cities')
         
         if not cities_dir.exists():
             logger.warning(f"❌ Cities directory not found: {cities_dir}")
             return []
         
+        self.pattern_registry.refresh(kinds=['txt_coverage'])
+        
+        patterns = set()
         total_found = 0
         total_filtered = 0
         
-        for city_dir in cities_dir.iterdir():
-            if city_dir.is_dir():
-                reports_dir = city_dir / 'reports'
-                if reports_dir.exists():
-                    # Look for coverage TXT files
-                    txt_files = list(reports_dir.glob('coverage_*.txt'))
-                    
-                    for txt_file in txt_files:
-                        try:
-                            logger.debug(f"📋 Reading patterns from {txt_file}")
-                            
-                            with open(txt_file, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                            
-                            # Extract patterns from TXT content
-                            lines = content.split('\n')
-                            in_patterns_section = False
-                            city_patterns_found = 0
-                            city_patterns_filtered = 0
-                            
-                            for line in lines:
-                                line = line.strip()
-                                
-                                # Look for patterns section
-                                if 'discovered patterns:' in line.lower() or 'patterns found:' in line.lower():
-                                    in_patterns_section = True
-                                    continue
-                                
-                                # Stop at next section
-                                if in_patterns_section and line.startswith('##'):
-                                    in_patterns_section = False
-                                    continue
-                                
-                                # Extract pattern URLs
-                                if in_patterns_section and line:
-                                    # Skip numbered list markers and bullet points
-                                    if line.startswith(('•', '-', '*')):
-                                        line = line[1:].strip()
-                                    
-                                    # Extract URL from line
-                                    if 'http' in line:
-                                        # Handle different formats:
-                                        # "1. https://example.com/{z}/{x}/{y}.png"
-                                        # "• https://example.com/{z}/{x}/{y}.png - Status: 200"
-                                        # "https://example.com/{z}/{x}/{y}.png"
-                                        
-                                        # Remove numbering
-                                        import re
-                                        url_match = re.search(r'(https?://[^\s]+)', line)
-                                        if url_match:
-                                            url = url_match.group(1)
-                                            
-                                            # Clean up URL (remove trailing punctuation)
-                                            url = url.rstrip('.,;-')
-                                            
-                                            # Validate it looks like a tile pattern
-                                            if all(placeholder in url for placeholder in ['{z}', '{x}', '{y}']):
-                                                city_patterns_found += 1
-                                                total_found += 1
-                                                
-                                                # FILTER: Only accept patterns with '-2030'
-                                                if '-2030' in url:
-                                                    patterns.add(url)
-                                                    city_patterns_filtered += 1
-                                                    total_filtered += 1
-                                                    logger.debug(f"  ✅ Found -2030 pattern: {url}")
-                                                else:
-                                                    logger.debug(f"  ⏭️ Skipped non-2030 pattern: {url}")
-                            
-                            if city_patterns_found > 0:
-                                logger.info(f"📋 {city_dir.name}: Found {city_patterns_filtered}/{city_patterns_found} patterns with -2030")
-                    
-                        except Exception as e:
-                            logger.warning(f"⚠️ Error reading {txt_file}: {e}")
-                            continue
+        for location in self.pattern_registry.locations('txt_coverage'):
+            rows = self.pattern_registry.query_patterns(kinds=['txt_coverage'], location=location)
+            city_patterns = {row['url'] for row in rows}
+            # FILTER: Only accept patterns with '-2030'
+            city_filtered = {url for url in city_patterns if '-2030' in url}
+            
+            patterns.update(city_filtered)
+            total_found += len(city_patterns)
+            total_filtered += len(city_filtered)
+            
+            if city_patterns:
+                logger.info(f"📋 {location}: Found {len(city_filtered)}/{len(city_patterns)} patterns with -2030")
     
         logger.info(f"📋 FILTER SUMMARY:")
         logger.info(f"  Total patterns found: {total_found}")
@@ -1305,6 +1251,7 @@ downloaded_tiles/
 
 # Update main function to add skip option
 def main():
+    metrics.start_exporters()  # $GULAND_METRICS_PORT / $GULAND_METRICS_TEXTFILE
     print("🚀 GULAND EXHAUSTIVE TILE CRAWLER v1.1")
     print("Downloads ALL available tiles with organized folder structure")
     print("📁 NEW: downloaded_tiles/cities/<city>/qh-2030/<zoom>/")
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Pattern Registry for Guland tile crawlers
+Single on-disk index of every discovered tile URL pattern
+
+Sources merged into the registry:
+- output_html_patterns/reports/comprehensive_patterns_report.json
+- output_enhanced_patterns/districts/*_districts.json
+- output_browser_crawl/reports/final_patterns_report.json
+- output_browser_crawl/cities/<city>/reports/patterns_*.json
+- output_browser_crawl/cities/<city>/reports/coverage_*.txt
+
+Each source file is only re-parsed when its size/mtime changes, URLs are
+canonicalised (host case, default ports, Spaces CDN/virtual-host aliases)
+so the same pattern discovered by several tools is stored once, and
+per-pattern health and last crawl time are kept across runs.
+"""
+
+import os
+import sys
+import re
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = 'pattern_registry.db'
+
+# Hosts known to serve the same objects under another name: alias -> canonical host
+HOST_ALIASES = {}
+
+# Spaces buckets are reachable as <bucket>.<region>.cdn.digitaloceanspaces.com,
+# <bucket>.<region>.digitaloceanspaces.com and <region>.digitaloceanspaces.com/<bucket>
+SPACES_HOST_RE = re.compile(r'^(?P<bucket>[a-z0-9.-]+?)\.(?P<region>[a-z]+\d)(?:\.cdn)?\.digitaloceanspaces\.com$')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+SOURCE_KINDS = {
+    'html_report': 'output_html_patterns/reports/comprehensive_patterns_report.json',
+    'district': 'output_enhanced_patterns/districts/*_districts.json',
+    'final_report': 'output_browser_crawl/reports/final_patterns_report.json',
+    'browser_city_report': 'output_browser_crawl/cities/*/reports/patterns_*.json',
+    'txt_coverage': 'output_browser_crawl/cities/*/reports/coverage_*.txt',
+}
+# Per-location rows of the final report, indexed apart from its 'tile_patterns' list so
+# kinds=['final_report'] keeps returning exactly that list
+FINAL_REPORT_LOCATION_KIND = 'final_report_location'
+
+
+def canonicalize_pattern_url(url):
+    """Normalise a tile pattern URL so aliases of the same pattern compare equal"""
+    if not url:
+        return None
+
+    url = url.strip().rstrip('.,;')
+
+    # Placeholders sometimes arrive URL-encoded or upper-cased
+    url = unquote(url)
+    url = re.sub(r'\{([zxyZXY])\}', lambda m: '{' + m.group(1).lower() + '}', url)
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    path = re.sub(r'/{2,}', '/', parts.path)
+
+    host = HOST_ALIASES.get(host, host)
+
+    # Fold Spaces virtual-host and CDN forms into path-style
+    spaces_match = SPACES_HOST_RE.match(host)
+    if spaces_match:
+        host = f"{spaces_match.group('region')}.digitaloceanspaces.com"
+        path = f"/{spaces_match.group('bucket')}{path}"
+
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+
+    return urlunsplit((scheme, netloc, path.rstrip('/'), parts.query, ''))
+
+
+def is_tile_pattern(url):
+    """True when the URL carries all three tile placeholders"""
+    return bool(url) and all(placeholder in url for placeholder in ('{z}', '{x}', '{y}'))
+
+
+class PatternRegistry:
+    def __init__(self, db_path=DEFAULT_REGISTRY_PATH, base_dir='.'):
+        """
+        Open (or create) the pattern registry
+
+        Args:
+            db_path: SQLite file holding the registry
+            base_dir: Directory the discovery outputs live under
+        """
+        self.db_path = db_path
+        self.base_dir = Path(base_dir)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.create_tables()
+
+    def create_tables(self):
+        """Create registry tables and indexes"""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS patterns (
+                    canonical_url TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    host TEXT,
+                    health_status TEXT,
+                    tiles_tried INTEGER DEFAULT 0,
+                    tiles_hit INTEGER DEFAULT 0,
+                    hit_rate REAL,
+                    last_probe TIMESTAMP,
+                    last_crawl TIMESTAMP,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS pattern_locations (
+                    canonical_url TEXT NOT NULL,
+                    source_path TEXT NOT NULL,
+                    source_kind TEXT NOT NULL,
+                    location TEXT NOT NULL DEFAULT '',
+                    district TEXT NOT NULL DEFAULT '',
+                    declared_map_type TEXT NOT NULL DEFAULT '',
+                    original_url TEXT,
+                    UNIQUE(canonical_url, source_path, location, district, declared_map_type)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS pattern_area_health (
+                    canonical_url TEXT NOT NULL,
+                    area TEXT NOT NULL,
+                    health_status TEXT,
+                    tiles_tried INTEGER DEFAULT 0,
+                    tiles_hit INTEGER DEFAULT 0,
+                    last_probe TIMESTAMP,
+                    PRIMARY KEY (canonical_url, area)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS sources (
+                    source_path TEXT PRIMARY KEY,
+                    source_kind TEXT NOT NULL,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    pattern_count INTEGER,
+                    loaded_at TIMESTAMP
+                )
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_locations_kind
+                ON pattern_locations(source_kind, location)
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_locations_url
+                ON pattern_locations(canonical_url)
+            ''')
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # Source ingestion
+    # ------------------------------------------------------------------
+
+    def discover_source_files(self, kinds=None):
+        """Return {path: kind} for every source file currently on disk"""
+        found = {}
+        for kind, pattern in SOURCE_KINDS.items():
+            if kinds and kind not in kinds:
+                continue
+            for path in sorted(self.base_dir.glob(pattern)):
+                if path.is_file():
+                    found[str(path)] = kind
+        return found
+
+    def refresh(self, kinds=None, force=False):
+        """Re-parse only the source files that changed since the last refresh"""
+        source_files = self.discover_source_files(kinds)
+
+        with self._lock:
+            known = {
+                row['source_path']: (row['size'], row['mtime_ns'])
+                for row in self.conn.execute('SELECT source_path, size, mtime_ns, source_kind FROM sources')
+                if not kinds or row['source_kind'] in kinds
+            }
+
+        changed = 0
+        for path, kind in source_files.items():
+            stat = os.stat(path)
+            if not force and known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            try:
+                entries = list(self.parse_source(path, kind))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not parse pattern source {path}: {e}")
+                continue
+
+            self.replace_source(path, kind, stat, entries)
+            changed += 1
+
+        # Forget sources that disappeared from disk
+        removed = [path for path in known if path not in source_files]
+        if removed:
+            with self._lock, self.conn:
+                for path in removed:
+                    self.conn.execute('DELETE FROM pattern_locations WHERE source_path = ?', (path,))
+                    self.conn.execute('DELETE FROM sources WHERE source_path = ?', (path,))
+
+        if changed or removed:
+            logger.info(f"📚 Pattern registry refreshed: {changed} sources re-parsed, {len(removed)} removed")
+
+        return {'changed': changed, 'removed': len(removed), 'sources': len(source_files)}
+
+    def replace_source(self, path, kind, stat, entries):
+        """Replace every location row of one source file in a single transaction"""
+        now = datetime.now().isoformat()
+
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM pattern_locations WHERE source_path = ?', (path,))
+
+            for entry in entries:
+                canonical_url = canonicalize_pattern_url(entry['url'])
+                if not is_tile_pattern(canonical_url):
+                    continue
+
+                self.conn.execute('''
+                    INSERT INTO patterns (canonical_url, url, host, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(canonical_url) DO UPDATE SET last_seen = excluded.last_seen
+                ''', (canonical_url, entry['url'].strip(), urlsplit(canonical_url).hostname, now, now))
+
+                self.conn.execute('''
+                    INSERT OR IGNORE INTO pattern_locations
+                        (canonical_url, source_path, source_kind, location, district, declared_map_type, original_url)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    canonical_url, path, entry.get('kind', kind),
+                    entry.get('location') or '', entry.get('district') or '',
+                    entry.get('map_type') or '', entry['url'].strip()
+                ))
+
+            self.conn.execute('''
+                INSERT OR REPLACE INTO sources (source_path, source_kind, size, mtime_ns, pattern_count, loaded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (path, kind, stat.st_size, stat.st_mtime_ns, len(entries), now))
+
+    def parse_source(self, path, kind):
+        """Yield {'url', 'location', 'district', 'map_type'} entries from one source file ('kind' overrides the file's kind)"""
+        if kind == 'txt_coverage':
+            yield from self.parse_txt_coverage(path)
+            return
+
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if kind == 'html_report':
+            for location, map_types in data.get('location_breakdown', {}).items():
+                for map_type, map_data in map_types.items():
+                    for field in ('tile_url', 'tile_url_2030'):
+                        if map_data.get(field):
+                            yield {'url': map_data[field], 'location': location, 'map_type': map_type}
+
+        elif kind == 'district':
+            province = data.get('province_name', '')
+            for district_name, district_info in data.get('districts', {}).items():
+                map_types = district_info.get('patterns', {}).get('map_types', {})
+                for map_type, map_data in map_types.items():
+                    if isinstance(map_data, dict) and map_data.get('tile_url'):
+                        yield {
+                            'url': map_data['tile_url'],
+                            'location': province,
+                            'district': district_name,
+                            'map_type': map_type
+                        }
+
+        elif kind == 'final_report':
+            for url in data.get('tile_patterns', []):
+                yield {'url': url}
+            for location in data.get('successful_locations', []):
+                for url in location.get('discovered_patterns', []):
+                    yield {'url': url, 'location': location.get('location_name', ''), 'kind': FINAL_REPORT_LOCATION_KIND}
+
+        elif kind == 'browser_city_report':
+            city = Path(path).parent.parent.name
+            for url in data.get('discovered_patterns', []):
+                yield {'url': url, 'location': city}
+
+    def parse_txt_coverage(self, path):
+        """Extract pattern URLs from the discovered-patterns section of a coverage TXT report"""
+        city = Path(path).parent.parent.name
+        in_patterns_section = False
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+
+                if 'discovered patterns:' in line.lower() or 'patterns found:' in line.lower():
+                    in_patterns_section = True
+                    continue
+                if in_patterns_section and line.startswith('##'):
+                    in_patterns_section = False
+                    continue
+
+                if in_patterns_section and 'http' in line:
+                    url_match = re.search(r'(https?://[^\s]+)', line)
+                    if url_match:
+                        yield {'url': url_match.group(1).rstrip('.,;-'), 'location': city}
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def query_patterns(self, kinds=None, map_type=None, url_contains=None, location=None):
+        """One query returning deduplicated pattern rows with their locations and health"""
+        sql = '''
+            SELECT p.canonical_url, p.url, p.health_status, p.hit_rate, p.last_crawl, p.last_probe,
+                   l.source_kind, l.source_path, l.location, l.district, l.declared_map_type
+            FROM pattern_locations l JOIN patterns p ON p.canonical_url = l.canonical_url
+            WHERE 1 = 1
+        '''
+        params = []
+        if kinds:
+            sql += f" AND l.source_kind IN ({','.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        if map_type:
+            sql += ' AND l.declared_map_type = ?'
+            params.append(map_type)
+        if url_contains:
+            sql += ' AND p.canonical_url LIKE ?'
+            params.append(f'%{url_contains}%')
+        if location:
+            sql += ' AND l.location = ?'
+            params.append(location)
+        sql += ' ORDER BY l.location, l.district, p.canonical_url'
+
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def unique_pattern_urls(self, kinds=None, url_contains=None):
+        """Distinct crawlable URLs (one per canonical pattern)"""
+        seen = {}
+        for row in self.query_patterns(kinds=kinds, url_contains=url_contains):
+            seen.setdefault(row['canonical_url'], row['url'])
+        return list(seen.values())
+
+    def locations(self, kind):
+        """Distinct location names known for a source kind"""
+        with self._lock:
+            return [row['location'] for row in self.conn.execute(
+                'SELECT DISTINCT location FROM pattern_locations WHERE source_kind = ? ORDER BY location', (kind,)
+            )]
+
+    # ------------------------------------------------------------------
+    # Health tracking
+    # ------------------------------------------------------------------
+
+    def record_health(self, url, status, tiles_tried=0, tiles_hit=0, crawled=False, area=''):
+        """
+        Store the latest probe/crawl outcome of a pattern
+
+        Args:
+            area: Coverage the outcome was measured over (e.g. 'hanoi' or 'hanoi/ba-dinh').
+                  'blocked' is a property of the host and applies everywhere; any other
+                  verdict only applies to its area.
+        """
+        canonical_url = canonicalize_pattern_url(url)
+        now = datetime.now().isoformat()
+        hit_rate = tiles_hit / tiles_tried if tiles_tried else None
+
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT INTO patterns (canonical_url, url, host, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(canonical_url) DO NOTHING
+            ''', (canonical_url, url.strip(), urlsplit(canonical_url).hostname, now, now))
+            self.conn.execute('''
+                UPDATE patterns
+                SET health_status = ?, tiles_tried = ?, tiles_hit = ?, hit_rate = ?,
+                    last_probe = ?, last_crawl = CASE WHEN ? THEN ? ELSE last_crawl END
+                WHERE canonical_url = ?
+            ''', (status, tiles_tried, tiles_hit, hit_rate, now, crawled, now, canonical_url))
+            if area:
+                self.conn.execute('''
+                    INSERT INTO pattern_area_health (canonical_url, area, health_status, tiles_tried, tiles_hit, last_probe)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(canonical_url, area) DO UPDATE SET
+                        health_status = excluded.health_status, tiles_tried = excluded.tiles_tried,
+                        tiles_hit = excluded.tiles_hit, last_probe = excluded.last_probe
+                ''', (canonical_url, area, status, tiles_tried, tiles_hit, now))
+
+    def get_health(self, url):
+        """Return the stored health row of a pattern, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT health_status, tiles_tried, tiles_hit, hit_rate, last_probe, last_crawl '
+                'FROM patterns WHERE canonical_url = ?', (canonicalize_pattern_url(url),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def demoted_patterns(self, max_age_hours=24):
+        """
+        Patterns found blocked/dead recently enough to skip without re-probing
+
+        Returns:
+            {(canonical_url, area): status} - area '' for blocked patterns (skipped everywhere),
+            the probed area for dead ones (a pattern empty over one city may serve another)
+        """
+        cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+        with self._lock:
+            demoted = {
+                (row['canonical_url'], ''): row['health_status'] for row in self.conn.execute(
+                    "SELECT canonical_url, health_status FROM patterns "
+                    "WHERE health_status = 'blocked' AND last_probe >= ?", (cutoff,)
+                )
+            }
+            demoted.update({
+                (row['canonical_url'], row['area']): row['health_status'] for row in self.conn.execute(
+                    "SELECT canonical_url, area, health_status FROM pattern_area_health "
+                    "WHERE health_status = 'dead' AND last_probe >= ?", (cutoff,)
+                )
+            })
+            return demoted
+
+
+def main():
+    """Rebuild the registry and print a short summary"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    registry = PatternRegistry()
+    result = registry.refresh(force='--force' in sys.argv)
+
+    with registry._lock:
+        total = registry.conn.execute('SELECT COUNT(*) FROM patterns').fetchone()[0]
+        raw = registry.conn.execute('SELECT COUNT(*) FROM pattern_locations').fetchone()[0]
+        by_kind = registry.conn.execute(
+            'SELECT source_kind, COUNT(DISTINCT canonical_url) FROM pattern_locations GROUP BY source_kind'
+        ).fetchall()
+
+    print(f"📚 PATTERN REGISTRY: {registry.db_path}")
+    print("=" * 50)
+    print(f"📄 Sources: {result['sources']} ({result['changed']} re-parsed)")
+    print(f"🔗 Unique patterns: {total:,} (from {raw:,} source entries)")
+    for kind, count in by_kind:
+        print(f"   • {kind}: {count:,}")
+
+    registry.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Shared token-bucket rate limiter for Digital Ocean Spaces API calls
+One thread-safe bucket per operation class (PUT, LIST, HEAD, ACL, ...),
+shared by the uploaders, the async engine and the ACL fixer
+
+Author: AI Assistant
+Version: 1.0 - Token Bucket Limiter
+
+Callers reserve a token under a lock and sleep outside it, so requests are
+paced evenly instead of bursting at the start of each second. A 503 SlowDown
+halves that operation's rate; it then recovers gradually (AIMD).
+"""
+
+import time
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Requests per second per operation class
+DEFAULT_RATES = {
+    'PUT': 250,
+    'HEAD': 250,
+    'GET': 250,
+    'LIST': 100,
+    'ACL': 100,
+    'DELETE': 100,
+    'COPY': 100
+}
+
+SLOWDOWN_MARKERS = ('SlowDown', '(503)', 'ServiceUnavailable', 'Please reduce your request rate')
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, min_rate=1.0, recovery_interval=10.0):
+        """
+        Args:
+            rate: Sustained requests per second
+            burst: Bucket size (default: a tenth of a second's worth, at least 1)
+            min_rate: Floor when throttled by SlowDown
+            recovery_interval: Seconds without SlowDown before the rate is raised again
+        """
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst or max(1.0, rate / 10)
+        self.min_rate = min_rate
+        self.recovery_interval = recovery_interval
+
+        self._lock = threading.Lock()
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.last_adjusted = self.updated
+        self.last_throttled = 0.0
+
+        self.calls = 0
+        self.waited = 0.0
+        self.slowdowns = 0
+
+    def reserve(self, tokens=1):
+        """Take tokens (going into debt if needed); returns seconds the caller must wait"""
+        with self._lock:
+            now = time.monotonic()
+
+            # Additive recovery after a quiet period
+            if self.rate < self.max_rate and now - self.last_adjusted >= self.recovery_interval:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+                self.last_adjusted = now
+
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            self.calls += tokens
+
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttle(self, factor=0.5):
+        """Multiplicative decrease after a SlowDown"""
+        with self._lock:
+            now = time.monotonic()
+            self.slowdowns += 1
+            # Requests already in flight fail together - count one SlowDown burst once
+            if now - self.last_throttled >= 1.0:
+                self.rate = max(self.min_rate, self.rate * factor)
+                self.last_throttled = now
+            self.last_adjusted = now
+            return self.rate
+
+
+class SpacesRateLimiter:
+    def __init__(self, rates=None):
+        """
+        Args:
+            rates: Overrides for DEFAULT_RATES, e.g. {'PUT': 150}
+        """
+        self.buckets = {
+            operation: TokenBucket(rate)
+            for operation, rate in {**DEFAULT_RATES, **(rates or {})}.items()
+        }
+
+    def bucket(self, operation):
+        return self.buckets[operation.upper()]
+
+    def acquire(self, operation='PUT', tokens=1):
+        """Block until the operation may proceed"""
+        self.bucket(operation).acquire(tokens)
+
+    async def acquire_async(self, operation='PUT', tokens=1):
+        await self.bucket(operation).acquire_async(tokens)
+
+    def for_operation(self, operation):
+        """Zero-argument callable for code that takes a plain rate_limiter hook"""
+        return lambda: self.acquire(operation)
+
+    def report_slowdown(self, operation='PUT'):
+        """Back off an operation class after a 503 SlowDown"""
+        bucket = self.bucket(operation)
+        old_rate = bucket.rate
+        new_rate = bucket.throttle()
+        if new_rate < old_rate:
+            logger.warning(f"🐢 SlowDown from Spaces - {operation.upper()} rate reduced to {new_rate:.0f}/s")
+
+    def check_error(self, operation, error):
+        """Throttle when an exception (or error text) is a SlowDown; returns True if it was"""
+        if is_slowdown(error):
+            self.report_slowdown(operation)
+            return True
+        return False
+
+    def total_calls(self):
+        return sum(bucket.calls for bucket in self.buckets.values())
+
+    def get_stats(self):
+        return {
+            operation: {
+                'calls': bucket.calls,
+                'current_rate': round(bucket.rate, 1),
+                'max_rate': bucket.max_rate,
+                'waited_seconds': round(bucket.waited, 2),
+                'slowdowns': bucket.slowdowns
+            }
+            for operation, bucket in self.buckets.items()
+            if bucket.calls or bucket.slowdowns
+        }
+
+
+def is_slowdown(error):
+    """True for botocore ClientErrors / error strings that mean 'slow down'"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = str(response.get('Error', {}).get('Code', ''))
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if code in ('SlowDown', '503', 'ServiceUnavailable') or status == 503:
+            return True
+    text = str(error)
+    return any(marker in text for marker in SLOWDOWN_MARKERS)
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter():
+    """Process-wide limiter so every tool in one process draws from the same budgets"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = SpacesRateLimiter()
+        return _shared_limiter
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Bucket inventory snapshot for Digital Ocean Spaces
+One paginated, prefix-parallel LIST of the bucket, kept on disk as a sorted
+compact index so uploaders, the ACL fixer and reports answer existence and
+count questions from memory instead of issuing LIST/HEAD calls
+
+Author: AI Assistant
+Version: 1.0 - Inventory Snapshot
+
+Index file (gzip, sorted by key):
+    line 1: JSON header {"bucket", "prefix", "shards": {shard_prefix: refreshed_at}}
+    then:   <key>\t<size>\t<etag>\t<last_modified_epoch>
+
+Shards are the second-level prefixes (<prefix>/<city>/<map_type>/), listed in
+parallel and refreshed independently; uploads are recorded locally so the
+snapshot stays current between refreshes. Objects sitting directly at the root
+or city level come from "level" shards: non-recursive listings of those prefixes.
+"""
+
+import os
+import gzip
+import json
+import time
+import bisect
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INVENTORY_PATH = 'spaces_inventory.tsv.gz'
+LEVEL_SHARD_MARKER = '<level>'  # Appended to a prefix listed non-recursively (real shard prefixes end in '/')
+
+
+def level_shard(prefix):
+    return prefix + LEVEL_SHARD_MARKER
+
+
+def split_shard(shard):
+    """(prefix, is_level_shard)"""
+    if shard.endswith(LEVEL_SHARD_MARKER):
+        return shard[:-len(LEVEL_SHARD_MARKER)], True
+    return shard, False
+
+
+class SpacesInventory:
+    def __init__(self, s3_client, bucket_name, prefix='guland-tiles', index_path=DEFAULT_INVENTORY_PATH,
+                 max_workers=16, rate_limiter=None):
+        """
+        Initialize the inventory (loads the on-disk snapshot if present)
+
+        Args:
+            s3_client: boto3 S3 client
+            bucket_name: Bucket to inventory
+            prefix: Root prefix to inventory ('' for the whole bucket)
+            index_path: Local snapshot file
+            max_workers: Parallel shard listings
+            rate_limiter: Optional callable invoked before every LIST page
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self.index_path = index_path
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+
+        self._lock = threading.Lock()
+        self.objects = {}         # key -> (size, etag, last_modified_epoch)
+        self.shards = {}          # shard prefix -> refreshed_at epoch
+        self._sorted_keys = None  # built lazily for prefix queries
+        self.dirty = False
+
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Load the snapshot from disk"""
+        if not os.path.exists(self.index_path):
+            return
+
+        start_time = time.time()
+        try:
+            with gzip.open(self.index_path, 'rt', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get('bucket') != self.bucket_name or header.get('prefix') != self.prefix:
+                    logger.info(f"📋 Inventory snapshot is for another bucket/prefix, ignoring {self.index_path}")
+                    return
+
+                objects = {}
+                for line in f:
+                    key, size, etag, modified = line.rstrip('\n').split('\t')
+                    objects[key] = (int(size), etag, int(modified))
+
+            self.objects = objects
+            self.shards = header.get('shards', {})
+            self._sorted_keys = None
+            logger.info(f"📋 Loaded inventory snapshot: {len(objects):,} objects in {time.time() - start_time:.2f}s")
+
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load inventory snapshot: {e}")
+
+    def save(self):
+        """Write the snapshot atomically (sorted by key)"""
+        with self._lock:
+            items = sorted(self.objects.items())
+            header = {
+                'bucket': self.bucket_name,
+                'prefix': self.prefix,
+                'shards': self.shards,
+                'saved_at': datetime.now().isoformat(),
+                'object_count': len(items)
+            }
+
+        temp_path = f"{self.index_path}.tmp"
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(json.dumps(header) + '\n')
+            for key, (size, etag, modified) in items:
+                f.write(f"{key}\t{size}\t{etag}\t{modified}\n")
+        os.replace(temp_path, self.index_path)
+
+        self.dirty = False
+        logger.info(f"💾 Inventory snapshot saved: {len(items):,} objects -> {self.index_path}")
+
+    # ------------------------------------------------------------------
+    # Listing
+    # ------------------------------------------------------------------
+
+    def root_prefix(self):
+        return f"{self.prefix}/" if self.prefix else ''
+
+    def list_common_prefixes(self, prefix):
+        """Immediate 'sub-directories' of a prefix"""
+        prefixes = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/'):
+            if self.rate_limiter:
+                self.rate_limiter()
+            prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        return prefixes
+
+    def discover_shards(self):
+        """Second-level prefixes under the root (<prefix>/<city>/<map_type>/), plus level shards
+        for the objects directly at the root and city levels"""
+        shards = [level_shard(self.root_prefix())]
+        for city_prefix in self.list_common_prefixes(self.root_prefix()):
+            sub_prefixes = self.list_common_prefixes(city_prefix)
+            if sub_prefixes:
+                shards.append(level_shard(city_prefix))
+                shards.extend(sub_prefixes)
+            else:
+                shards.append(city_prefix)
+        return shards
+
+    def list_shard(self, shard):
+        """Fully paginated listing of one shard (only the prefix's own level for level shards)"""
+        prefix, is_level = split_shard(shard)
+        objects = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        params = {'Bucket': self.bucket_name, 'Prefix': prefix, 'PaginationConfig': {'PageSize': 1000}}
+        if is_level:
+            params['Delimiter'] = '/'
+        for page in paginator.paginate(**params):
+            if self.rate_limiter:
+                self.rate_limiter()
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = (
+                    obj.get('Size', 0),
+                    obj.get('ETag', '').strip('"'),
+                    int(obj['LastModified'].timestamp()) if obj.get('LastModified') else 0
+                )
+        return objects
+
+    def refresh(self, max_age_hours=24, shards=None, force=False):
+        """
+        Re-list stale shards in parallel
+
+        Args:
+            max_age_hours: Shards refreshed more recently than this are kept
+            shards: Explicit shard prefixes to refresh (default: discover all)
+            force: Refresh every shard regardless of age
+        """
+        start_time = time.time()
+        all_shards = shards if shards is not None else self.discover_shards()
+        cutoff = time.time() - max_age_hours * 3600
+        stale = [s for s in all_shards if force or self.shards.get(s, 0) < cutoff]
+
+        if shards is None:
+            # Shards that vanished from the bucket
+            for gone in set(self.shards) - set(all_shards):
+                self.replace_shard(gone, {})
+                self.shards.pop(gone, None)
+
+        if not stale:
+            logger.info(f"📋 Inventory up to date ({len(all_shards)} shards, {len(self.objects):,} objects)")
+            return {'refreshed_shards': 0, 'objects': len(self.objects)}
+
+        logger.info(f"🔍 Refreshing {len(stale)}/{len(all_shards)} inventory shards with {self.max_workers} workers")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_shard = {executor.submit(self.list_shard, shard): shard for shard in stale}
+            for future in as_completed(future_to_shard):
+                shard = future_to_shard[future]
+                try:
+                    self.replace_shard(shard, future.result())
+                    self.shards[shard] = int(time.time())
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not list shard {shard}: {e}")
+
+        self.save()
+        logger.info(
+            f"✅ Inventory refreshed: {len(stale)} shards, {len(self.objects):,} objects "
+            f"in {time.time() - start_time:.1f}s"
+        )
+        return {'refreshed_shards': len(stale), 'objects': len(self.objects)}
+
+    def replace_shard(self, shard, objects):
+        """Swap every object under a shard for a fresh listing"""
+        prefix, is_level = split_shard(shard)
+        with self._lock:
+            for key in list(self.keys_under(prefix)):
+                if is_level and '/' in key[len(prefix):]:
+                    continue  # Belongs to a deeper shard
+                if key not in objects:
+                    del self.objects[key]
+            self.objects.update(objects)
+            self._sorted_keys = None
+            self.dirty = True
+
+    def is_fresh(self, max_age_hours=24):
+        """True when a snapshot exists and every shard is younger than max_age_hours"""
+        cutoff = time.time() - max_age_hours * 3600
+        return bool(self.shards) and all(ts >= cutoff for ts in self.shards.values())
+
+    def ensure_fresh(self, max_age_hours=24):
+        """Load-or-refresh helper for callers that only need 'recent enough'"""
+        if not self.is_fresh(max_age_hours):
+            self.refresh(max_age_hours)
+        return self
+
+    # ------------------------------------------------------------------
+    # Local updates
+    # ------------------------------------------------------------------
+
+    def record_put(self, key, size, etag='', last_modified=None):
+        """Record an object we just uploaded"""
+        with self._lock:
+            if key not in self.objects:
+                self._sorted_keys = None
+            self.objects[key] = (size, etag, int(last_modified or time.time()))
+            self.dirty = True
+
+    def record_delete(self, key):
+        """Record an object we just deleted"""
+        with self._lock:
+            if self.objects.pop(key, None) is not None:
+                self._sorted_keys = None
+                self.dirty = True
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def exists(self, key):
+        return key in self.objects
+
+    def get(self, key):
+        """(size, etag, last_modified_epoch) or None"""
+        return self.objects.get(key)
+
+    def keys_under(self, prefix):
+        """Keys starting with prefix, in sorted order"""
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.objects)
+        keys = self._sorted_keys
+        index = bisect.bisect_left(keys, prefix)
+        while index < len(keys) and keys[index].startswith(prefix):
+            yield keys[index]
+            index += 1
+
+    def summarize_prefix(self, prefix, sample_size=3):
+        """File count, total size and a few sample keys under a prefix"""
+        file_count = 0
+        total_size = 0
+        sample_files = []
+        for key in self.keys_under(prefix):
+            file_count += 1
+            total_size += self.objects[key][0]
+            if len(sample_files) < sample_size:
+                sample_files.append(key)
+        return {
+            'exists': file_count > 0,
+            'file_count': file_count,
+            'total_size': total_size,
+            'sample_files': sample_files
+        }
+
+    def iter_objects(self, prefix=''):
+        """list_objects_v2-style dicts for every key under prefix"""
+        for key in self.keys_under(prefix):
+            size, etag, modified = self.objects[key]
+            yield {
+                'Key': key,
+                'Size': size,
+                'ETag': f'"{etag}"',
+                'LastModified': datetime.fromtimestamp(modified)
+            }
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Diff-based sync for Digital Ocean Spaces
+Local tree -> prefix, or prefix -> prefix (layout migrations), computed from
+the bucket inventory snapshot and applied with server-side copy_object,
+uploads only where the content is not already in the bucket, and batched
+deletes
+
+Author: AI Assistant
+Version: 1.0 - Inventory Sync
+
+Same shared rate limiter, ledger and inventory bookkeeping as the uploaders.
+Deletes only happen with delete=True and only for tile keys.
+"""
+
+import os
+import re
+import json
+import logging
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from spaces_inventory import SpacesInventory, DEFAULT_INVENTORY_PATH
+from combination_completeness import remote_matches
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INVENTORY_ROOT = 'guland-tiles'  # Root whose snapshot lives in DEFAULT_INVENTORY_PATH
+DELETE_BATCH = 1000                      # delete_objects limit
+
+
+def prefix_root(prefix):
+    return prefix.strip('/').split('/')[0] if prefix.strip('/') else ''
+
+
+def as_dir_prefix(prefix):
+    prefix = prefix.strip('/')
+    return f"{prefix}/" if prefix else ''
+
+
+def local_to_key(local_path, local_dir, s3_prefix):
+    """S3 key (or key prefix, for a directory) of a local path, same mapping as the uploader scan"""
+    rel_path = os.path.relpath(local_path, local_dir).replace('\\', '/')
+    if rel_path == '.':
+        return s3_prefix.strip('/')
+    return f"{s3_prefix.strip('/')}/{rel_path}" if s3_prefix.strip('/') else rel_path
+
+
+def under_any(key, failed_keys):
+    """True when key is one of failed_keys or lies below one of them"""
+    return any(key == failed or key.startswith(as_dir_prefix(failed)) for failed in failed_keys)
+
+
+class SpacesSync:
+    def __init__(self, uploader, workers=16, delete=False, dry_run=False):
+        """
+        Args:
+            uploader: EnhancedMultiMapSpacesUploader (client, rate limiter, ledger, scanner)
+            workers: Parallel copy/upload/delete requests
+            delete: Remove destination tiles that are not in the source
+            dry_run: Only compute and print the plan
+        """
+        self.uploader = uploader
+        self.s3_client = uploader.s3_client
+        self.bucket_name = uploader.bucket_name
+        self.rate_limiter = uploader.rate_limiter
+        self.ledger = uploader.ledger
+        self.workers = workers
+        self.delete = delete
+        self.dry_run = dry_run
+        self.inventories = {}
+        self.dest_inventory = None  # Inventory of the prefix being written, set by the plan
+
+        self.stats = {
+            'unchanged': 0, 'copied': 0, 'uploaded': 0, 'deleted': 0, 'failed': 0,
+            'copied_bytes': 0, 'uploaded_bytes': 0, 'scan_errors': 0
+        }
+
+    def inventory_for(self, prefix):
+        """Inventory snapshot covering prefix (one per top-level root)"""
+        root = prefix_root(prefix)
+        if root not in self.inventories:
+            if root == DEFAULT_INVENTORY_ROOT:
+                index_path = DEFAULT_INVENTORY_PATH
+            else:
+                index_path = f"spaces_inventory_{re.sub(r'[^A-Za-z0-9_.-]', '_', root) or 'bucket'}.tsv.gz"
+            inventory = SpacesInventory(
+                self.s3_client, self.bucket_name, prefix=root, index_path=index_path,
+                rate_limiter=self.rate_limiter.for_operation('LIST')
+            )
+            inventory.ensure_fresh(self.uploader.inventory_max_age_hours)
+            self.inventories[root] = inventory
+        return self.inventories[root]
+
+    def is_tile_key(self, key, root, target_cities=None, target_map_types=None, target_zoom_levels=None):
+        """
+        Keys laid out exactly as <root><city>/<map_type>/[<district>/]<zoom>/<tile> and passing
+        the filters - nothing else is ever copied or deleted (e.g. another layout nested below root)
+        """
+        if self.uploader.should_skip_file(key.rsplit('/', 1)[-1]):
+            return False
+        parts = key[len(root):].split('/')
+        expected_depth = 5 if len(parts) > 1 and parts[1] == 'kh-2025' else 4
+        if len(parts) != expected_depth or not parts[-2].isdigit():
+            return False
+        zoom = parts[-2]
+        path_info = {'city': parts[0], 'map_type': parts[1], 'zoom': zoom}
+        return self.uploader.passes_filters(path_info, target_cities, target_map_types, target_zoom_levels)
+
+    # ------------------------------------------------------------------
+    # Diffs
+    # ------------------------------------------------------------------
+
+    def plan_local(self, local_dir, s3_prefix, copy_from=None, target_cities=None, target_map_types=None,
+                   target_zoom_levels=None):
+        """Local tree -> s3_prefix: copy content the bucket already has elsewhere, upload the rest"""
+        remote = self.dest_inventory = self.inventory_for(s3_prefix)
+        root = as_dir_prefix(s3_prefix)
+
+        # MD5 -> existing key, for server-side copies instead of uploads
+        copy_sources = {}
+        for source_prefix in filter(None, [copy_from, s3_prefix]):
+            inventory = self.inventory_for(source_prefix)
+            for obj in inventory.iter_objects(as_dir_prefix(source_prefix)):
+                etag = obj['ETag'].strip('"')
+                if etag and '-' not in etag:
+                    copy_sources.setdefault(etag, (obj['Key'], inventory))
+
+        plan = {'copy': [], 'upload': [], 'delete': []}
+        local_keys = set()
+        scan_errors = []  # Unreadable directories and unhashable tiles: their remote keys must survive --delete
+        for file_data in self.uploader.iter_scanned_files(local_dir, s3_prefix, target_cities, target_map_types,
+                                                          target_zoom_levels, scan_errors=scan_errors):
+            key = file_data['s3_key']
+            local_keys.add(key)
+            existing = remote.get(key)
+            if existing and remote_matches(existing, file_data['file_info']['size'], file_data['file_info']['md5']):
+                self.stats['unchanged'] += 1
+                continue
+
+            source = copy_sources.get(file_data['file_info']['md5'])
+            if source and source[0] != key:
+                plan['copy'].append((source[0], key, file_data['file_info']['size'], file_data['file_info']['md5'], file_data))
+            else:
+                plan['upload'].append(file_data)
+
+        failed_keys = {local_to_key(path, local_dir, s3_prefix) for path in scan_errors}
+        local_keys.update(failed_keys)
+        self.stats['scan_errors'] = len(scan_errors)
+
+        if self.delete:
+            if failed_keys:
+                logger.warning(
+                    f"⚠️ Local scan incomplete ({len(scan_errors):,} unreadable paths) - "
+                    f"remote tiles under them are kept, not deleted"
+                )
+            plan['delete'] = [
+                key for key in remote.keys_under(root)
+                if key not in local_keys and self.is_tile_key(key, root, target_cities, target_map_types, target_zoom_levels)
+                and not under_any(key, failed_keys)
+            ]
+        return plan
+
+    def plan_prefixes(self, source_prefix, dest_prefix, target_cities=None, target_map_types=None, target_zoom_levels=None):
+        """source_prefix -> dest_prefix, entirely server-side"""
+        source = self.inventory_for(source_prefix)
+        dest = self.dest_inventory = self.inventory_for(dest_prefix)
+        source_root = as_dir_prefix(source_prefix)
+        dest_root = as_dir_prefix(dest_prefix)
+
+        plan = {'copy': [], 'upload': [], 'delete': []}
+        relative_keys = set()
+        for key in source.keys_under(source_root):
+            if not self.is_tile_key(key, source_root, target_cities, target_map_types, target_zoom_levels):
+                continue
+            relative = key[len(source_root):]
+            relative_keys.add(relative)
+            size, etag, _ = source.get(key)
+            existing = dest.get(dest_root + relative)
+            if existing and existing[0] == size and existing[1] == etag:
+                self.stats['unchanged'] += 1
+                continue
+            plan['copy'].append((key, dest_root + relative, size, etag))
+
+        if self.delete:
+            plan['delete'] = [
+                key for key in dest.keys_under(dest_root)
+                if key[len(dest_root):] not in relative_keys
+                and self.is_tile_key(key, dest_root, target_cities, target_map_types, target_zoom_levels)
+            ]
+        return plan
+
+    # ------------------------------------------------------------------
+    # Apply
+    # ------------------------------------------------------------------
+
+    def copy_object(self, source_key, dest_key, size, etag, file_data=None):
+        """Server-side copy; with file_data the destination gets the headers an upload of that file would set"""
+        if file_data:
+            extra_args = self.uploader.build_upload_extra_args(
+                file_data['local_path'], dest_key, file_data['file_info'], file_data['city'],
+                file_data['map_type'], file_data['zoom'], file_data.get('district')
+            )
+            extra_args['MetadataDirective'] = 'REPLACE'
+        else:
+            extra_args = {'ACL': 'public-read', 'MetadataDirective': 'COPY'}  # Prefix migration: same tile, same headers
+
+        self.rate_limiter.acquire('COPY')
+        try:
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name, Key=dest_key,
+                CopySource={'Bucket': self.bucket_name, 'Key': source_key},
+                **extra_args
+            )
+        except Exception as e:
+            self.rate_limiter.check_error('COPY', e)
+            raise
+        self.dest_inventory.record_put(dest_key, size, etag)
+        self.ledger.record_upload(dest_key, etag, size)
+        return size
+
+    def upload_file(self, file_data):
+        result = self.uploader.upload_single_file_optimized(
+            file_data['local_path'], file_data['s3_key'], file_data['file_info'], file_data['city'],
+            file_data['map_type'], file_data['zoom'], file_data.get('district'), force=True
+        )
+        if not result['success']:
+            raise RuntimeError(result.get('error'))
+        file_info = file_data['file_info']
+        self.dest_inventory.record_put(file_data['s3_key'], file_info['size'], file_info['md5'])
+        return file_info['size']
+
+    def delete_batch(self, keys):
+        self.rate_limiter.acquire('DELETE')
+        try:
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+            )
+        except Exception as e:
+            self.rate_limiter.check_error('DELETE', e)
+            raise
+        failed = {error['Key'] for error in response.get('Errors', [])}
+        deleted = [key for key in keys if key not in failed]
+        for key in deleted:
+            self.dest_inventory.record_delete(key)
+        self.ledger.forget(deleted)
+        return len(deleted), len(failed)
+
+    def run_parallel(self, tasks, on_done):
+        """Run (callable, args, label) tasks with a bounded in-flight window"""
+        tasks = iter(tasks)
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for task, args, label in tasks:
+                window.append((executor.submit(task, *args), label))
+                if len(window) >= self.workers * 2:
+                    wait([future for future, _ in window], return_when=FIRST_COMPLETED)
+                    self.collect_done(window, on_done)
+            while window:
+                wait([future for future, _ in window], return_when=FIRST_COMPLETED)
+                self.collect_done(window, on_done)
+
+    def collect_done(self, window, on_done):
+        for _ in range(len(window)):
+            future, label = window.popleft()
+            if not future.done():
+                window.append((future, label))
+                continue
+            try:
+                on_done(label, future.result())
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.warning(f"⚠️ Sync {label[0]} failed for {label[1]}: {e}")
+
+    def apply(self, plan):
+        """Execute a plan: copies and uploads first, deletes last"""
+        def on_done(label, value):
+            kind = label[0]
+            if kind == 'copy':
+                self.stats['copied'] += 1
+                self.stats['copied_bytes'] += value
+            elif kind == 'upload':
+                self.stats['uploaded'] += 1
+                self.stats['uploaded_bytes'] += value
+            else:
+                deleted, failed = value
+                self.stats['deleted'] += deleted
+                self.stats['failed'] += failed
+
+        copies = ((self.copy_object, item, ('copy', item[1])) for item in plan['copy'])
+        uploads = ((self.upload_file, (item,), ('upload', item['s3_key'])) for item in plan['upload'])
+        self.run_parallel(copies, on_done)
+        self.run_parallel(uploads, on_done)
+
+        deletes = plan['delete']
+        batches = (
+            (self.delete_batch, (deletes[i:i + DELETE_BATCH],), ('delete', deletes[i]))
+            for i in range(0, len(deletes), DELETE_BATCH)
+        )
+        self.run_parallel(batches, on_done)
+
+        self.ledger.flush()
+        for inventory in self.inventories.values():
+            if inventory.dirty:
+                inventory.save()
+
+    def sync(self, plan, description):
+        """Print the plan, apply it (unless dry run) and save a report"""
+        logger.info(
+            f"🔄 Sync {description}: {len(plan['copy']):,} server-side copies, {len(plan['upload']):,} uploads, "
+            f"{len(plan['delete']):,} deletes, {self.stats['unchanged']:,} unchanged"
+        )
+        if self.dry_run:
+            for kind in ('copy', 'upload', 'delete'):
+                for item in plan[kind][:5]:
+                    label = item['s3_key'] if kind == 'upload' else item if kind == 'delete' else f"{item[0]} -> {item[1]}"
+                    print(f"   {kind}: {label}")
+            return self.stats
+
+        start_time = datetime.now()
+        self.apply(plan)
+        duration = (datetime.now() - start_time).total_seconds()
+
+        report = {
+            'session_info': {
+                'mode': 'sync',
+                'description': description,
+                'timestamp': datetime.now().isoformat(),
+                'duration_seconds': duration,
+                'delete_enabled': self.delete
+            },
+            'summary': self.stats,
+            'rate_limits': self.rate_limiter.get_stats()
+        }
+        report_file = f"spaces_sync_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        logger.info(
+            f"✅ Sync done in {duration:.1f}s: {self.stats['copied']:,} copied, {self.stats['uploaded']:,} uploaded, "
+            f"{self.stats['deleted']:,} deleted, {self.stats['failed']:,} failed (report: {report_file})"
+        )
+        return self.stats
+
+    def sync_local(self, local_dir, s3_prefix, copy_from=None, target_cities=None, target_map_types=None, target_zoom_levels=None):
+        if not os.path.isdir(local_dir):
+            logger.error(f"Directory not found: {local_dir}")
+            return self.stats
+        plan = self.plan_local(local_dir, s3_prefix, copy_from, target_cities, target_map_types, target_zoom_levels)
+        return self.sync(plan, f"{local_dir} -> {s3_prefix or '(bucket root)'}")
+
+    def sync_prefixes(self, source_prefix, dest_prefix, target_cities=None, target_map_types=None, target_zoom_levels=None):
+        plan = self.plan_prefixes(source_prefix, dest_prefix, target_cities, target_map_types, target_zoom_levels)
+        return self.sync(plan, f"{source_prefix} -> {dest_prefix}")
@@ -14,8 +14,10 @@ import hashlib
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 from pathlib import Path
+import time
 import logging
 from datetime import datetime
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -183,6 +185,44 @@ class GulandTileDownloader:
             logger.warning(f"⚠️ Error validating image file {filepath}: {e}")
             return False
     
+    def fetch_tile_to_file(self, url, headers, filepath):
+        """
+        Stream one tile to filepath, recording latency, status, bytes and disk write time per host
+        
+        Returns:
+            (content_type, bytes written) - bytes is None for a non-image response (nothing written)
+        """
+        started = time.perf_counter()
+        status = 'error'
+        total_size = 0
+        try:
+            with metrics.TILES_IN_FLIGHT.track_inprogress(engine='guland'):
+                response = requests.get(url, headers=headers, timeout=self.download_timeout, stream=True)
+                status = response.status_code
+                response.raise_for_status()
+                
+                # Enhanced content validation
+                content_type = response.headers.get('content-type', '').lower()
+                if not any(img_type in content_type for img_type in ['image/', 'application/octet-stream']):
+                    return content_type, None
+                
+                # Write file with progress tracking
+                write_seconds = 0.0
+                with open(filepath, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            write_started = time.perf_counter()
+                            f.write(chunk)
+                            write_seconds += time.perf_counter() - write_started
+                            total_size += len(chunk)
+                metrics.DISK_WRITE_SECONDS.observe(write_seconds, engine='guland')
+                return content_type, total_size
+        except requests.exceptions.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            metrics.observe_tile('guland', url, status, time.perf_counter() - started, total_size)
+
     def download_single_tile(self, tile_info, location_name):
         """Download a single tile with enhanced error handling"""
         try:
@@ -235,23 +275,11 @@ class GulandTileDownloader:
             elif 'cmctelecom.vn' in url:
                 headers['X-Requested-With'] = 'XMLHttpRequest'
             
-            response = requests.get(url, headers=headers, timeout=self.download_timeout, stream=True)
-            response.raise_for_status()
-            
-            # Enhanced content validation
-            content_type = response.headers.get('content-type', '').lower()
-            if not any(img_type in content_type for img_type in ['image/', 'application/octet-stream']):
+            content_type, total_size = self.fetch_tile_to_file(url, headers, filepath)
+            if total_size is None:
                 logger.warning(f"⚠️ Non-image response for {filename}: {content_type}")
                 return {'success': False, 'error': f'Non-image content: {content_type}', 'tile_type': tile_type}
             
-            # Write file with progress tracking
-            total_size = 0
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total_size += len(chunk)
-            
             # Validate downloaded file
             if total_size == 0:
                 os.remove(filepath)
@@ -293,6 +321,7 @@ class GulandTileDownloader:
         failed_downloads = 0
         total_bytes = 0
         
+        metrics.CRAWL_QUEUE_DEPTH.inc(len(tile_urls), engine='guland')
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # Submit all download tasks
             future_to_tile = {
@@ -302,6 +331,7 @@ class GulandTileDownloader:
             
             # Process completed downloads
             for future in as_completed(future_to_tile):
+                metrics.CRAWL_QUEUE_DEPTH.dec(engine='guland')
                 tile_info = future_to_tile[future]
                 
                 try:
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Tile pack upload mode for Digital Ocean Spaces
+Bundles every tile of a <city>/<map_type>/[<district>/]<zoom> folder into a
+few large pack objects (streaming multipart upload) plus a JSON index, so a
+million tiles cost thousands of requests instead of a million PUTs
+
+Author: AI Assistant
+Version: 1.0 - Tile Packs
+
+Layout (next to where the individual tiles would live):
+    <s3_prefix>/<city>/<map_type>/[<district>/]<zoom>/_pack/tiles-0000.pack
+    <s3_prefix>/<city>/<map_type>/[<district>/]<zoom>/_pack/index.json
+
+A pack is the raw tile bytes back to back (no header). index.json maps each
+tile file name to [pack_number, offset, length, md5], so a client fetches one
+tile with:  Range: bytes=<offset>-<offset + length - 1>
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from itertools import groupby
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+PACK_FORMAT = 'guland-tilepack/1'
+PACK_DIR = '_pack'
+DEFAULT_PART_SIZE = 16 * 1024 * 1024       # Multipart part size (S3 minimum is 5 MB)
+DEFAULT_MAX_PACK_BYTES = 2 * 1024 ** 3    # Roll over to a new pack object after 2 GB
+
+
+def pack_group_key(file_data):
+    return (file_data['city'], file_data['map_type'], file_data.get('district'), file_data['zoom'])
+
+
+class PackWriter:
+    def __init__(self, packer, key, metadata):
+        """One pack object; switches to multipart once more than one part is buffered"""
+        self.packer = packer
+        self.key = key
+        self.metadata = metadata
+        self.buffer = bytearray()
+        self.size = 0
+        self.upload_id = None
+        self.parts = []
+        self.in_flight = deque()
+
+    def write(self, body):
+        """Append a tile; returns its offset in the pack"""
+        offset = self.size
+        self.buffer += body
+        self.size += len(body)
+        if len(self.buffer) >= self.packer.part_size:
+            self.flush_part()
+        return offset
+
+    def flush_part(self):
+        if self.upload_id is None:
+            self.packer.rate_limiter.acquire('PUT')
+            response = self.packer.s3_client.create_multipart_upload(
+                Bucket=self.packer.bucket_name, Key=self.key, **self.packer.object_args('application/octet-stream', self.metadata)
+            )
+            self.upload_id = response['UploadId']
+
+        part_number = len(self.in_flight) + len(self.parts) + 1
+        body, self.buffer = bytes(self.buffer), bytearray()
+        self.in_flight.append(self.packer.executor.submit(self.upload_part, part_number, body))
+        self.packer.stats['requests'] += 1
+
+        # Bounded window: at most part_workers parts buffered in memory
+        while len(self.in_flight) >= self.packer.part_workers:
+            wait(self.in_flight, return_when=FIRST_COMPLETED)
+            self.collect_done()
+
+    def upload_part(self, part_number, body):
+        self.packer.rate_limiter.acquire('PUT')
+        response = self.packer.s3_client.upload_part(
+            Bucket=self.packer.bucket_name, Key=self.key, PartNumber=part_number,
+            UploadId=self.upload_id, Body=body
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def collect_done(self):
+        for _ in range(len(self.in_flight)):
+            future = self.in_flight.popleft()
+            if future.done():
+                self.parts.append(future.result())
+            else:
+                self.in_flight.append(future)
+
+    def close(self):
+        """Upload what is left and complete the object"""
+        if self.upload_id is None:
+            # Small pack - a single PUT
+            self.packer.rate_limiter.acquire('PUT')
+            self.packer.s3_client.put_object(
+                Bucket=self.packer.bucket_name, Key=self.key, Body=bytes(self.buffer),
+                **self.packer.object_args('application/octet-stream', self.metadata)
+            )
+            self.packer.stats['requests'] += 1
+            return
+
+        if self.buffer:
+            self.flush_part()
+        wait(self.in_flight)
+        self.collect_done()
+        self.packer.rate_limiter.acquire('PUT')
+        self.packer.s3_client.complete_multipart_upload(
+            Bucket=self.packer.bucket_name, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': sorted(self.parts, key=lambda part: part['PartNumber'])}
+        )
+        self.packer.stats['requests'] += 2  # create + complete
+
+    def abort(self):
+        for future in self.in_flight:
+            future.cancel()
+        if self.upload_id:
+            try:
+                self.packer.s3_client.abort_multipart_upload(
+                    Bucket=self.packer.bucket_name, Key=self.key, UploadId=self.upload_id
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not abort multipart upload of {self.key}: {e}")
+
+
+class TilePackUploader:
+    def __init__(self, uploader, part_size=DEFAULT_PART_SIZE, max_pack_bytes=DEFAULT_MAX_PACK_BYTES, part_workers=4):
+        """
+        Args:
+            uploader: EnhancedMultiMapSpacesUploader (client, ledger, metadata templates, scanner)
+            part_size: Multipart part size in bytes
+            max_pack_bytes: Size at which a group continues in a new pack object
+            part_workers: Parts uploaded concurrently per pack
+        """
+        self.uploader = uploader
+        self.s3_client = uploader.s3_client
+        self.bucket_name = uploader.bucket_name
+        self.rate_limiter = uploader.rate_limiter
+        self.part_size = part_size
+        self.max_pack_bytes = max_pack_bytes
+        self.part_workers = part_workers
+        self.executor = None
+
+        self.stats = {'groups': 0, 'groups_unchanged': 0, 'groups_failed': 0, 'packs': 0,
+                      'tiles': 0, 'bytes': 0, 'requests': 0}
+
+    @staticmethod
+    def object_args(content_type, metadata):
+        return {
+            'ACL': 'public-read',
+            'ContentType': content_type,
+            'CacheControl': 'max-age=31536000, public',
+            'Metadata': metadata
+        }
+
+    def upload_packs(self, local_dir, s3_prefix='', target_cities=None, target_map_types=None,
+                     target_zoom_levels=None, dry_run=False):
+        """Pack and upload every zoom folder under local_dir"""
+        logger.info(f"📦 Tile pack upload: {local_dir} -> {self.bucket_name}/{s3_prefix}")
+        scanned = self.uploader.iter_scanned_files(local_dir, s3_prefix, target_cities, target_map_types, target_zoom_levels)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.part_workers)
+        try:
+            # The scanner yields each zoom directory as one contiguous run
+            for group, tiles in groupby(scanned, key=pack_group_key):
+                self.upload_group(group, list(tiles), dry_run)
+        finally:
+            self.executor.shutdown(wait=True)
+            self.uploader.ledger.flush()
+
+        logger.info(
+            f"📦 {self.stats['groups']:,} folders packed into {self.stats['packs']:,} packs "
+            f"({self.stats['tiles']:,} tiles, {self.stats['bytes'] / 1024 / 1024:.1f} MB) with "
+            f"{self.stats['requests']:,} requests; {self.stats['groups_unchanged']:,} unchanged, "
+            f"{self.stats['groups_failed']:,} failed"
+        )
+        return self.stats
+
+    def upload_group(self, group, tiles, dry_run=False):
+        city, map_type, district, zoom = group
+        tiles.sort(key=lambda file_data: os.path.basename(file_data['local_path']))
+        pack_prefix = f"{os.path.dirname(tiles[0]['s3_key'])}/{PACK_DIR}"
+        index_key = f"{pack_prefix}/index.json"
+
+        signature = hashlib.md5(
+            '\n'.join(f"{os.path.basename(t['local_path'])}:{t['file_info']['md5']}" for t in tiles).encode('utf-8')
+        ).hexdigest()
+        if self.uploader.ledger.get_meta(f"tile_pack:{index_key}") == signature:
+            self.stats['groups_unchanged'] += 1
+            return
+
+        if dry_run:
+            total = sum(t['file_info']['size'] for t in tiles)
+            logger.info(f"🔍 Would pack {len(tiles):,} tiles ({total / 1024 / 1024:.1f} MB) into {pack_prefix}/")
+            return
+
+        metadata = dict(self.uploader.metadata_templates.template(city, map_type, zoom, district))
+        metadata.update({'pack-format': PACK_FORMAT.replace('/', '-'), 'pack-signature': signature})
+
+        index = {
+            'format': PACK_FORMAT,
+            'city': city,
+            'map_type': map_type,
+            'district': district,
+            'zoom': zoom,
+            'created': datetime.now().isoformat(),
+            'packs': [],
+            'tiles': {}
+        }
+        writer = None
+        pack_sizes = []
+        try:
+            for file_data in tiles:
+                with open(file_data['local_path'], 'rb') as f:
+                    body = f.read()
+
+                if writer is None or (writer.size and writer.size + len(body) > self.max_pack_bytes):
+                    if writer:
+                        writer.close()
+                        pack_sizes.append(writer.size)
+                    pack_key = f"{pack_prefix}/tiles-{len(index['packs']):04d}.pack"
+                    writer = PackWriter(self, pack_key, metadata)
+                    index['packs'].append(pack_key)
+
+                offset = writer.write(body)
+                index['tiles'][os.path.basename(file_data['local_path'])] = [
+                    len(index['packs']) - 1, offset, len(body), file_data['file_info']['md5']
+                ]
+                self.stats['bytes'] += len(body)
+            writer.close()
+            pack_sizes.append(writer.size)
+
+            # Index last: a client never sees an index pointing into a missing pack
+            index_body = json.dumps(index, separators=(',', ':')).encode('utf-8')
+            self.rate_limiter.acquire('PUT')
+            self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=index_key, Body=index_body,
+                **self.object_args('application/json', metadata)
+            )
+            self.stats['requests'] += 1
+
+        except Exception as e:
+            logger.error(f"❌ Could not pack {pack_prefix}: {e}")
+            self.rate_limiter.check_error('PUT', e)
+            if writer:
+                writer.abort()
+            self.stats['groups_failed'] += 1
+            return
+
+        for pack_key, pack_size in zip(index['packs'], pack_sizes):
+            self.uploader.ledger.record_upload(pack_key, signature, pack_size)
+        self.uploader.ledger.record_upload(index_key, signature, len(index_body))
+        self.uploader.ledger.set_meta(f"tile_pack:{index_key}", signature)
+
+        self.stats['groups'] += 1
+        self.stats['packs'] += len(index['packs'])
+        self.stats['tiles'] += len(tiles)
+        logger.info(f"📦 {pack_prefix}: {len(tiles):,} tiles in {len(index['packs'])} pack(s)")
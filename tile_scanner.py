@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Streaming tile directory scanner
+Walks downloaded_tiles/cities/<city>/<map_type>/[<district>/]<zoom>/ with
+os.scandir and yields tiles while the walk is still running
+
+Author: AI Assistant
+Version: 1.0 - Streaming Scanner
+
+Directory entries are classified from d_type (no stat per entry); the only
+stat per tile is the one whose size/mtime the hash cache needs anyway. Zoom
+directories are scanned by a small thread pool with a bounded window, so
+memory stays flat and the first tiles are available after one directory.
+Directories and files that cannot be read are appended to an optional errors
+list, so callers that delete remote tiles can tell an incomplete scan apart.
+"""
+
+import os
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+DISTRICT_MAP_TYPE = 'kh-2025'  # <city>/kh-2025/<district>/<zoom>/
+
+
+def list_subdirs(path, errors=None):
+    """Sub-directory entries of path (d_type only, symlinks not followed)"""
+    try:
+        with os.scandir(path) as entries:
+            return [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+    except OSError as e:
+        logger.warning(f"⚠️ Could not scan {path}: {e}")
+        if errors is not None:
+            errors.append(path)
+        return []
+
+
+def iter_zoom_dirs(local_dir, target_cities=None, target_map_types=None, target_zoom_levels=None, errors=None):
+    """Yield (zoom_dir, city, map_type, district, zoom_str) for every zoom directory passing the filters"""
+    for city_entry in list_subdirs(local_dir, errors):
+        if target_cities and city_entry.name not in target_cities:
+            continue
+
+        for map_type_entry in list_subdirs(city_entry.path, errors):
+            map_type = map_type_entry.name
+            if target_map_types and map_type not in target_map_types:
+                continue
+
+            if map_type == DISTRICT_MAP_TYPE:
+                parents = [(district_entry.path, district_entry.name) for district_entry in list_subdirs(map_type_entry.path, errors)]
+            else:
+                parents = [(map_type_entry.path, None)]
+
+            for parent_path, district in parents:
+                for zoom_entry in list_subdirs(parent_path, errors):
+                    try:
+                        zoom_int = int(zoom_entry.name)
+                    except ValueError:
+                        continue
+                    if target_zoom_levels and zoom_int not in target_zoom_levels:
+                        continue
+                    yield zoom_entry.path, city_entry.name, map_type, district, zoom_entry.name
+
+
+def scan_zoom_dir(zoom_dir, city, map_type, district, zoom_str, skip_file=None, errors=None):
+    """[(local_path, city, map_type, district, zoom_str, stat)] for the tiles in one zoom directory"""
+    tiles = []
+    try:
+        with os.scandir(zoom_dir) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if skip_file and skip_file(entry.name):
+                    continue
+                try:
+                    tiles.append((entry.path, city, map_type, district, zoom_str, entry.stat(follow_symlinks=False)))
+                except OSError as e:
+                    logger.warning(f"Error processing file {entry.path}: {e}")
+                    if errors is not None:
+                        errors.append(entry.path)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not scan {zoom_dir}: {e}")
+        if errors is not None:
+            errors.append(zoom_dir)
+    return tiles
+
+
+def iter_tiles(local_dir, target_cities=None, target_map_types=None, target_zoom_levels=None,
+               skip_file=None, workers=8, errors=None):
+    """
+    Stream every tile under local_dir
+
+    Args:
+        local_dir: downloaded_tiles/cities root
+        target_cities / target_map_types / target_zoom_levels: Optional filters
+        skip_file: Callable(filename) -> True to ignore a file
+        workers: Zoom directories scanned concurrently
+        errors: Optional list collecting the paths that could not be read
+
+    Yields:
+        (local_path, city, map_type, district, zoom_str, stat)
+    """
+    zoom_dirs = iter_zoom_dirs(local_dir, target_cities, target_map_types, target_zoom_levels, errors)
+    max_in_flight = workers * 2
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for zoom_dir in zoom_dirs:
+            window.append(executor.submit(scan_zoom_dir, *zoom_dir, skip_file, errors))
+            while len(window) >= max_in_flight:
+                wait(window, return_when=FIRST_COMPLETED)
+                yield from drain_done(window)
+
+        while window:
+            wait(window, return_when=FIRST_COMPLETED)
+            yield from drain_done(window)
+
+
+def drain_done(window):
+    """Pop finished scans off the window (any order) and yield their tiles"""
+    for _ in range(len(window)):
+        future = window.popleft()
+        if future.done():
+            yield from future.result()
+        else:
+            window.append(future)
+
+
+def prefetch(iterable, max_buffered=5000):
+    """Run a (blocking) producer in a background thread, buffering up to max_buffered items"""
+    items = queue.Queue(maxsize=max_buffered)
+    done = object()
+    stop = threading.Event()
+    errors = []
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put(item, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()  # Stop a generator's own workers when the consumer quit early
+            items.put(done)
+
+    producer = threading.Thread(target=produce, name='tile-scan-prefetch', daemon=True)
+    producer.start()
+    try:
+        while (item := items.get()) is not done:
+            yield item
+    finally:
+        stop.set()
+        # Unblock a producer waiting on a full queue
+        while producer.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    if errors:
+        raise errors[0]
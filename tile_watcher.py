@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Filesystem watcher for the tile download tree
+Reports tile files as they are written under downloaded_tiles/cities so the
+uploader can push them incrementally instead of re-walking the whole tree
+
+Author: AI Assistant
+Version: 1.0 - Watch Mode
+
+Uses Linux inotify directly (ctypes, no extra dependency); on other platforms
+falls back to periodic os.scandir polling.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    def __init__(self, root):
+        """Watch every directory under root (new sub-directories are added as they appear)"""
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self.watches = {}  # wd -> directory
+        self.started_at = time.time()
+        self.add_tree(root)
+        logger.info(f"👀 inotify watching {len(self.watches):,} directories under {root}")
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning("⚠️ inotify watch limit reached - raise fs.inotify.max_user_watches")
+            else:
+                logger.warning(f"⚠️ Could not watch {directory}: {os.strerror(err)}")
+            return
+        self.watches[wd] = directory
+
+    def add_tree(self, directory):
+        """Watch directory and its sub-directories; returns files already inside them"""
+        files = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            self.add_watch(current)
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append(entry.path)
+            except OSError:
+                continue
+        return files
+
+    def read_events(self, timeout):
+        """Paths of files created or written since the last call (waits up to timeout seconds)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped: fall back to one walk for files written since we started
+                logger.warning("⚠️ inotify queue overflow, rescanning for recent files")
+                for path in self.add_tree(self.root):
+                    try:
+                        if os.path.getmtime(path) >= self.started_at - 1:
+                            paths.append(path)
+                    except OSError:
+                        continue
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land in a new directory before its watch exists
+                    paths.extend(self.add_tree(path))
+            else:
+                paths.append(path)
+
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    def __init__(self, root, interval=5.0):
+        """Fallback watcher: rescan root every interval seconds and report new or changed files"""
+        self.root = root
+        self.interval = interval
+        self.seen = self.snapshot()
+        self.last_scan = time.time()
+        logger.info(f"👀 Polling {root} every {interval:.0f}s ({len(self.seen):,} files)")
+
+    def snapshot(self):
+        seen = {}
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat()
+                            seen[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return seen
+
+    def read_events(self, timeout):
+        wait = self.last_scan + self.interval - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(wait, 0))
+
+        current = self.snapshot()
+        self.last_scan = time.time()
+        changed = [path for path, signature in current.items() if self.seen.get(path) != signature]
+        self.seen = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(root, poll_interval=5.0):
+    """inotify where available, polling otherwise"""
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        logger.info(f"ℹ️ inotify unavailable ({e}), falling back to polling")
+        return PollingWatcher(root, poll_interval)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Uploader benchmark harness against a local S3 stand-in
+Generates a synthetic downloaded_tiles/cities tree, starts local_s3_server
+and runs the real upload / ACL code paths with varying worker counts
+
+Author: AI Assistant
+Version: 1.0 - Upload Benchmark
+
+Scenarios (each run in a fresh process and working directory, so ledgers,
+hash caches, inventories and peak RSS never leak between runs):
+    html-threads   html_do_uploader.py thread-pool engine
+    html-async     html_do_uploader.py asyncio engine (needs aiohttp)
+    do-spaces      do_spaces_uploader.py upload_directory
+    acl-fixer      html_do_acl_fixer.py over objects seeded as private
+
+Reported per run: files/s, MB/s, API calls per file (counted by the server),
+CPU ms per file and peak RSS of the uploader process. Rate limits are lifted
+unless --production-rates is given, so the numbers show code overhead.
+
+Usage:
+    python upload_benchmark.py [--cities 3] [--tiles-per-zoom 200] [--workers 4,8,16]
+                               [--scenarios html-threads,do-spaces] [--baseline old_report.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+from local_s3_server import LocalS3Server
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BUCKET = 'guland-tiles'
+S3_PREFIX = 'guland-tiles'
+CREDENTIALS = {'access_key': 'benchmark', 'secret_key': 'benchmark', 'region': 'sgp1'}
+SCENARIOS = ('html-threads', 'html-async', 'do-spaces', 'acl-fixer')
+UNLIMITED_RATE = 1_000_000
+REGRESSION_THRESHOLD = 0.10  # Flag runs more than 10% slower than the baseline
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+# ----------------------------------------------------------------------
+# Synthetic tile tree
+# ----------------------------------------------------------------------
+
+def generate_tile_tree(root, cities=3, map_types=('qh-2030', 'kh-2025'), zoom_levels=(12, 13),
+                       tiles_per_zoom=200, tile_bytes=8192, districts=2, seed=42):
+    """
+    Write <root>/<city>/<map_type>/[<district>/]<zoom>/<x>_<y>.png
+
+    Tile sizes vary +/-50% around tile_bytes; kh-2025 gets `districts` district
+    folders, as the downloader lays them out. Returns (file_count, total_bytes).
+    """
+    rng = random.Random(seed)
+    file_count = total_bytes = 0
+    for city_index in range(cities):
+        city = f"city-{city_index:02d}"
+        for map_type in map_types:
+            parents = [os.path.join(city, map_type)]
+            if map_type == 'kh-2025':
+                parents = [os.path.join(city, map_type, f"district-{d:02d}") for d in range(districts)]
+            for parent in parents:
+                for zoom in zoom_levels:
+                    zoom_dir = os.path.join(root, parent, str(zoom))
+                    os.makedirs(zoom_dir, exist_ok=True)
+                    for tile in range(tiles_per_zoom):
+                        size = max(len(PNG_HEADER), int(tile_bytes * rng.uniform(0.5, 1.5)))
+                        body = PNG_HEADER + rng.randbytes(size - len(PNG_HEADER))
+                        with open(os.path.join(zoom_dir, f"{102000 + tile}_{57000 + tile % 97}.png"), 'wb') as f:
+                            f.write(body)
+                        file_count += 1
+                        total_bytes += size
+    return file_count, total_bytes
+
+
+def iter_tree_keys(root):
+    """(s3_key, local_path) for every tile of a generated tree"""
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            local_path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(local_path, root).replace('\\', '/')
+            yield f"{S3_PREFIX}/{rel_path}", local_path
+
+
+# ----------------------------------------------------------------------
+# Child process: one scenario run
+# ----------------------------------------------------------------------
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def run_scenario(spec):
+    """Run one scenario in this process; returns files, bytes, failures, wall and CPU time"""
+    os.chdir(spec['workdir'])
+    sys.path.insert(0, REPO_DIR)
+
+    import rate_limiter
+    if not spec['production_rates']:
+        rate_limiter._shared_limiter = rate_limiter.SpacesRateLimiter(
+            {operation: UNLIMITED_RATE for operation in rate_limiter.DEFAULT_RATES}
+        )
+
+    scenario = spec['scenario']
+    workers = spec['workers']
+    client_args = dict(CREDENTIALS, endpoint_url=spec['endpoint_url'], bucket_name=BUCKET)
+
+    if scenario in ('html-threads', 'html-async'):
+        from html_do_uploader import EnhancedMultiMapSpacesUploader
+        uploader = EnhancedMultiMapSpacesUploader(**client_args)
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        uploader.upload_with_enhanced_filtering(
+            spec['tiles_dir'], S3_PREFIX, max_workers=workers,
+            async_concurrency=workers if scenario == 'html-async' else None
+        )
+        stats = uploader.stats
+        files, size, failed = stats['uploaded_files'], stats['uploaded_bytes'], stats['failed_files']
+
+    elif scenario == 'do-spaces':
+        from do_spaces_uploader import DigitalOceanSpacesUploader
+        uploader = DigitalOceanSpacesUploader(**client_args)
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        uploader.upload_directory(spec['tiles_dir'], S3_PREFIX, max_workers=workers)
+        stats = uploader.stats
+        files, size, failed = stats['uploaded_files'], stats['uploaded_bytes'], stats['failed_files']
+
+    elif scenario == 'acl-fixer':
+        from html_do_acl_fixer import DigitalOceanSpacesACLFixer
+        fixer = DigitalOceanSpacesACLFixer(**client_args)
+        start, cpu_start = time.perf_counter(), cpu_seconds()
+        fixer.fix_bucket_acl(prefix=S3_PREFIX, max_workers=workers)
+        stats = fixer.stats
+        files = stats['fixed_objects'] + stats['public_objects'] + stats['failed_objects']
+        size, failed = stats['fixed_size_bytes'], stats['failed_objects']
+
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    return {
+        'files': files,
+        'bytes': size,
+        'failed': failed,
+        'wall_seconds': time.perf_counter() - start,
+        'cpu_seconds': cpu_seconds() - cpu_start,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+# ----------------------------------------------------------------------
+# Parent: server, matrix and report
+# ----------------------------------------------------------------------
+
+def seed_private_objects(server, tiles_dir):
+    """Put every tile in the bucket with a private ACL (for the ACL fixer)"""
+    for s3_key, local_path in iter_tree_keys(tiles_dir):
+        with open(local_path, 'rb') as f:
+            server.store.seed(BUCKET, s3_key, f.read(), acl='private')
+
+
+def run_once(server, scenario, workers, tiles_dir, production_rates=False, verbose=False):
+    """One scenario run in a child process; returns the measured row"""
+    server.store.reset()
+    if scenario == 'acl-fixer':
+        seed_private_objects(server, tiles_dir)
+
+    workdir = tempfile.mkdtemp(prefix=f"upload_bench_{scenario}_")
+    spec = {
+        'scenario': scenario,
+        'workers': workers,
+        'endpoint_url': server.endpoint_url,
+        'tiles_dir': os.path.abspath(tiles_dir),
+        'workdir': workdir,
+        'production_rates': production_rates
+    }
+    try:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(spec)],
+            stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL, text=True, cwd=workdir
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    row = {'scenario': scenario, 'workers': workers}
+    lines = child.stdout.strip().splitlines()
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        result = {'error': f"exit code {child.returncode}"}
+    row.update(result)
+    if 'error' in row:
+        return row
+
+    calls = server.store.call_counts()
+    files = max(row['files'], 1)
+    wall = max(row['wall_seconds'], 1e-9)
+    row.update({
+        'files_per_second': row['files'] / wall,
+        'mb_per_second': row['bytes'] / 1024 / 1024 / wall,
+        'api_calls': sum(calls.values()),
+        'api_calls_per_file': sum(calls.values()) / files,
+        'api_calls_by_operation': calls,
+        'cpu_ms_per_file': row['cpu_seconds'] / files * 1000
+    })
+    return row
+
+
+def compare_with_baseline(rows, baseline_file):
+    """Mark rows whose files/s dropped more than REGRESSION_THRESHOLD against a previous report"""
+    with open(baseline_file) as f:
+        baseline = {(row['scenario'], row['workers']): row for row in json.load(f)['runs'] if 'error' not in row}
+    for row in rows:
+        previous = baseline.get((row['scenario'], row['workers']))
+        if not previous or 'error' in row:
+            continue
+        change = row['files_per_second'] / previous['files_per_second'] - 1 if previous['files_per_second'] else 0
+        row['baseline_change'] = change
+        row['regression'] = change < -REGRESSION_THRESHOLD
+
+
+def print_table(rows):
+    print("\n📊 UPLOAD BENCHMARK")
+    print("=" * 92)
+    print(f"{'scenario':<14}{'workers':>8}{'files':>8}{'files/s':>10}{'MB/s':>8}{'calls/file':>12}"
+          f"{'CPU ms/file':>13}{'peak RSS MB':>13}{'vs base':>9}")
+    for row in rows:
+        if 'error' in row:
+            print(f"{row['scenario']:<14}{row['workers']:>8}   ❌ {row['error']}")
+            continue
+        change = f"{row['baseline_change'] * 100:+.0f}%" if 'baseline_change' in row else ''
+        flag = ' ⚠️' if row.get('regression') else ''
+        print(f"{row['scenario']:<14}{row['workers']:>8}{row['files']:>8,}{row['files_per_second']:>10.1f}"
+              f"{row['mb_per_second']:>8.2f}{row['api_calls_per_file']:>12.2f}{row['cpu_ms_per_file']:>13.2f}"
+              f"{row['peak_rss_mb']:>13.1f}{change:>9}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Spaces upload paths against a local S3 stand-in')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--workers', default='4,8,16', help='Comma-separated worker counts (default: 4,8,16)')
+    parser.add_argument('--cities', type=int, default=3, help='Synthetic cities (default: 3)')
+    parser.add_argument('--zoom-levels', default='12,13', help='Synthetic zoom levels (default: 12,13)')
+    parser.add_argument('--tiles-per-zoom', type=int, default=200, help='Tiles per zoom folder (default: 200)')
+    parser.add_argument('--tile-kb', type=float, default=8, help='Average tile size in KB (default: 8)')
+    parser.add_argument('--districts', type=int, default=2, help='KH-2025 district folders per city (default: 2)')
+    parser.add_argument('--tiles-dir', help='Use an existing tiles tree instead of generating one')
+    parser.add_argument('--production-rates', action='store_true', help='Keep the production rate limits')
+    parser.add_argument('--baseline', help='Previous upload_benchmark_report_*.json to compare files/s against')
+    parser.add_argument('--verbose', action='store_true', help='Show the uploaders\' own logs')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        # Child process: quiet logs, result as the last stdout line
+        try:
+            result = run_scenario(json.loads(args.run_scenario))
+        except Exception as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+        print(json.dumps(result))
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    worker_counts = [int(workers) for workers in args.workers.split(',')]
+
+    generated_root = None
+    tiles_dir = args.tiles_dir
+    if not tiles_dir:
+        generated_root = tempfile.mkdtemp(prefix='upload_bench_tiles_')
+        tiles_dir = os.path.join(generated_root, 'downloaded_tiles', 'cities')
+        file_count, total_bytes = generate_tile_tree(
+            tiles_dir, cities=args.cities, zoom_levels=[int(z) for z in args.zoom_levels.split(',')],
+            tiles_per_zoom=args.tiles_per_zoom, tile_bytes=int(args.tile_kb * 1024), districts=args.districts
+        )
+        logger.info(f"🧪 Generated {file_count:,} tiles ({total_bytes / 1024 / 1024:.1f} MB) in {tiles_dir}")
+
+    rows = []
+    try:
+        with LocalS3Server(buckets=(BUCKET,)) as server:
+            for scenario in scenarios:
+                for workers in worker_counts:
+                    logger.info(f"🏁 {scenario} with {workers} workers...")
+                    rows.append(run_once(server, scenario, workers, tiles_dir, args.production_rates, args.verbose))
+    finally:
+        if generated_root:
+            shutil.rmtree(generated_root, ignore_errors=True)
+
+    if args.baseline:
+        compare_with_baseline(rows, args.baseline)
+    print_table(rows)
+
+    report_file = f"upload_benchmark_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, 'w') as f:
+        json.dump({
+            'generated': datetime.now().isoformat(),
+            'settings': {key: value for key, value in vars(args).items() if key != 'run_scenario'},
+            'runs': rows
+        }, f, indent=2)
+    print(f"\n📋 Report saved: {report_file}")
+    if any(row.get('regression') for row in rows):
+        print(f"⚠️ Throughput regressions over {REGRESSION_THRESHOLD:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Upload ledger for Digital Ocean Spaces tools
+SQLite (WAL) record of every object we uploaded or fixed, keyed by s3_key
+
+Replaces the JSON resume files (enhanced_upload_resume_state.json,
+acl_fix_resume_state.json) which were rewritten in full on every save.
+Resume checks are indexed lookups and writes are buffered, batched inserts.
+
+Author: AI Assistant
+Version: 1.0 - Upload Ledger
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = 'upload_ledger.db'
+
+
+class UploadLedger:
+    def __init__(self, db_path=DEFAULT_LEDGER_PATH, batch_size=500, flush_interval=5.0):
+        """
+        Open (or create) the ledger
+
+        Args:
+            db_path: SQLite file
+            batch_size: Buffered writes that trigger a commit
+            flush_interval: Seconds after which buffered writes are committed anyway
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._pending_uploads = {}  # s3_key -> row, so lookups see unflushed writes
+        self._pending_acl = {}
+        self._last_flush = time.time()
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.create_tables()
+
+    def create_tables(self):
+        """Create ledger tables and indexes"""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS objects (
+                    s3_key TEXT PRIMARY KEY,
+                    md5 TEXT,
+                    size INTEGER,
+                    acl TEXT,
+                    uploaded_at REAL,
+                    acl_checked_at REAL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_objects_uploaded_at
+                ON objects(uploaded_at)
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS upload_queue (
+                    path TEXT PRIMARY KEY,
+                    detected_at REAL,
+                    attempts INTEGER DEFAULT 0
+                )
+            ''')
+
+    def close(self):
+        """Flush and close"""
+        self.flush()
+        self.conn.close()
+
+    # ------------------------------------------------------------------
+    # Writes (buffered)
+    # ------------------------------------------------------------------
+
+    def record_upload(self, s3_key, md5, size, acl='public-read'):
+        """Record a successful upload"""
+        now = time.time()
+        with self._lock:
+            self._pending_uploads[s3_key] = (s3_key, md5, size, acl, now, now if acl else None)
+            self.maybe_flush()
+
+    def record_acl(self, s3_key, acl, size=None):
+        """Record the ACL we observed or set on an object"""
+        with self._lock:
+            self._pending_acl[s3_key] = (s3_key, size, acl, time.time())
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        pending = len(self._pending_uploads) + len(self._pending_acl)
+        if pending >= self.batch_size or (pending and time.time() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Commit buffered writes in one transaction"""
+        with self._lock:
+            if not self._pending_uploads and not self._pending_acl:
+                return
+            uploads, self._pending_uploads = list(self._pending_uploads.values()), {}
+            acl_updates, self._pending_acl = list(self._pending_acl.values()), {}
+
+            with self.conn:
+                if uploads:
+                    self.conn.executemany('''
+                        INSERT INTO objects (s3_key, md5, size, acl, uploaded_at, acl_checked_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(s3_key) DO UPDATE SET
+                            md5 = excluded.md5, size = excluded.size, acl = excluded.acl,
+                            uploaded_at = excluded.uploaded_at, acl_checked_at = excluded.acl_checked_at
+                    ''', uploads)
+                if acl_updates:
+                    self.conn.executemany('''
+                        INSERT INTO objects (s3_key, size, acl, acl_checked_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(s3_key) DO UPDATE SET
+                            acl = excluded.acl, acl_checked_at = excluded.acl_checked_at,
+                            size = COALESCE(excluded.size, objects.size)
+                    ''', acl_updates)
+
+            self._last_flush = time.time()
+
+    def set_meta(self, name, value):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+
+    def get_meta(self, name, default=None):
+        with self._lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def forget(self, s3_keys):
+        """Drop objects that were deleted from the bucket"""
+        self.flush()
+        with self._lock, self.conn:
+            self.conn.executemany('DELETE FROM objects WHERE s3_key = ?', [(key,) for key in s3_keys])
+
+    def clear_acl_state(self):
+        """Forget ACL verification (forces the ACL fixer to re-check everything)"""
+        self.flush()
+        with self._lock, self.conn:
+            self.conn.execute('UPDATE objects SET acl = NULL, acl_checked_at = NULL')
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def is_uploaded(self, s3_key, md5):
+        """True when s3_key was uploaded with this exact content"""
+        with self._lock:
+            pending = self._pending_uploads.get(s3_key)
+            if pending:
+                return pending[1] == md5
+            row = self.conn.execute('SELECT md5 FROM objects WHERE s3_key = ?', (s3_key,)).fetchone()
+        return bool(row) and row[0] == md5
+
+    def get_acl(self, s3_key):
+        """Last known ACL of an object, or None"""
+        with self._lock:
+            pending = self._pending_acl.get(s3_key)
+            if pending:
+                return pending[2]
+            row = self.conn.execute('SELECT acl FROM objects WHERE s3_key = ?', (s3_key,)).fetchone()
+        return row[0] if row else None
+
+    def count(self, acl=None):
+        self.flush()
+        with self._lock:
+            if acl:
+                return self.conn.execute('SELECT COUNT(*) FROM objects WHERE acl = ?', (acl,)).fetchone()[0]
+            return self.conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Watch-mode upload queue (survives restarts)
+    # ------------------------------------------------------------------
+
+    def queue_add(self, paths, detected_at=None):
+        """Queue local files for upload; already queued paths keep their detection time"""
+        detected_at = detected_at or time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO upload_queue (path, detected_at) VALUES (?, ?)',
+                [(path, detected_at) for path in paths]
+            )
+
+    def queue_remove(self, paths):
+        with self._lock, self.conn:
+            self.conn.executemany('DELETE FROM upload_queue WHERE path = ?', [(path,) for path in paths])
+
+    def queue_retry(self, paths):
+        """Count a failed attempt for each path"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'UPDATE upload_queue SET attempts = attempts + 1 WHERE path = ?', [(path,) for path in paths]
+            )
+
+    def queue_items(self, paths=None):
+        """(path, detected_at, attempts) for the whole queue or the given paths"""
+        with self._lock:
+            if paths is None:
+                return self.conn.execute('SELECT path, detected_at, attempts FROM upload_queue').fetchall()
+            items = []
+            for path in paths:
+                row = self.conn.execute(
+                    'SELECT path, detected_at, attempts FROM upload_queue WHERE path = ?', (path,)
+                ).fetchone()
+                if row:
+                    items.append(row)
+            return items
+
+    def queue_depth(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM upload_queue').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Legacy JSON import
+    # ------------------------------------------------------------------
+
+    def import_legacy_upload_state(self, resume_file):
+        """One-time import of an uploader JSON resume file ("s3_key:md5" entries)"""
+        if not self.should_import(resume_file):
+            return 0
+
+        with open(resume_file, 'r') as f:
+            data = json.load(f)
+        entries = data.get('uploaded_files', []) if isinstance(data, dict) else data
+
+        rows = []
+        for entry in entries:
+            s3_key, _, md5 = entry.rpartition(':')
+            if s3_key:
+                rows.append((s3_key, md5, None, 'public-read', None, None))
+
+        with self._lock:
+            self._pending_uploads.update((row[0], row) for row in rows)
+        self.flush()
+        self.mark_imported(resume_file)
+        logger.info(f"📋 Imported {len(rows):,} uploads from legacy {resume_file}")
+        return len(rows)
+
+    def import_legacy_acl_state(self, resume_file):
+        """One-time import of the ACL fixer JSON resume file"""
+        if not self.should_import(resume_file):
+            return 0
+
+        with open(resume_file, 'r') as f:
+            data = json.load(f)
+
+        now = time.time()
+        rows = [(key, None, 'public-read', now) for key in data.get('processed_objects', [])]
+        with self._lock:
+            self._pending_acl.update((row[0], row) for row in rows)
+        self.flush()
+        self.mark_imported(resume_file)
+        logger.info(f"📋 Imported {len(rows):,} ACL results from legacy {resume_file}")
+        return len(rows)
+
+    def should_import(self, resume_file):
+        if not os.path.exists(resume_file):
+            return False
+        imported = self.get_meta('imported_files', {})
+        return imported.get(os.path.abspath(resume_file)) != os.path.getmtime(resume_file)
+
+    def mark_imported(self, resume_file):
+        imported = self.get_meta('imported_files', {})
+        imported[os.path.abspath(resume_file)] = os.path.getmtime(resume_file)
+        self.set_meta('imported_files', imported)
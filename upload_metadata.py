@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Per-group upload metadata templates for the Spaces uploaders
+Everything that depends only on (city, map_type, district, zoom) is sanitized
+once per group; each file only fills in its name, time, hash and size
+
+Author: AI Assistant
+Version: 1.0 - Metadata Templates
+
+Output is identical to the original per-file create_file_metadata.
+Run metadata_benchmark.py to compare per-file CPU cost.
+"""
+
+import re
+import logging
+import threading
+import unicodedata
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+UPLOADER_VERSION = '2.0-enhanced'
+
+# Fallback used when NFKD + ASCII folding drops most of the value
+VIETNAMESE_REPLACEMENTS = {
+    'đ': 'd', 'Đ': 'D',
+    'ă': 'a', 'â': 'a', 'á': 'a', 'à': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a',
+    'Ă': 'A', 'Â': 'A', 'Á': 'A', 'À': 'A', 'Ả': 'A', 'Ã': 'A', 'Ạ': 'A',
+    'ê': 'e', 'é': 'e', 'è': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
+    'Ê': 'E', 'É': 'E', 'È': 'E', 'Ẻ': 'E', 'Ẽ': 'E', 'Ẹ': 'E',
+    'ô': 'o', 'ơ': 'o', 'ó': 'o', 'ò': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o',
+    'Ô': 'O', 'Ơ': 'O', 'Ó': 'O', 'Ò': 'O', 'Ỏ': 'O', 'Õ': 'O', 'Ọ': 'O',
+    'ư': 'u', 'ú': 'u', 'ù': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
+    'Ư': 'U', 'Ú': 'U', 'Ù': 'U', 'Ủ': 'U', 'Ũ': 'U', 'Ụ': 'U',
+    'í': 'i', 'ì': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
+    'Í': 'I', 'Ì': 'I', 'Ỉ': 'I', 'Ĩ': 'I', 'Ị': 'I',
+    'ý': 'y', 'ỳ': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y',
+    'Ý': 'Y', 'Ỳ': 'Y', 'Ỷ': 'Y', 'Ỹ': 'Y', 'Ỵ': 'Y'
+}
+
+NON_ASCII_RE = re.compile(r'[^\x00-\x7F]')
+SPECIAL_CHARS_RE = re.compile(r'[^\w\-.]')
+MULTI_HYPHEN_RE = re.compile(r'-+')
+SAFE_VALUE_RE = re.compile(r'[A-Za-z0-9_.]+(?:-[A-Za-z0-9_.]+)*')
+
+
+def sanitize_metadata_value(value):
+    """Sanitize metadata value to ensure ASCII-only characters"""
+    if not value:
+        return value
+
+    try:
+        value = str(value)
+
+        # Tile names, hashes and sizes are usually already clean
+        if SAFE_VALUE_RE.fullmatch(value):
+            return value
+
+        if value.isascii():
+            # NFKD leaves ASCII unchanged - skip straight to the clean-up
+            ascii_value = value
+        else:
+            normalized = unicodedata.normalize('NFKD', value)
+            ascii_value = normalized.encode('ascii', 'ignore').decode('ascii')
+
+            # Apply Vietnamese replacements if ASCII conversion failed
+            if not ascii_value or len(ascii_value) < len(value) * 0.5:
+                for vietnamese_char, replacement in VIETNAMESE_REPLACEMENTS.items():
+                    value = value.replace(vietnamese_char, replacement)
+                ascii_value = NON_ASCII_RE.sub('', value)
+
+        # Replace spaces and special characters with hyphens, then collapse them
+        ascii_value = SPECIAL_CHARS_RE.sub('-', ascii_value)
+        ascii_value = MULTI_HYPHEN_RE.sub('-', ascii_value).strip('-')
+
+        return ascii_value if ascii_value else 'unknown'
+
+    except Exception as e:
+        logger.warning(f"⚠️ Error sanitizing metadata value '{value}': {e}")
+        # Fallback: remove all non-ASCII characters
+        return NON_ASCII_RE.sub('', str(value)) or 'unknown'
+
+
+def build_group_metadata(city, map_type, zoom, district=None, map_type_config=None):
+    """Sanitized metadata shared by every tile of one (city, map_type, district, zoom) folder"""
+    metadata = {
+        'tile-type': 'map-tile',
+        'public-access': 'enabled',
+        'uploader-version': UPLOADER_VERSION
+    }
+
+    if city:
+        metadata['city'] = sanitize_metadata_value(city)
+        metadata['city-original'] = city  # Sanitized by the final pass below
+
+    if district:
+        metadata['district'] = sanitize_metadata_value(district)
+        metadata['district-original'] = sanitize_metadata_value(district)
+        metadata['structure-type'] = 'kh-2025-district'
+    else:
+        metadata['structure-type'] = 'standard'
+
+    if map_type:
+        metadata['map-type'] = sanitize_metadata_value(map_type)
+        map_config = (map_type_config or {}).get(map_type, {})
+        if map_config:
+            metadata['map-type-display'] = sanitize_metadata_value(map_config.get('display_name', map_type))
+            metadata['map-type-priority'] = str(map_config.get('priority', 99))
+
+    if zoom:
+        metadata['zoom-level'] = str(zoom)
+        metadata['tile-detail'] = 'high' if int(zoom) >= 14 else 'medium' if int(zoom) >= 10 else 'low'
+
+    return {
+        sanitize_metadata_value(key).replace(' ', '-'): sanitize_metadata_value(str(value))
+        for key, value in metadata.items()
+    }
+
+
+class MetadataTemplates:
+    def __init__(self, map_type_config=None):
+        """
+        Args:
+            map_type_config: MAP_TYPE_CONFIG of the uploader (display names, priorities)
+        """
+        self.map_type_config = map_type_config or {}
+        self.templates = {}
+        self._lock = threading.Lock()
+
+    def template(self, city, map_type, zoom, district=None):
+        key = (city, map_type, district, zoom)
+        template = self.templates.get(key)
+        if template is None:
+            template = build_group_metadata(city, map_type, zoom, district, self.map_type_config)
+            with self._lock:
+                self.templates[key] = template
+        return template
+
+    def create(self, file_name, file_info, city, map_type, zoom, district=None):
+        """Full metadata for one file: per-file fields + the group template"""
+        metadata = {
+            'original-name': sanitize_metadata_value(file_name),
+            'upload-time': sanitize_metadata_value(datetime.now().isoformat()),
+            'md5-hash': sanitize_metadata_value(file_info['md5']),
+            'file-size': str(file_info['size'])
+        }
+        metadata.update(self.template(city, map_type, zoom, district))
+        return metadata
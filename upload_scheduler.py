@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Upload scheduler: key-locality aware ordering for Spaces uploads
+Interleaves zoom-folder prefixes so consecutive PUTs never pile onto one
+key range, serves map types in MAP_TYPE_CONFIG priority order, shares the
+request budget fairly between cities and batches small tiles per worker
+
+Author: AI Assistant
+Version: 1.0 - Upload Scheduler
+
+Order produced from a look-ahead window of pending files:
+    1. lowest map type priority number with pending files
+    2. within it, cities in weighted round robin (one file per credit)
+    3. within a city, its zoom-folder prefixes in round robin
+A prefix that answered with SlowDown is skipped for a cooldown while other
+prefixes have work.
+"""
+
+import time
+import logging
+from collections import deque
+from rate_limiter import is_slowdown
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SMALL_FILE_BYTES = 64 * 1024  # Tiles below this share one worker task
+DEFAULT_BATCH_FILES = 16
+DEFAULT_LOOKAHEAD = 2000              # Files buffered from a streaming scan before scheduling
+DEFAULT_SLOWDOWN_COOLDOWN = 5.0
+
+
+def partition_of(file_data):
+    """The key prefix a tile lands in (its zoom folder)"""
+    return file_data['s3_key'].rsplit('/', 1)[0]
+
+
+def parse_city_weights(value):
+    """'hanoi=2,hcmc=1' -> {'hanoi': 2, 'hcmc': 1}"""
+    weights = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        city, _, weight = item.partition('=')
+        weights[city.strip()] = max(1, int(weight or 1))
+    return weights
+
+
+class UploadScheduler:
+    def __init__(self, map_type_config=None, city_weights=None, small_file_bytes=DEFAULT_SMALL_FILE_BYTES,
+                 batch_files=DEFAULT_BATCH_FILES, slowdown_cooldown=DEFAULT_SLOWDOWN_COOLDOWN):
+        """
+        Args:
+            map_type_config: MAP_TYPE_CONFIG ('priority' per map type, lower first)
+            city_weights: Optional {city: weight}; a city gets weight files per round (default 1)
+            small_file_bytes: Files below this size are batched together
+            batch_files: Maximum files per batch
+            slowdown_cooldown: Seconds a prefix is avoided after a SlowDown
+        """
+        self.priorities = {map_type: config.get('priority', 99) for map_type, config in (map_type_config or {}).items()}
+        self.city_weights = city_weights or {}
+        self.small_file_bytes = small_file_bytes
+        self.batch_files = batch_files
+        self.slowdown_cooldown = slowdown_cooldown
+
+        self.levels = {}       # priority -> {'cities': deque, 'credits': {}, 'partitions': {city: deque}, 'files': {partition: deque}}
+        self.cooling = {}      # partition -> monotonic time it may be scheduled again
+        self.buffered = 0
+        self.held = None       # Large file that ended a small-file batch
+
+        self.stats = {'files': 0, 'batches': 0, 'slowdown_cooldowns': 0}
+
+    def priority_of(self, map_type):
+        return self.priorities.get(map_type, self.priorities.get('unknown', 99))
+
+    def add(self, file_data):
+        level = self.levels.get(self.priority_of(file_data['map_type']))
+        if level is None:
+            level = self.levels[self.priority_of(file_data['map_type'])] = {
+                'cities': deque(), 'credits': {}, 'partitions': {}, 'files': {}
+            }
+
+        city = file_data['city']
+        partition = partition_of(file_data)
+        if city not in level['partitions']:
+            level['cities'].append(city)
+            level['credits'][city] = self.city_weights.get(city, 1)
+            level['partitions'][city] = deque()
+        files = level['files'].get(partition)
+        if files is None:
+            files = level['files'][partition] = deque()
+            level['partitions'][city].append(partition)
+        files.append(file_data)
+        self.buffered += 1
+
+    def pick_partition(self, partitions, now):
+        """Rotate the city's first non-cooling prefix to the front; False if all are cooling"""
+        for _ in range(len(partitions)):
+            if self.cooling.get(partitions[0], 0) <= now:
+                return True
+            partitions.rotate(-1)
+        return False
+
+    def next_file(self):
+        now = time.monotonic()
+        priority = min(self.levels)
+        level = self.levels[priority]
+        cities = level['cities']
+
+        for _ in range(len(cities)):
+            if self.pick_partition(level['partitions'][cities[0]], now):
+                break
+            cities.rotate(-1)
+        # Everything cooling: keep going with the current head rather than stall
+
+        city = cities[0]
+        partitions = level['partitions'][city]
+        files = level['files'][partitions[0]]
+        file_data = files.popleft()
+        self.buffered -= 1
+
+        if files:
+            partitions.rotate(-1)
+        else:
+            del level['files'][partitions.popleft()]
+
+        if not partitions:
+            cities.popleft()
+            del level['partitions'][city], level['credits'][city]
+            if not cities:
+                del self.levels[priority]
+        else:
+            level['credits'][city] -= 1
+            if level['credits'][city] <= 0:
+                level['credits'][city] = self.city_weights.get(city, 1)
+                cities.rotate(-1)
+
+        self.stats['files'] += 1
+        return file_data
+
+    def next_batch(self):
+        """One large file, or up to batch_files consecutive small files"""
+        if self.held is not None:
+            first, self.held = self.held, None
+        else:
+            first = self.next_file()
+
+        batch = [first]
+        if first['file_info']['size'] < self.small_file_bytes:
+            while len(batch) < self.batch_files and self.buffered:
+                file_data = self.next_file()
+                if file_data['file_info']['size'] >= self.small_file_bytes:
+                    self.held = file_data
+                    break
+                batch.append(file_data)
+
+        self.stats['batches'] += 1
+        return batch
+
+    def schedule(self, files, lookahead=DEFAULT_LOOKAHEAD):
+        """
+        Yield batches (lists of file_data) in scheduled order
+
+        Args:
+            files: List or streaming iterable of upload records
+            lookahead: Files buffered before scheduling; None buffers everything
+        """
+        source = iter(files)
+        exhausted = False
+        while True:
+            while not exhausted and (lookahead is None or self.buffered < lookahead):
+                file_data = next(source, None)
+                if file_data is None:
+                    exhausted = True
+                    break
+                self.add(file_data)
+            if not self.buffered and self.held is None:
+                return
+            yield self.next_batch()
+
+    def order(self, files, lookahead=DEFAULT_LOOKAHEAD):
+        """Flat scheduled order (for engines that pipeline single PUTs themselves)"""
+        for batch in self.schedule(files, lookahead):
+            yield from batch
+
+    def report_result(self, file_data, result):
+        """Cool a prefix down after its upload ended in SlowDown"""
+        if result.get('success'):
+            return
+        if result.get('status') == 503 or is_slowdown(result.get('error', '')):
+            now = time.monotonic()
+            if len(self.cooling) > 1000:
+                self.cooling = {partition: until for partition, until in self.cooling.items() if until > now}
+            self.cooling[partition_of(file_data)] = now + self.slowdown_cooldown
+            self.stats['slowdown_cooldowns'] += 1
+            logger.debug(f"🐢 Cooling down prefix {partition_of(file_data)} for {self.slowdown_cooldown:.0f}s")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Sharded upload statistics for multi-threaded uploaders
+Each worker thread writes only to its own shard (no locks, no lost updates);
+reads merge the shards
+
+Author: AI Assistant
+Version: 1.0 - Sharded Stats
+
+Dict-like: stats['uploaded_files'] and stats['city_stats'] return merged
+values, stats['start_time'] = ... sets plain values. Counters are bumped with
+incr(), per-dimension breakdowns with record().
+"""
+
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+BREAKDOWNS = ('city_stats', 'map_type_stats', 'district_stats', 'combination_stats', 'zoom_level_stats')
+COUNTED_BYTES_STATUSES = ('uploaded', 'skipped')
+
+
+def empty_breakdown_entry():
+    return {'uploaded': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+
+
+class ShardedStats:
+    def __init__(self, initial=None):
+        """
+        Args:
+            initial: Starting values, e.g. {'uploaded_files': 0, 'start_time': None}
+        """
+        self.base = dict(initial or {})
+        self.base_breakdowns = {name: {} for name in BREAKDOWNS}
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def shard(self):
+        """This thread's private shard (registered on first use)"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {
+                'thread': threading.current_thread(),
+                'counters': Counter(),
+                'breakdowns': {name: {} for name in BREAKDOWNS}
+            }
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def incr(self, name, amount=1):
+        self.shard()['counters'][name] += amount
+
+    def record(self, city, map_type, zoom, status, size, district=None):
+        """Count one file outcome in every breakdown it belongs to"""
+        combo_key = None
+        if city and map_type:
+            combo_key = f"{city}:{map_type}:{district}" if district else f"{city}:{map_type}"
+
+        breakdowns = self.shard()['breakdowns']
+        counted_bytes = size if status in COUNTED_BYTES_STATUSES else 0
+        for name, key in (('city_stats', city), ('map_type_stats', map_type), ('district_stats', district),
+                          ('combination_stats', combo_key), ('zoom_level_stats', zoom)):
+            if not key:
+                continue
+            entry = breakdowns[name].get(key)
+            if entry is None:
+                entry = breakdowns[name][key] = empty_breakdown_entry()
+            entry[status] += 1
+            entry['bytes'] += counted_bytes
+
+    def live_shards(self):
+        """Fold shards of finished threads into the base values; return the rest"""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard['thread'].is_alive():
+                    live.append(shard)
+                    continue
+                for name, value in shard['counters'].items():
+                    self.base[name] = (self.base.get(name) or 0) + value
+                for name, entries in shard['breakdowns'].items():
+                    self.merge_breakdown(self.base_breakdowns[name], entries)
+            self._shards = live
+            return list(live)
+
+    @staticmethod
+    def merge_breakdown(target, entries):
+        # dict.copy() is atomic, so a shard can be read while its thread keeps writing
+        for key, entry in entries.copy().items():
+            merged = target.setdefault(key, empty_breakdown_entry())
+            for field, value in entry.copy().items():
+                merged[field] += value
+
+    def __getitem__(self, name):
+        shards = self.live_shards()
+        if name in BREAKDOWNS:
+            merged = {}
+            self.merge_breakdown(merged, self.base_breakdowns[name])
+            for shard in shards:
+                self.merge_breakdown(merged, shard['breakdowns'][name])
+            return merged
+
+        deltas = [shard['counters'][name] for shard in shards if name in shard['counters']]
+        if not deltas:
+            return self.base[name]
+        return (self.base.get(name) or 0) + sum(deltas)
+
+    def __setitem__(self, name, value):
+        """Set an absolute value (replaces anything counted so far)"""
+        with self._lock:
+            self.base[name] = value
+            for shard in self._shards:
+                shard['counters'].pop(name, None)
+
+    def __contains__(self, name):
+        return name in BREAKDOWNS or name in self.base or any(name in shard['counters'] for shard in self.live_shards())
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def snapshot(self):
+        """Plain dict of every merged value (for reports and JSON)"""
+        names = set(self.base)
+        for shard in self.live_shards():
+            names.update(shard['counters'].copy())
+        merged = {name: self[name] for name in names}
+        merged.update({name: self[name] for name in BREAKDOWNS})
+        return merged